@@ -22,4 +22,7 @@ setup(
         'python-dateutil',
         'six',
     ],
+    extras_require={
+        'columnar': ['numpy'],
+    },
 )
@@ -0,0 +1,281 @@
+'''winnow/benchmarks.py
+
+Time Winnow's own overhead (no database involved) on a set of fixed,
+representative workloads, and write the results as JSON so runs from
+different commits can be compared.
+
+    python -m winnow.benchmarks --output before.json
+    python -m winnow.benchmarks --quick --only nested
+
+Each (workload, operation) pair is timed like timeit does: the number of
+calls per run is scaled up until a run takes at least --min-time
+seconds, then the best and median of --repeat runs are reported, per
+call. The workloads are built deterministically, so the numbers are
+comparable from run to run.
+'''
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import copy
+import json
+import platform
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+from .core import Winnow
+from .relative_dates import valid_rel_date_values
+
+FLAVORS = ['Vanilla', 'Chocolate', 'Strawberry', 'Coffee', 'Mint', 'Cherry Garcia']
+
+SOURCES = [
+    dict(display_name='Scoops', column='num_scoops', value_types=['numeric', 'nullable']),
+    dict(display_name='Flavor', column='flavor', value_types=['collection']),
+    dict(display_name='Scooper', column='scooper', value_types=['string', 'string_length']),
+    dict(display_name='Waffle Cone', column='waffle_cone', value_types=['bool']),
+    dict(display_name='Sold', column='sold_at', value_types=['absolute_date', 'relative_date']),
+]
+
+# value_type -> a typical (stored, stringly) value
+VIVIFY_SAMPLES = OrderedDict([
+    ('numeric', '12.5'),
+    ('string', 'Heidi Klum'),
+    ('collection', json.dumps(FLAVORS)),
+    ('bool', 'true'),
+    ('relative_date', 'Last 7 Days'),
+    ('absolute_date', '2017-03-22T18:14:30'),
+    ('single_choice', json.dumps(dict(id=1, name='Vanilla'))),
+])
+
+
+def clause(data_source, operator, value):
+    return dict(data_source=data_source, operator=operator, value=value)
+
+
+def flat_filter():
+    return dict(logical_op='&', filter_clauses=[
+        clause('Scoops', '>=', 2),
+        clause('Scoops', 'is set', True),
+        clause('Flavor', 'any of', FLAVORS[:3]),
+        clause('Scooper', 'contains', 'heidi'),
+        clause('Scooper', 'more than __ words', 1),
+        clause('Waffle Cone', 'is', True),
+        clause('Sold', 'after', '2017-01-01'),
+        clause('Sold', 'within', 'current_year'),
+    ] * 3)
+
+
+def nested_filter(depth):
+    if depth == 0:
+        return dict(logical_op='&', filter_clauses=[
+            clause('Scoops', '<', depth + 5),
+            clause('Flavor', 'not any of', FLAVORS[:2]),
+        ])
+    return dict(logical_op='|' if depth % 2 else '&', filter_clauses=[
+        nested_filter(depth - 1),
+        clause('Scooper', 'starts with', 'h'),
+        nested_filter(depth - 1),
+    ])
+
+
+def collection_filter(size):
+    return dict(logical_op='&', filter_clauses=[
+        clause('Flavor', 'any of', ['flavor {}'.format(i) for i in range(size)]),
+        clause('Scoops', '>=', 1),
+    ])
+
+
+def wide_sources(n):
+    return SOURCES + [
+        dict(display_name='Topping {}'.format(i), column='topping_{}'.format(i),
+             value_types=['numeric', 'bool'])
+        for i in range(n)]
+
+
+def wide_filter(n):
+    return dict(logical_op='|', filter_clauses=[
+        clause('Topping {}'.format(i), '>', i) for i in range(0, n, max(1, n // 20))])
+
+
+class SpecialWinnow(Winnow):
+    _special_cases = {}
+
+
+def _register_special_cases(n):
+    def topping_handler(wnw, clause):
+        return wnw.prepare_query(
+            "toppings @> {{ topping }} = {{ value }}",
+            topping=clause['data_source'], value=clause['value_vivified'])
+    for i in range(n):
+        SpecialWinnow.special_case('Special {}'.format(i), 'bool')(topping_handler)
+
+SPECIAL_CASES = 50
+_register_special_cases(SPECIAL_CASES)
+
+
+def special_filter():
+    return dict(logical_op='&', filter_clauses=[
+        clause('Special {}'.format(i), 'is', i % 2 == 0) for i in range(SPECIAL_CASES)])
+
+
+def relative_date_filter():
+    return dict(logical_op='|', filter_clauses=[
+        clause('Sold', 'within' if i % 2 else 'outside of', value)
+        for i, value in enumerate(sorted(valid_rel_date_values))])
+
+
+def workloads(quick=False):
+    """
+    Return [(name, winnow, filter)].
+    """
+    sizes = (10, 1000) if quick else (10, 1000, 100000)
+    ice_cream = Winnow('ice_cream', SOURCES)
+    found = [
+        ('flat', ice_cream, flat_filter()),
+        ('nested', ice_cream, nested_filter(4 if quick else 8)),
+        ('relative_dates', ice_cream, relative_date_filter()),
+    ]
+    for size in sizes:
+        found.append(('collection_{}'.format(size), ice_cream, collection_filter(size)))
+    n_wide = 200 if quick else 2000
+    found.append(('wide_sources', Winnow('ice_cream', wide_sources(n_wide)), wide_filter(n_wide)))
+    found.append(('special_cases', SpecialWinnow('ice_cream', SOURCES + [
+        dict(display_name='Special {}'.format(i), value_types=['bool'])
+        for i in range(SPECIAL_CASES)]), special_filter()))
+    return found
+
+
+def operations(wnw, filt):
+    """
+    Return [(name, function)] of the operations timed for each workload.
+    """
+    def resolve():
+        wnw.resolve(copy.deepcopy(filt))
+
+    def query_cold():
+        wnw.invalidate_plans()
+        wnw.query(filt)
+
+    return [
+        ('resolve_filter', lambda: wnw.resolve_filter(filt)),
+        ('resolve', resolve),
+        ('deepcopy', lambda: copy.deepcopy(filt)),  # to subtract from 'resolve'
+        ('validate', lambda: wnw.validate(filt)),
+        ('where_clauses', lambda: wnw.where_clauses(filt)),
+        ('query', lambda: wnw.query(filt)),
+        ('query_cold', query_cold),
+    ]
+
+
+def time_call(func, repeat=5, min_time=0.05):
+    """
+    Return (number, [seconds per call for each run]).
+    """
+    number = 1
+    while True:
+        elapsed = _run(func, number)
+        if elapsed >= min_time or number >= 1000000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    runs = [elapsed] + [_run(func, number) for _ in range(repeat - 1)]
+    return number, [run / number for run in runs]
+
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+def _run(func, number):
+    start = _timer()
+    for _ in range(number):
+        func()
+    return _timer() - start
+
+
+def _median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2
+
+
+def _result(group, workload, operation, number, per_call):
+    return OrderedDict([
+        ('group', group),
+        ('workload', workload),
+        ('operation', operation),
+        ('calls_per_run', number),
+        ('best_s', min(per_call)),
+        ('median_s', _median(per_call)),
+    ])
+
+
+def run(quick=False, only=None, repeat=5, min_time=0.05, log=None):
+    """
+    Run the benchmarks, returning a list of result dicts. `only` limits
+    them to workloads (or vivify value types) whose name contains it.
+    """
+    results = []
+    for value_type, value in VIVIFY_SAMPLES.items():
+        if only and only not in value_type:
+            continue
+        number, per_call = time_call(lambda: Winnow.vivify(value_type, value), repeat, min_time)
+        results.append(_result('vivify', value_type, 'vivify', number, per_call))
+        if log:
+            log(results[-1])
+
+    for name, wnw, filt in workloads(quick):
+        if only and only not in name:
+            continue
+        for operation, func in operations(wnw, filt):
+            number, per_call = time_call(func, repeat, min_time)
+            results.append(_result('compile', name, operation, number, per_call))
+            if log:
+                log(results[-1])
+    return results
+
+
+def environment():
+    env = OrderedDict([
+        ('python', platform.python_version()),
+        ('implementation', platform.python_implementation()),
+        ('platform', platform.platform()),
+        ('time', time.strftime('%Y-%m-%dT%H:%M:%S')),
+    ])
+    try:
+        env['commit'] = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        env['commit'] = None
+    return env
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark winnow's filter compilation.")
+    parser.add_argument('--output', '-o', help='write JSON results here (default: stdout)')
+    parser.add_argument('--quick', action='store_true', help='smaller workloads, for a smoke test')
+    parser.add_argument('--only', help='only run workloads whose name contains this')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help='seconds each timed run should last at least')
+    args = parser.parse_args(argv)
+
+    def log(result):
+        sys.stderr.write('{group:8} {workload:18} {operation:14} {median_s:.3e}s\n'.format(**result))
+
+    report = OrderedDict([
+        ('environment', environment()),
+        ('results', run(args.quick, args.only, args.repeat, args.min_time, log)),
+    ])
+    dumped = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(dumped + '\n')
+    else:
+        print(dumped)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+'''winnow/bitmaps.py
+
+Answer filters from cached sets of matching row ids, rather than asking
+the database every time.
+
+Saved filters tend to reuse the same few hundred clauses. A BitmapIndex
+remembers, for each clause it has seen, the ids of the rows it matches,
+and answers a whole filter by AND-ing and OR-ing those sets together.
+Only the clauses it hasn't seen yet are sent to the database, all in
+a single query.
+
+    index = BitmapIndex(wnw, connection)
+    ids = index.matching_ids(filt)
+
+    # after the table changes
+    index.invalidate()
+
+Row ids must be non-negative integers. Sets are stored as python ints,
+one bit per id, which makes AND / OR / NOT run at C speed, at the cost
+of max(id) / 8 bytes per cached clause. The cache is bounded by those
+bytes (64MB by default), not by its number of clauses.
+'''
+from __future__ import unicode_literals
+
+import binascii
+
+from six import integer_types
+
+from .error import WinnowError
+from .fragments import SqlFragment
+from .nodes import ResolvedConstant
+from .nodes import ResolvedFilter
+from .optimizer import node_key
+from .utils import LRUCache
+
+
+class Bitmap(object):
+    """
+    An immutable set of non-negative integer ids, one bit per id.
+    """
+    __slots__ = ('bits',)
+
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    @classmethod
+    def from_ids(cls, ids):
+        ids = list(ids)
+        if not ids:
+            return cls()
+        for row_id in ids:
+            if not isinstance(row_id, integer_types) or row_id < 0:
+                raise WinnowError('Bitmaps can only hold non-negative integer ids, not {!r}'.format(row_id))
+        # Setting bits one at a time on an int is quadratic, so build the
+        # bytes first.
+        buf = bytearray(max(ids) // 8 + 1)
+        for row_id in ids:
+            buf[row_id >> 3] |= 1 << (row_id & 7)
+        buf.reverse()
+        return cls(int(binascii.hexlify(buf), 16))
+
+    def __iter__(self):
+        """The ids, in ascending order."""
+        if not self.bits:
+            return
+        hexed = '{:x}'.format(self.bits)
+        buf = bytearray(binascii.unhexlify(hexed.zfill(len(hexed) + len(hexed) % 2)))
+        buf.reverse()
+        for ix, byte in enumerate(buf):
+            while byte:
+                low = byte & -byte
+                yield ix * 8 + low.bit_length() - 1
+                byte ^= low
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    @property
+    def nbytes(self):
+        """The size of the bits, roughly what the bitmap takes up in memory."""
+        return (self.bits.bit_length() + 7) // 8
+
+    def __contains__(self, row_id):
+        return row_id >= 0 and bool((self.bits >> row_id) & 1)
+
+    def __bool__(self):
+        return bool(self.bits)
+    __nonzero__ = __bool__
+
+    def __and__(self, other):
+        return Bitmap(self.bits & other.bits)
+
+    def __or__(self, other):
+        return Bitmap(self.bits | other.bits)
+
+    def __sub__(self, other):
+        return Bitmap(self.bits & ~other.bits)
+
+    def invert(self, universe):
+        """NOT, relative to the set of all ids `universe`."""
+        return universe - self
+
+    def __eq__(self, other):
+        return isinstance(other, Bitmap) and self.bits == other.bits
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, list(self))
+
+
+def _nbytes(bitmap):
+    return bitmap.nbytes
+
+
+class BitmapIndex(object):
+    """
+    Cached row id sets for the clauses of filters on `wnw.table`, fetched
+    through `connection` (any DB-API connection).
+
+    The cache holds up to `maxbytes` of bitmaps. It may be shared between
+    indexes over different tables; its entries are keyed by table name,
+    and invalidated table by table.
+    """
+    def __init__(self, wnw, connection, id_column='id', maxbytes=64 * 1024 * 1024, cache=None):
+        self.wnw = wnw
+        self.connection = connection
+        self.id_column = id_column
+        self.cache = cache if cache is not None else LRUCache(maxbytes, weigh=_nbytes)
+
+    @property
+    def table(self):
+        return self.wnw.table
+
+    def matching_ids(self, filt):
+        """
+        The Bitmap of ids of the rows matching `filt`, a filter dict or an
+        already resolved filter.
+        """
+        filt = self.wnw._compilable(filt)
+        today = self.wnw.date_ranges.clock().date()
+        bitmaps = {}
+        keys = {}
+        missing = []
+        self._collect(filt, today, bitmaps, keys, missing)
+        if missing:
+            self._fetch(missing, bitmaps)
+        return self._evaluate(filt, bitmaps, keys)
+
+    def clause_ids(self, clause):
+        """The Bitmap of ids of the rows matching a single resolved clause."""
+        return self.matching_ids(ResolvedFilter('&', [clause]))
+
+    def invalidate(self, table=None):
+        """
+        Forget the bitmaps for `table` (by default, this index's own), eg.
+        after its rows have changed.
+        """
+        table = self.table if table is None else table
+        for key in self.cache.keys():
+            if key[0] == table:
+                self.cache.pop(key)
+
+    def cache_info(self):
+        return self.cache.cache_info()
+
+    def _clause_key(self, clause, today):
+        key = node_key(clause)
+        if clause['operator_resolved']['value_type'] == 'relative_date':
+            # 'last 7 days' matches different rows from one day to the next.
+            key += (today,)
+        return (self.table, self.id_column, key)
+
+    def _universe_key(self):
+        return (self.table, self.id_column, ('universe',))
+
+    def _collect(self, filt, today, bitmaps, keys, missing):
+        """
+        Find the cached bitmap for each leaf of `filt`, noting the leaves
+        that have none. The key of each clause is kept in `keys`, by id,
+        so that _evaluate finds its bitmap under the same key.
+        """
+        if not filt.filter_clauses:
+            self._need(self._universe_key(), None, bitmaps, missing)
+        for clause in filt.filter_clauses:
+            if isinstance(clause, ResolvedFilter):
+                self._collect(clause, today, bitmaps, keys, missing)
+            elif isinstance(clause, ResolvedConstant):
+                if clause.constant:
+                    self._need(self._universe_key(), None, bitmaps, missing)
+            else:
+                key = keys[id(clause)] = self._clause_key(clause, today)
+                self._need(key, clause, bitmaps, missing)
+
+    def _need(self, key, clause, bitmaps, missing):
+        if key in bitmaps:
+            return
+        bitmap = self.cache.get(key)
+        # Hold on to it, in case fetching the misses evicts it.
+        bitmaps[key] = bitmap
+        if bitmap is None:
+            missing.append((key, clause))
+
+    def _fetch(self, missing, bitmaps):
+        """
+        Fetch the ids for all the `missing` clauses in one query, tagging
+        each row with the position of the clause it matched.
+        """
+        selects = []
+        for ix, (key, clause) in enumerate(missing):
+            select = self.wnw.prepare_query(
+                'SELECT {{ ix | sqlsafe }} AS clause_ix, {{ id_column | sqlsafe }} AS id '
+                'FROM {{ table | sqlsafe }}',
+                ix=ix, id_column=self.id_column, table=self.table)
+            if clause is not None:
+                select += SqlFragment(' WHERE ', []) + self.wnw._dispatch_clause(clause)
+            selects.append(select)
+        query, params = SqlFragment.join(' UNION ALL ', selects)
+
+        ids = [[] for _ in missing]
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query, params)
+            for clause_ix, row_id in cursor.fetchall():
+                ids[clause_ix].append(row_id)
+        finally:
+            cursor.close()
+
+        for (key, clause), clause_ids in zip(missing, ids):
+            bitmap = Bitmap.from_ids(clause_ids)
+            self.cache.set(key, bitmap)
+            bitmaps[key] = bitmap
+
+    def _evaluate(self, filt, bitmaps, keys):
+        if not filt.filter_clauses:
+            # Like where_clauses, an empty filter matches everything.
+            return bitmaps[self._universe_key()]
+        result = None
+        for clause in filt.filter_clauses:
+            if isinstance(clause, ResolvedFilter):
+                bitmap = self._evaluate(clause, bitmaps, keys)
+            elif isinstance(clause, ResolvedConstant):
+                bitmap = bitmaps[self._universe_key()] if clause.constant else Bitmap()
+            else:
+                bitmap = bitmaps[keys[id(clause)]]
+            if result is None:
+                result = bitmap
+            elif filt.logical_op == '&':
+                result = result & bitmap
+            else:
+                result = result | bitmap
+        return result
@@ -0,0 +1,300 @@
+'''winnow/columnar.py
+
+Evaluate a filter against columns of numpy arrays, a whole column at a
+time rather than row by row.
+
+    mask = filter_mask(wnw, filt, columns)
+    matching_ids = columns['id'][mask]
+
+`columns` maps each data source's `column` to an array (anything
+np.asarray accepts, so lists and pandas Series work too), all of the same
+length. NULLs are None in object arrays, NaN in float arrays, NaT in
+datetime64 arrays, or masked entries of a numpy.ma.MaskedArray.
+
+The masks match evaluate.py row for row. Filters only combine clauses
+with AND and OR, and under those a NULL clause behaves exactly like a
+false one (NOT is handled within clauses, like `not any of`), so each
+clause only needs to produce the mask of rows where it is true.
+
+Special cases need a vectorized counterpart, registered with
+Winnow.special_case_columnar. Use unsupported_sources to find out ahead
+of time whether a filter can be evaluated this way.
+
+numpy is an optional dependency, only needed by this module.
+'''
+from __future__ import unicode_literals
+
+import datetime
+import re
+
+from dateutil.tz import tzutc
+from six import text_type
+
+from . import default_operators
+from . import sql_prepare
+from .error import WinnowError
+from .evaluate import _COMPARISONS
+from .evaluate import collection_test
+from .evaluate import collection_values
+from .evaluate import has_wildcards
+from .evaluate import like_pattern
+from .evaluate import like_regex
+from .nodes import ResolvedConstant
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('Columnar evaluation requires numpy (pip install winnow-filters[columnar])')
+
+
+def filter_mask(wnw, filt, columns):
+    """
+    Return a boolean array, True for the rows of `columns` that `filt`
+    matches. `filt` may be a filter dict or an already resolved filter.
+    """
+    return compile_mask(wnw, filt)(columns)
+
+
+def compile_mask(wnw, filt):
+    """
+    Return a function columns -> boolean array. Raises WinnowError naming
+    the sources that can't be evaluated column-wise.
+    """
+    _require_numpy()
+    filt = wnw._compilable(filt)
+    unsupported = _unsupported(wnw, filt)
+    if unsupported:
+        raise WinnowError('No columnar implementation for: {}'.format(', '.join(unsupported)))
+    return compile_filter(wnw, filt)
+
+
+def unsupported_sources(wnw, filt):
+    """
+    The display names of the sources in `filt` that have no columnar
+    implementation, in the order they first appear.
+    """
+    return _unsupported(wnw, wnw._compilable(filt))
+
+
+def _unsupported(wnw, filt):
+    found = []
+    for clause in filt['filter_clauses']:
+        if 'logical_op' in clause:
+            names = _unsupported(wnw, clause)
+        elif isinstance(clause, ResolvedConstant) or _clause_supported(wnw, clause):
+            names = []
+        else:
+            names = [clause['data_source']]
+        found.extend(name for name in names if name not in found)
+    return found
+
+
+def _clause_supported(wnw, clause):
+    value_type = clause['operator_resolved']['value_type']
+    if wnw.special_case_handler(clause['data_source'], value_type) is not None:
+        return wnw.special_case_columnar_handler(clause['data_source'], value_type) is not None
+    return value_type in CLAUSE_MASKS
+
+
+def compile_filter(wnw, filt):
+    """
+    Compile a resolved filter into a function columns -> boolean array.
+    """
+    if not filt['filter_clauses']:
+        # Like where_clauses, an empty filter matches everything.
+        return lambda columns: np.ones(_num_rows(columns), dtype=bool)
+    masks = [compile_node(wnw, clause) for clause in filt['filter_clauses']]
+    combine = np.logical_and if filt['logical_op'] == '&' else np.logical_or
+
+    def mask(columns):
+        result = masks[0](columns)
+        for other in masks[1:]:
+            result = combine(result, other(columns))
+        return result
+    return mask
+
+
+def compile_node(wnw, clause):
+    if 'logical_op' in clause:
+        return compile_filter(wnw, clause)
+    elif isinstance(clause, ResolvedConstant):
+        fill = bool(clause.constant)
+        return lambda columns: np.full(_num_rows(columns), fill, dtype=bool)
+    return compile_clause(wnw, clause)
+
+
+def compile_clause(wnw, clause):
+    op = clause['operator_resolved']
+    value_type = op['value_type']
+    if wnw.special_case_handler(clause['data_source'], value_type) is not None:
+        columnar_handler = wnw.special_case_columnar_handler(clause['data_source'], value_type)
+        if columnar_handler is None:
+            raise WinnowError("No columnar implementation registered for special case ({},{})".format(
+                clause['data_source'], value_type))
+        return columnar_handler(wnw, clause)
+
+    try:
+        compiler = CLAUSE_MASKS[value_type]
+    except KeyError:
+        raise WinnowError("Unknown operator type '{}'".format(value_type))
+    column = clause['data_source_resolved']['column']
+    return compiler(wnw, column, op, clause['value_vivified'])
+
+
+def _num_rows(columns):
+    for array in columns.values():
+        return len(array)
+    raise WinnowError('Columnar evaluation needs at least one column')
+
+
+def column_array(columns, column):
+    array = columns[column]
+    if isinstance(array, np.ma.MaskedArray):
+        return array
+    return np.asarray(array)
+
+
+def null_mask(array):
+    """A boolean array, True where `array` holds a NULL."""
+    if isinstance(array, np.ma.MaskedArray):
+        nulls = np.ma.getmaskarray(array)
+        array = array.data
+        if array.dtype.kind not in 'fmMO':
+            return nulls
+        return nulls | null_mask(array)
+    kind = array.dtype.kind
+    if kind == 'f':
+        return np.isnan(array)
+    elif kind in 'mM':
+        return np.isnat(array)
+    elif kind == 'O':
+        return np.equal(array, None)
+    return np.zeros(len(array), dtype=bool)
+
+
+def _null_safe(column, test):
+    """
+    A mask function applying test(values) -> boolean array to the non-NULL
+    values of the column. NULLs never match.
+    """
+    def mask(columns):
+        array = column_array(columns, column)
+        nulls = null_mask(array)
+        data = np.ma.getdata(array)
+        if not nulls.any():
+            return np.asarray(test(data), dtype=bool)
+        result = np.zeros(len(data), dtype=bool)
+        present = ~nulls
+        result[present] = test(data[present])
+        return result
+    return mask
+
+
+def _coerce(data, value):
+    """Make a python datetime comparable with a datetime64 column."""
+    if data.dtype.kind == 'M' and isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(tzutc()).replace(tzinfo=None)
+        return np.datetime64(value)
+    return value
+
+
+def _binary_mask(wnw, column, op, value):
+    compare = _COMPARISONS[default_operators.get_sql_binary_op(op['name'])]
+    return _null_safe(column, lambda data: compare(data, _coerce(data, value)))
+
+
+def _matches(regex, search=False):
+    """Apply a compiled regex across an array of strings."""
+    test = regex.search if search else regex.match
+    return np.frompyfunc(lambda cell: test(cell) is not None, 1, 1)
+
+
+def _string_mask(wnw, column, op, value):
+    if op['name'] in ('contains', 'starts with'):
+        if has_wildcards(value):
+            return _null_safe(column, _matches(like_regex(like_pattern(op, value))))
+        needle = value.lower()
+        if op['name'] == 'contains':
+            return _null_safe(column, lambda data: np.char.find(
+                np.char.lower(data.astype(str)), needle) >= 0)
+        return _null_safe(column, lambda data: np.char.startswith(
+            np.char.lower(data.astype(str)), needle))
+
+    mask = _binary_mask(wnw, column, op, value)
+    if op['name'] == 'is' and value == '':
+        # A blank 'is' also matches NULL, see sql_prepare.
+        return lambda columns: mask(columns) | null_mask(column_array(columns, column))
+    return mask
+
+
+def _string_length_mask(wnw, column, op, value):
+    if op['name'] == 'more than __ words':
+        regex = sql_prepare.more_than_words_regex(value)
+    elif op['name'] == 'fewer than __ words':
+        if value <= 0:
+            return lambda columns: null_mask(column_array(columns, column))
+        regex = sql_prepare.fewer_than_words_regex(value)
+    else:
+        raise WinnowError("Unknown operator '{}'".format(op['name']))
+    # PostgreSQL's ~ matches anywhere in the string, like re.search
+    return _null_safe(column, _matches(re.compile(regex, re.UNICODE), search=True))
+
+
+# dtype.kind -> the python type of its values, for evaluate.collection_values
+_KIND_TYPES = {'i': int, 'u': int, 'f': float, 'U': text_type}
+
+
+def _collection_mask(wnw, column, op, value):
+    # Values are compared like SQL literals, see evaluate.collection_values
+    test = np.frompyfunc(collection_test(value), 1, 1)
+
+    def isin(data):
+        cell_type = _KIND_TYPES.get(data.dtype.kind)
+        if cell_type is None:
+            # eg. an object array, whose values may be of any type
+            found = test(data).astype(bool)
+            return ~found if op['negative'] else found
+        values = list(collection_values(value, cell_type))
+        return np.isin(data, values, invert=op['negative'])
+    return _null_safe(column, isin)
+
+
+def _bool_mask(wnw, column, op, value):
+    if value:
+        return _null_safe(column, lambda data: data.astype(bool))
+    return _null_safe(column, lambda data: ~data.astype(bool))
+
+
+def _nullable_mask(wnw, column, op, value):
+    if value:
+        return lambda columns: ~null_mask(column_array(columns, column))
+    return lambda columns: null_mask(column_array(columns, column))
+
+
+def _relative_date_mask(wnw, column, op, value):
+    # Like the SQL, the range is fixed when the filter is compiled.
+    start, end = wnw.date_ranges.interpret(value)
+    if op['negative']:
+        return _null_safe(column, lambda data: (
+            (data < _coerce(data, start)) | (data >= _coerce(data, end))))
+    return _null_safe(column, lambda data: (
+        (data >= _coerce(data, start)) & (data < _coerce(data, end))))
+
+
+# value_type -> function(wnw, column, op, value) -> function(columns) -> mask
+CLAUSE_MASKS = {
+    'numeric': _binary_mask,
+    'absolute_date': _binary_mask,
+    'string': _string_mask,
+    'string_length': _string_length_mask,
+    'collection': _collection_mask,
+    'bool': _bool_mask,
+    'nullable': _nullable_mask,
+    'relative_date': _relative_date_mask,
+}
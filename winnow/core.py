@@ -1,16 +1,37 @@
 from __future__ import unicode_literals
 
-import copy
-import json
-
-from six import string_types
-
 from . import default_operators
+from . import instrumentation
+from . import optimizer
+from . import parallel
+from . import relative_dates
 from . import sql_prepare
 from . import values
 from .error import WinnowError
-from .templating import SqlFragment
-from .templating import WinnowSql
+from .fragments import SqlFragment
+from .nodes import ResolvedClause
+from .nodes import ResolvedConstant
+from .nodes import ResolvedFilter
+from .schema import operator_schema
+from .schema import Schema
+from .utils import freeze
+from .utils import LRUCache
+from .utils import string_types
+
+
+class _DefaultSqlClass(object):
+    """templating.WinnowSql, imported when first looked up."""
+    def __get__(self, instance, owner):
+        from .templating import WinnowSql
+        return WinnowSql
+
+
+def _copy_result(result):
+    """A compile_many result that shares no mutable state with `result`."""
+    if isinstance(result, SqlFragment):
+        return SqlFragment(result.query, list(result.params))
+    return result
+
 
 class Winnow(object):
     """
@@ -22,26 +43,64 @@ class Winnow(object):
     # static value we have to deep copy it to every subclass.
     _special_cases = {}
 
-    sql_class = WinnowSql
+    sql_class = _DefaultSqlClass()
+    schema_class = Schema
 
     def __init__(self, table, sources):
         self.table = table
         self.sources = sources
-        self.sql = self.sql_class()
+        self._sql = None
+
+    @property
+    def sql(self):
+        # Made on first use, so that a Winnow that never renders a
+        # template never imports jinja2.
+        if self._sql is None:
+            self._sql = self.sql_class()
+        return self._sql
+
+    @sql.setter
+    def sql(self, sql):
+        self._sql = sql
+
+    @property
+    def sources(self):
+        return self._sources
+
+    @sources.setter
+    def sources(self, sources):
+        # Assigning sources rebuilds the lookup index used by resolve_*.
+        self._sources = sources
+        self.schema = self.schema_class(sources, self.operators)
+        self.plan_cache = LRUCache(self.plan_cache_size)
 
     def prepare_query(self, *args, **kwargs):
         """
         Proxy to self.sql
         """
-        return self.sql.prepare_query(*args, **kwargs)
+        with self._phase('render'):
+            return self.sql.prepare_query(*args, **kwargs)
+
+    # A callable handed an instrumentation.CompileStats after each
+    # where_clauses / query call, eg. an instrumentation.StatsCollector.
+    # None to measure nothing.
+    instrumentation = None
+
+    def _phase(self, name):
+        if self.instrumentation is None:
+            return instrumentation.NO_PHASE
+        return instrumentation.phase(name)
 
-    def resolve(self, filt):
+    def resolve(self, filt, with_summary=True):
         """
         Given a filter, resolve (expand) all it's clauses.
         A resolved clause includes information about the
         value type of the data source, and how to perform
         queries against that data source.
 
+        Pass with_summary=False to skip adding a 'summary' to each
+        clause when only the SQL is needed.
+
         return the modified filter.
         """
 
@@ -51,19 +110,48 @@ class Winnow(object):
                 filt['logical_op']))
         for ix in range(len(filt['filter_clauses'])):
             filt['filter_clauses'][ix] = self.resolve_clause(
-                filt['filter_clauses'][ix])
+                filt['filter_clauses'][ix], with_summary)
         return filt
 
+    def resolve_filter(self, filt):
+        """
+        Like resolve, but leaves `filt` untouched. Returns a tree of
+        ResolvedFilter and ResolvedClause nodes instead.
+        """
+        if isinstance(filt, ResolvedFilter):
+            return filt
+        logical_op = filt.get('logical_op', '&')
+        if logical_op not in '&|':
+            raise WinnowError("Logical op must be one of &, |. Given: {}".format(
+                logical_op))
+        return ResolvedFilter(
+            logical_op,
+            [self.resolve_filter_clause(clause) for clause in filt['filter_clauses']])
+
+    def resolve_filter_clause(self, filter_clause):
+        """
+        Like resolve_clause, but returns a ResolvedClause (or a
+        ResolvedFilter, for a nested filter) without modifying filter_clause.
+        """
+        if 'logical_op' in filter_clause:
+            # nested filter
+            return self.resolve_filter(filter_clause)
+
+        ds, op = self.resolve_components(filter_clause)
+        with self._phase('vivify'):
+            value = self.vivify(op['value_type'], filter_clause['value'])
+        return ResolvedClause(self, filter_clause, ds, op, value)
+
     def validate(self, filt):
         """
         Make sure a filter is valid (resolves properly), but avoid bulking up
         the json object (probably because it's about to go into the db, or
         across the network)
         """
-        self.resolve(copy.deepcopy(filt))
+        self.resolve_filter(filt)
         return filt
 
-    def resolve_clause(self, filter_clause):
+    def resolve_clause(self, filter_clause, with_summary=True):
         """
         Given a filter_clause, check that it's valid.
         Return a dict-style filter_clause with a vivified
@@ -71,16 +159,31 @@ class Winnow(object):
         """
         if 'logical_op' in filter_clause:
             # nested filter
-            return self.resolve(filter_clause)
+            return self.resolve(filter_clause, with_summary)
 
         ds, op = self.resolve_components(filter_clause)
         value = self.vivify(op['value_type'], filter_clause['value'])
         filter_clause['data_source_resolved'] = ds
         filter_clause['operator_resolved'] = op
         filter_clause['value_vivified'] = value
-        filter_clause['summary'] = self.summarize(filter_clause)
+        if with_summary:
+            filter_clause['summary'] = self.summarize(filter_clause)
         return filter_clause
 
+    def summarize_filter(self, filt):
+        """
+        Summarize every clause of a filter at once, for display.
+
+        Returns the filter's structure with each clause replaced by its
+        summary string.
+        """
+        filt = self.resolve_filter(filt)
+        return dict(
+            logical_op=filt.logical_op,
+            filter_clauses=[
+                self.summarize_filter(clause) if isinstance(clause, ResolvedFilter) else clause.summary
+                for clause in filt.filter_clauses])
+
     def summarize(self, filter_clause):
         ds = filter_clause['data_source_resolved']
         op = filter_clause['operator_resolved']
@@ -99,14 +202,14 @@ class Winnow(object):
 
     @classmethod
     def coalesce_value_type(cls, value_type):
-        for op in cls.operators:
-            if op['value_type'] == value_type:
-                return op.get('coalesced_value_type', value_type)
-        return value_type
+        return operator_schema(cls.operators).coalesce_value_type(value_type)
 
     @classmethod
     def summarize_collection(cls, filter_clause):
-        value = filter_clause['value'] if isinstance(filter_clause['value'], list) else json.loads(filter_clause['value'])
+        value = filter_clause.get('value_vivified')
+        if value is None:
+            import json
+            value = filter_clause['value'] if isinstance(filter_clause['value'], list) else json.loads(filter_clause['value'])
 
         operator_string = '{data_source} any of {value}' if len(value) != 1 else '{data_source} is {value}'
         if not value:
@@ -119,6 +222,14 @@ class Winnow(object):
     def empty_filter():
         return dict(logial_op='&', filter_clauses=[])
 
+    # True to reject absolute dates that aren't ISO 8601, rather than
+    # letting dateutil make what it can of them.
+    absolute_date_strict = False
+
+    # An LRUCache here remembers the datetimes parsed from absolute date
+    # strings, for filters that repeat the same literal dates.
+    absolute_date_memo = None
+
     @classmethod
     def vivify(cls, value_type, value):
         """De-stringify <value> into <value_type>
@@ -134,7 +245,7 @@ class Winnow(object):
         elif cvt == 'relative_date':
             return values.vivify_relative_date(value)
         elif cvt == 'absolute_date':
-            return values.vivify_absolute_date(value)
+            return values.vivify_absolute_date(value, cls.absolute_date_strict, cls.absolute_date_memo)
         elif cvt in ('bool', 'nullable'):
             return values.vivify_bool(value)
         elif cvt == 'single_choice':
@@ -170,14 +281,7 @@ class Winnow(object):
         '''Given an operator name, return an Op object.
 
         Raise an error if the operator is not found'''
-        if not isinstance(op_name, string_types):
-            raise WinnowError("Bad operator type, '{}'. expected string".format(type(op_name)))
-        op_name = op_name.lower()
-        matches = [op for op in self.operators
-                   if op['name'].lower() == op_name and op['value_type'] in value_types]
-        if len(matches) == 0:
-            raise WinnowError("Unknown operator '{}'".format(op_name))
-        return matches.pop()
+        return self.schema.resolve_operator(op_name, value_types)
 
     def resolve_source(self, source_name):
         """
@@ -185,14 +289,7 @@ class Winnow(object):
 
         Raise an error if the source name is not allowable
         """
-
-        matches = [source for source in self.sources
-                   if source['display_name'] == source_name]
-        if len(matches) == 0:
-            raise WinnowError("Unknown data source '{}'".format(source_name))
-        elif len(matches) > 1:
-            raise WinnowError("Ambiguous data source '{}'".format(source_name))
-        return matches.pop()
+        return self.schema.resolve_source(source_name)
 
     def resolve_components(self, clause):
         source = self.resolve_source(clause['data_source'])
@@ -200,11 +297,42 @@ class Winnow(object):
                                          source['value_types'])
         return source, operator
 
+    # Run every filter through optimize() before building its SQL.
+    optimize_filters = False
+
+    def optimize(self, filt):
+        """
+        Simplify a filter (flatten nested groups, drop duplicates, merge
+        collections and ranges, fold contradictions) without changing which
+        rows it matches. Returns a resolved filter; see optimizer.py.
+        """
+        return optimizer.optimize(self, self.resolve_filter(filt))
+
+    def _compilable(self, filt):
+        with self._phase('resolve'):
+            filt = self.resolve_filter(filt)
+        if self.optimize_filters:
+            with self._phase('optimize'):
+                filt = self.optimize(filt)
+        return filt
+
     def query(self, filt):
+        if self.instrumentation is not None:
+            return instrumentation.measured(self, 'query', self._query, filt)
+        return self._query(filt)
+
+    def _query(self, filt):
+        if not filt['filter_clauses']:
+            return self._render_query(True)
+        filt = self._compilable(filt)
+        return self._planned(('query', self.table), filt, lambda leaf_frags: self._render_query(
+            self._where_clauses(filt, leaf_frags)))
+
+    def _render_query(self, condition):
         return self.prepare_query(
             "SELECT * FROM {{ table | sqlsafe }} WHERE {{ condition }}",
             table=self.table,
-            condition=self.where_clauses(filt))
+            condition=condition)
 
     def strip(self, filt):
         """
@@ -222,21 +350,93 @@ class Winnow(object):
 
         Returns a paren-wrapped WHERE clause suitable for using
         in a SELECT statement on the opportunity table.
+
+        `filt` may be a filter dict or the result of resolve_filter.
         '''
+        if self.instrumentation is not None:
+            return instrumentation.measured(self, 'where', self._where_clauses_for, filt)
+        return self._where_clauses_for(filt)
+
+    def _where_clauses_for(self, filt):
+        if not filt['filter_clauses']:
+            return True
+
+        filt = self._compilable(filt)
+        return self._planned('where', filt, lambda leaf_frags: self._where_clauses(
+            filt, leaf_frags))
+
+    # How many distinct filters compile_many remembers, to skip compiling
+    # repeats. Set to 0 to compile every filter.
+    compile_many_dedupe_size = 10000
+
+    def compile_many(self, filters, kind='query', processes=None,
+                     chunksize=parallel.DEFAULT_CHUNKSIZE):
+        """
+        Compile an iterable of filters, yielding the result of self.query
+        (or, with kind='where', self.where_clauses) for each in turn.
+
+        A filter that fails to compile yields its WinnowError instead of
+        ending the batch. Repeated filters are only compiled once, and
+        all of them share this Winnow's schema, template and plan caches.
+
+        With `processes`, the filters are compiled `chunksize` at a time
+        on a pool of that many worker processes; see parallel.py.
+        """
+        if processes:
+            return parallel.compile_parallel(self, filters, processes, chunksize, kind)
+        return self._compile_many(filters, kind)
+
+    def _compile_many(self, filters, kind):
+        compile_one = {'query': self.query, 'where': self.where_clauses}[kind]
+        seen = LRUCache(self.compile_many_dedupe_size)
+        for filt in filters:
+            try:
+                key = freeze(filt)
+                hash(key)
+            except TypeError:
+                key = None
+            result = seen.get(key) if key is not None else None
+            if result is not None:
+                yield _copy_result(result)
+                continue
+            try:
+                result = compile_one(filt)
+            except WinnowError as e:
+                result = e
+            except (AssertionError, KeyError, TypeError, ValueError) as e:
+                # A malformed filter, eg. missing its filter_clauses
+                result = WinnowError(e)
+            if key is not None:
+                # A copy, so that changes made to the fragment yielded
+                # don't show up in its repeats.
+                seen.set(key, _copy_result(result))
+            yield result
+
+    def _where_clauses(self, filt, leaf_frags=None):
+        """
+        Build the WHERE clause for an already resolved filter.
+
+        If given, `leaf_frags` collects the fragment built for each
+        clause, in order.
+        """
         if not filt['filter_clauses']:
             return True
 
-        filt = self.resolve(filt)
         where_clauses = []
         for clause in filt['filter_clauses']:
             if 'logical_op' in clause:
                 # nested filter
-                where_clauses.append(self.where_clauses(clause))
+                where_clauses.append(self._where_clauses(clause, leaf_frags))
+            elif isinstance(clause, ResolvedConstant):
+                where_clauses.append(SqlFragment('TRUE' if clause.constant else 'FALSE', []))
             elif 'data_source_resolved' in clause:
-                where_clauses.append(self._dispatch_clause(clause))
+                frag = self._dispatch_clause(clause)
+                if leaf_frags is not None:
+                    leaf_frags.append(frag)
+                where_clauses.append(frag)
             else:
                 # I don't expect to ever get here, because we should hit this
-                # issue when we call `filt = self.resolve(filt)`
+                # issue when we call `filt = self.resolve_filter(filt)`
                 raise WinnowError("Somehow, this is neither a nested filter, nor a resolved clause")
 
 
@@ -244,11 +444,133 @@ class Winnow(object):
             return True
 
         sep = '\nAND \n  ' if filt['logical_op'] == '&' else '\nOR \n  '
-        self.strip(filt)
-        sql_frag = SqlFragment.join(sep, where_clauses)
-        sql_frag.query = '(' + sql_frag.query + ')'
+        return SqlFragment.join(sep, where_clauses).wrap('(', ')')
+
+    # How many compiled filter shapes to remember. Set to 0 to disable.
+    plan_cache_size = 256
+
+    def plan_cache_info(self):
+        return self.plan_cache.cache_info()
+
+    def invalidate_plans(self):
+        """
+        Forget every cached query plan. Call this after registering special
+        cases or changing operators on a Winnow that's already been used.
+        (Assigning to `sources` does this for you.)
+        """
+        self.plan_cache.clear()
+
+    def _planned(self, kind, filt, build):
+        """
+        Look up the SQL for a resolved filter by its structure, so that
+        filters differing only in their values reuse the same SQL text.
+
+        `build(leaf_frags)` builds the fragment from scratch on a miss,
+        appending each clause's own fragment to leaf_frags.
+        """
+        if not self.plan_cache.maxsize or not self._default_dispatch():
+            # With where_clause (or similar) overridden, no clause can be
+            # rebound, so there's nothing a plan could save us.
+            with self._phase('build'):
+                return build(None)
+        leaf_params = []
+        unbound = []
+        key = (kind, self._plan_key(filt, leaf_params, unbound))
+        plan = self.plan_cache.get(key)
+        if plan is not None:
+            query, params_type, unbound_queries = plan
+            # Clauses we can't rebind (special cases) are built again every
+            # time, as their params can depend on anything. The plan still
+            # holds as long as their SQL comes out the same.
+            unbound_frags = [self._dispatch_clause(clause) for clause in unbound]
+            if any(frag.query != unbound_query
+                   for frag, unbound_query in zip(unbound_frags, unbound_queries)):
+                plan = None
+        if self.instrumentation is not None:
+            instrumentation.note_plan(plan is not None)
+        if plan is not None:
+            unbound_frags = iter(unbound_frags)
+            params = []
+            for leaf in leaf_params:
+                params.extend(next(unbound_frags).params if leaf is None else leaf)
+            return SqlFragment(query, params_type(params))
+
+        leaf_frags = []
+        with self._phase('build'):
+            sql_frag = build(leaf_frags)
+        unbound_queries = [frag.query for frag, params in zip(leaf_frags, leaf_params)
+                           if params is None]
+        with self._phase('assemble'):
+            query = sql_frag.query
+        self.plan_cache.set(key, (query, type(sql_frag.params), unbound_queries))
         return sql_frag
 
+    def _plan_key(self, filt, leaf_params, unbound):
+        """
+        A hashable fingerprint of everything about a resolved filter that
+        affects its SQL text. The params for each clause are appended to
+        `leaf_params`, or None when they can only come from building the
+        clause, in which case the clause is appended to `unbound`.
+        """
+        key = [filt['logical_op']]
+        for clause in filt['filter_clauses']:
+            if 'logical_op' in clause:
+                key.append(self._plan_key(clause, leaf_params, unbound))
+                continue
+            elif isinstance(clause, ResolvedConstant):
+                key.append(clause.constant)
+                continue
+            op = clause['operator_resolved']
+            value = clause['value_vivified']
+            clause_key = (clause['data_source'], op['name'], op['value_type'])
+            if self._rebindable(clause):
+                shape, params = self._clause_shape(clause['data_source_resolved'], op, value)
+                clause_key += (shape,)
+                leaf_params.append(params)
+            else:
+                clause_key += ('value', freeze(value))
+                leaf_params.append(None)
+                unbound.append(clause)
+            key.append(clause_key)
+        return tuple(key)
+
+    def _clause_shape(self, data_source, op, value):
+        """
+        For a clause built by where_clause, return the part of its value
+        that shapes the SQL, and the params it binds.
+        """
+        value_type = op['value_type']
+        if value_type == 'collection':
+            strategy = self.collection_strategy(data_source, value)
+            return (sql_prepare.collection_shape(strategy, value),
+                    sql_prepare.collection_params(strategy, value))
+        elif value_type == 'relative_date':
+            if self.relative_date_sql == 'server':
+                return ('server', value), []
+            return None, sql_prepare.CLAUSE_PARAMS[value_type](op, value, self.date_ranges)
+        return (sql_prepare.CLAUSE_SHAPES[value_type](op, value),
+                sql_prepare.CLAUSE_PARAMS[value_type](op, value))
+
+    def _rebindable(self, clause):
+        """
+        Whether a resolved clause is built by sql_prepare.where_clause, so
+        that its params can be recomputed without building its SQL.
+        """
+        op = clause['operator_resolved']
+        return (op['value_type'] in sql_prepare.CLAUSE_SHAPES
+                and self.special_case_handler(clause['data_source'], op['value_type']) is None)
+
+    def _default_dispatch(self):
+        """
+        Whether this class builds non-special clauses the way Winnow does,
+        rather than through an overridden where_clause (or similar).
+        """
+        cls = type(self)
+        return all(
+            getattr(getattr(cls, name), '__func__', getattr(cls, name)) is
+            getattr(getattr(Winnow, name), '__func__', getattr(Winnow, name))
+            for name in ('_dispatch_clause', '_default_clause', 'where_clause'))
+
     def _dispatch_clause(self, clause):
         """
         Evaluates whether a clause is standard, special, or custom
@@ -266,11 +588,51 @@ class Winnow(object):
             source_name=clause['data_source'],
             value_type=op['value_type'])
         if special_handler is not None:
-            return special_handler(self, clause)
+            with self._phase('special_cases'):
+                return special_handler(self, clause)
 
         return self._default_clause(clause)
 
+    # Collections with more values than this are bound as a single array
+    # parameter rather than one parameter per value. None to never do so.
+    # The array is text[], so sources with a non-text column need a
+    # 'collection_sql_type' (eg. 'bigint') to cast it to.
+    collection_array_threshold = None
+
+    def collection_strategy(self, data_source, value):
+        """
+        Pick how to bind the values of a collection clause (one of
+        sql_prepare.COLLECTION_STRATEGIES). A data source can choose for
+        itself with a 'collection_strategy' key.
+        """
+        if isinstance(value, sql_prepare.TableValues):
+            return 'table'
+        strategy = data_source.get('collection_strategy')
+        if strategy is not None:
+            return strategy
+        threshold = self.collection_array_threshold
+        if threshold is not None and len(value) > threshold:
+            return 'array'
+        return 'inclause'
+
+    # Where 'within' and 'outside of' clauses look up their date ranges.
+    # Use a DateRangeTable with your own clock to control "now".
+    date_ranges = relative_dates.default_date_ranges
+
+    # 'params' binds the start and end of relative date ranges as computed
+    # in python. 'server' has the database compute them at query time
+    # instead, so the SQL (and params) stay the same from day to day.
+    relative_date_sql = 'params'
+
     def where_clause(self, data_source, operator, value):
+        if operator['value_type'] == 'relative_date':
+            return sql_prepare.relative_date_clause(
+                data_source['column'], operator, value, self.date_ranges,
+                server_side=self.relative_date_sql == 'server')
+        if operator['value_type'] == 'collection':
+            return sql_prepare.where_clause(
+                data_source['column'], operator, value,
+                self.collection_strategy(data_source, value), data_source.get('collection_sql_type'))
         return sql_prepare.where_clause(data_source['column'], operator, value)
 
     def _default_clause(self, clause):
@@ -288,6 +650,29 @@ class Winnow(object):
         Register a special case handler. A special case handler is a function s:
          s(Winnow(), clause) -> WHERE clause string
         """
+        return cls._special_case_decorator(None, source_name, value_types)
+
+    @classmethod
+    def special_case_predicate(cls, source_name, *value_types):
+        """
+        Register the python counterpart of a special case handler, used when
+        evaluating filters in memory (see evaluate.py). It's a function p:
+         p(Winnow(), clause) -> function(row) -> True, False, or None (NULL)
+        """
+        return cls._special_case_decorator('predicate', source_name, value_types)
+
+    @classmethod
+    def special_case_columnar(cls, source_name, *value_types):
+        """
+        Register the vectorized counterpart of a special case handler, used
+        when evaluating filters against numpy columns (see columnar.py). It's
+        a function m:
+         m(Winnow(), clause) -> function(columns) -> boolean numpy array
+        """
+        return cls._special_case_decorator('columnar', source_name, value_types)
+
+    @classmethod
+    def _special_case_decorator(cls, kind, source_name, value_types):
         if cls._special_cases is getattr(super(cls, cls), '_special_cases', None):
             raise RuntimeError('Please define your own _special_cases dict, so as to avoid modifying your parent. '
                                'Note to self: come up with a more durable way to handle this.')
@@ -299,11 +684,12 @@ class Winnow(object):
             Register a function in the handler table.
             """
             for value_type in value_types:
-                if (source_name, value_type) in cls._special_cases:
+                key = (source_name, value_type) if kind is None else (kind, source_name, value_type)
+                if key in cls._special_cases:
                     raise WinnowError("Conflicting handlers registered for ({},{}): {} and {}".format(
                         value_type, source_name,
-                        cls._special_cases[(source_name, value_type)].__name__, func.__name__))
-                cls._special_cases[(source_name, value_type)] = func
+                        cls._special_cases[key].__name__, func.__name__))
+                cls._special_cases[key] = func
             return func
         return decorator
 
@@ -316,3 +702,69 @@ class Winnow(object):
          the winnow instance and the clause.
         """
         return self._special_cases.get((source_name, value_type))
+
+    def special_case_predicate_handler(self, source_name, value_type):
+        """
+        Like special_case_handler, for the handlers registered with
+        special_case_predicate.
+        """
+        return self._special_cases.get(('predicate', source_name, value_type))
+
+    def special_case_columnar_handler(self, source_name, value_type):
+        """
+        Like special_case_handler, for the handlers registered with
+        special_case_columnar.
+        """
+        return self._special_cases.get(('columnar', source_name, value_type))
+
+    # The value each special case handler is called with by warm_up, per
+    # value type.
+    warm_up_values = {
+        'string': 'a',
+        'collection': ['a'],
+        'numeric': 1,
+        'string_length': 1,
+        'relative_date': 'last_7_days',
+        'absolute_date': '2000-01-01T00:00:00',
+        'bool': True,
+        'nullable': True,
+        'single_choice': dict(id=1, name='a'),
+    }
+
+    def warm_up(self):
+        """
+        Render the query template, and call the special case handler for
+        each of our sources once for each operator it handles, so that the
+        templates they render are compiled (or loaded, see
+        WinnowSql.compiled_templates) now rather than while answering the
+        first request that uses them.
+
+        Returns [(source name, operator name, exception)] for the handler
+        calls that raised.
+        """
+        self._render_query(True)
+        failed = []
+        for key in list(self._special_cases):
+            if len(key) != 2:
+                continue  # a special_case_predicate or special_case_columnar
+            source_name, value_type = key
+            try:
+                source = self.resolve_source(source_name)
+            except WinnowError:
+                continue  # registered for another Winnow's sources
+            if value_type not in source['value_types']:
+                continue
+            op_names = set(op['name'] for op in self.operators if op['value_type'] == value_type)
+            for op_name in sorted(op_names):
+                op = self.resolve_operator(op_name, [value_type])
+                filter_clause = dict(data_source=source_name, operator=op_name)
+                try:
+                    if value_type in self.warm_up_values:
+                        filter_clause['value'] = self.warm_up_values[value_type]
+                    else:
+                        filter_clause['value'] = self.warm_up_values[self.coalesce_value_type(value_type)]
+                    value = self.vivify(value_type, filter_clause['value'])
+                    self._dispatch_clause(ResolvedClause(self, filter_clause, source, op, value))
+                except Exception as e:
+                    failed.append((source_name, op_name, e))
+        return failed
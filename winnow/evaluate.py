@@ -0,0 +1,271 @@
+'''winnow/evaluate.py
+
+Evaluate a filter in python, against rows that are already in memory.
+
+    matches = compile_predicate(wnw, filt)
+    rows = [row for row in rows if matches(row)]
+
+Rows are dicts keyed by each data source's `column`. The predicates
+follow the SQL that sql_prepare.where_clause builds, including SQL's
+handling of NULL (None): a clause on a NULL column is neither true nor
+false, so `not any of` doesn't match it, and neither does `is not`.
+
+Internally each clause compiles to a function returning True, False or
+None (SQL's NULL), combined with three-valued AND / OR. A row matches if
+the whole filter comes out True.
+
+Special cases need a python counterpart, registered with
+Winnow.special_case_predicate.
+'''
+from __future__ import unicode_literals
+
+import re
+from numbers import Number
+
+from six import text_type
+
+from . import default_operators
+from . import sql_prepare
+from .error import WinnowError
+from .nodes import ResolvedConstant
+from .utils import string_types
+
+
+def compile_predicate(wnw, filt):
+    """
+    Return a function row -> bool, True for the rows `filt` matches.
+    `filt` may be a filter dict or an already resolved filter.
+    """
+    predicate = compile_filter(wnw, wnw._compilable(filt))
+    return lambda row: predicate(row) is True
+
+
+def filter_rows(wnw, filt, rows):
+    matches = compile_predicate(wnw, filt)
+    return [row for row in rows if matches(row)]
+
+
+def compile_filter(wnw, filt):
+    """
+    Compile a resolved filter into a function row -> True, False or None.
+    """
+    if not filt['filter_clauses']:
+        # Like where_clauses, an empty filter matches everything.
+        return lambda row: True
+    predicates = [compile_node(wnw, clause) for clause in filt['filter_clauses']]
+    if filt['logical_op'] == '&':
+        return lambda row: and_(p(row) for p in predicates)
+    return lambda row: or_(p(row) for p in predicates)
+
+
+def compile_node(wnw, clause):
+    if 'logical_op' in clause:
+        return compile_filter(wnw, clause)
+    elif isinstance(clause, ResolvedConstant):
+        constant = clause.constant
+        return lambda row: constant
+    return compile_clause(wnw, clause)
+
+
+def and_(results):
+    """SQL's AND: False beats NULL beats True."""
+    outcome = True
+    for result in results:
+        if result is False:
+            return False
+        elif result is None:
+            outcome = None
+    return outcome
+
+
+def or_(results):
+    """SQL's OR: True beats NULL beats False."""
+    outcome = False
+    for result in results:
+        if result is True:
+            return True
+        elif result is None:
+            outcome = None
+    return outcome
+
+
+def compile_clause(wnw, clause):
+    op = clause['operator_resolved']
+    value_type = op['value_type']
+    special_handler = wnw.special_case_handler(clause['data_source'], value_type)
+    if special_handler is not None:
+        predicate_handler = wnw.special_case_predicate_handler(clause['data_source'], value_type)
+        if predicate_handler is None:
+            raise WinnowError("No python predicate registered for special case ({},{})".format(
+                clause['data_source'], value_type))
+        return predicate_handler(wnw, clause)
+
+    try:
+        compiler = CLAUSE_PREDICATES[value_type]
+    except KeyError:
+        raise WinnowError("Unknown operator type '{}'".format(value_type))
+    column = clause['data_source_resolved']['column']
+    return compiler(wnw, column, op, clause['value_vivified'])
+
+
+def _null_safe(column, test):
+    """A predicate that is NULL when the column is, and test(cell) otherwise."""
+    def predicate(row):
+        cell = row.get(column)
+        if cell is None:
+            return None
+        return test(cell)
+    return predicate
+
+
+_COMPARISONS = {
+    '>=': lambda a, b: a >= b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '<': lambda a, b: a < b,
+    '=': lambda a, b: a == b,
+    '<>': lambda a, b: a != b,
+}
+
+
+def _binary_predicate(wnw, column, op, value):
+    compare = _COMPARISONS[default_operators.get_sql_binary_op(op['name'])]
+    return _null_safe(column, lambda cell: compare(cell, value))
+
+
+def like_regex(pattern, flags=re.IGNORECASE | re.DOTALL):
+    """
+    Compile a SQL LIKE pattern (% and _ wildcards, \\ escapes) to a regex
+    matching the whole string.
+    """
+    parts = []
+    chars = iter(pattern)
+    for char in chars:
+        if char == '\\':
+            parts.append(re.escape(next(chars, '\\')))
+        elif char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts) + r'\Z', flags)
+
+
+def like_pattern(op, value):
+    """
+    The ILIKE pattern sql_prepare matches a 'contains' or 'starts with'
+    value with. The value is bound into it as is, so any % or _ it
+    contains are wildcards too; has_wildcards tells whether it does.
+    """
+    pattern = value + '%'
+    if op['name'] == 'contains':
+        pattern = '%' + pattern
+    return pattern
+
+
+def has_wildcards(value):
+    return any(char in value for char in '%_\\')
+
+
+def _string_predicate(wnw, column, op, value):
+    if op['name'] in ('contains', 'starts with'):
+        regex = like_regex(like_pattern(op, value))
+        return _null_safe(column, lambda cell: regex.match(cell) is not None)
+
+    predicate = _binary_predicate(wnw, column, op, value)
+    if op['name'] == 'is' and value == '':
+        # A blank 'is' also matches NULL, see sql_prepare.
+        return lambda row: or_((predicate(row), row.get(column) is None))
+    return predicate
+
+
+def _string_length_predicate(wnw, column, op, value):
+    if op['name'] == 'more than __ words':
+        regex = re.compile(sql_prepare.more_than_words_regex(value), re.UNICODE)
+    elif op['name'] == 'fewer than __ words':
+        if value <= 0:
+            return lambda row: row.get(column) is None
+        regex = re.compile(sql_prepare.fewer_than_words_regex(value), re.UNICODE)
+    else:
+        raise WinnowError("Unknown operator '{}'".format(op['name']))
+    # PostgreSQL's ~ matches anywhere in the string, like re.search
+    return _null_safe(column, lambda cell: regex.search(cell) is not None)
+
+
+def _is_number_type(cell_type):
+    # numpy's scalar types included; bool('0') would be True, though.
+    return issubclass(cell_type, Number) and not issubclass(cell_type, bool)
+
+
+def collection_values(values, cell_type):
+    """
+    The set of an `any of` clause's `values`, as a column of `cell_type`
+    compares with them. SQL reads the quoted literals of `IN ('1', '2')`
+    as the column's type, so strings become numbers for a numeric
+    column, and numbers strings for a text one. A value that doesn't
+    parse would be an error in SQL; here it just matches nothing.
+    """
+    coerced = set()
+    for value in values:
+        if isinstance(value, string_types) and _is_number_type(cell_type):
+            try:
+                value = cell_type(value)
+            except (ValueError, ArithmeticError):
+                continue
+        elif isinstance(value, Number) and issubclass(cell_type, string_types):
+            value = text_type(value)
+        coerced.add(value)
+    return coerced
+
+
+def collection_test(values):
+    """A function cell -> whether it's one of `values`, see collection_values."""
+    by_type = {}
+
+    def test(cell):
+        cell_type = type(cell)
+        if cell_type not in by_type:
+            by_type[cell_type] = collection_values(values, cell_type)
+        return cell in by_type[cell_type]
+    return test
+
+
+def _collection_predicate(wnw, column, op, value):
+    test = collection_test(value)
+    if op['negative']:
+        return _null_safe(column, lambda cell: not test(cell))
+    return _null_safe(column, test)
+
+
+def _bool_predicate(wnw, column, op, value):
+    if value:
+        return _null_safe(column, bool)
+    return _null_safe(column, lambda cell: not cell)
+
+
+def _nullable_predicate(wnw, column, op, value):
+    if value:
+        return lambda row: row.get(column) is not None
+    return lambda row: row.get(column) is None
+
+
+def _relative_date_predicate(wnw, column, op, value):
+    # Like the SQL, the range is fixed when the filter is compiled.
+    start, end = wnw.date_ranges.interpret(value)
+    if op['negative']:
+        return _null_safe(column, lambda cell: cell < start or cell >= end)
+    return _null_safe(column, lambda cell: start <= cell < end)
+
+
+# value_type -> function(wnw, column, op, value) -> predicate
+CLAUSE_PREDICATES = {
+    'numeric': _binary_predicate,
+    'absolute_date': _binary_predicate,
+    'string': _string_predicate,
+    'string_length': _string_length_predicate,
+    'collection': _collection_predicate,
+    'bool': _bool_predicate,
+    'nullable': _nullable_predicate,
+    'relative_date': _relative_date_predicate,
+}
@@ -0,0 +1,192 @@
+'''winnow/fragments.py
+
+SqlFragment, and the adapting of python values into bind params.
+
+Nothing here needs jinja2, so building SQL without templates (see
+sql_prepare.CLAUSE_BUILDERS) doesn't have to import it; templating.py
+does that, the first time a template is rendered.
+'''
+from __future__ import unicode_literals
+
+import datetime
+import sys
+
+from .utils import string_types
+
+try:
+    from collections.abc import Iterable
+except ImportError:  # python 2
+    from collections import Iterable
+
+
+def adapt_param(value):
+    """
+    Convert a python value into the (value, type_suffix) pair that
+    gets bound in its place, eg. a datetime becomes (datetime, '::timestamp').
+    """
+    suffix = ''
+    if isinstance(value, pg_null):
+        suffix = '::' + value.pg_type
+        value = None
+    if isinstance(value, (dict, PGJson)):
+        suffix = '::jsonb'
+        value = jsonify(getattr(value, 'adapted', value))
+    elif isinstance(value, datetime.datetime):
+        suffix = '::timestamp'
+    elif _is_instance(value, 'decimal', 'Decimal'):
+        value = float(value)
+    elif _is_instance(value, 'jinja2', 'Undefined'):
+        value = None
+    return value, suffix
+
+
+def _is_instance(value, module_name, class_name):
+    # isinstance(value, module_name.class_name), without importing the
+    # module: if nothing has imported it, value can't be one.
+    module = sys.modules.get(module_name)
+    return module is not None and isinstance(value, getattr(module, class_name))
+
+
+def json_custom_parser(obj):
+    """
+    A custom json parser to handle json.dumps calls properly for Decimal and
+    Datetime data types.
+    """
+    if not isinstance(obj, string_types) and isinstance(obj, Iterable):
+        return list(obj)
+    elif isinstance(obj, datetime.datetime) or isinstance(obj, datetime.date):
+        dot_ix = 19  # 'YYYY-MM-DDTHH:MM:SS.mmmmmm+HH:MM'.find('.')
+        return obj.isoformat()[:dot_ix]
+    else:
+        raise TypeError(obj)
+
+
+def jsonify(obj):
+    import json
+    return json.dumps(obj, default=json_custom_parser, sort_keys=True)
+
+
+class PGJson(object):
+    def __init__(self, adapted):
+        self.adapted = adapted
+
+
+class pg_null(object):
+    def __init__(self, pg_type):
+        self.pg_type = pg_type
+
+    def __unicode__(self):
+        return 'NULL::{}'.format(self.pg_type)
+
+    __str__ = __unicode__
+
+
+class SqlFragment(object):
+    """
+    A wrapper around (query, params) that supports addition
+
+    Adding and joining fragments doesn't copy anything: the result just
+    remembers its pieces, and the query string and params are put
+    together once, the first time they're asked for. So building a deeply
+    nested WHERE clause out of big fragments stays linear. Don't modify a
+    fragment once it's part of another.
+    """
+    __slots__ = ('_query', '_params', '_pieces', '_params_type')
+
+    def __init__(self, query, params):
+        self._pieces = None
+        self._query = query
+        self._params = params
+        self._params_type = type(params)
+
+    @classmethod
+    def _concat(cls, pieces, params_type):
+        """A lazy fragment made of `pieces`, which are strings or fragments."""
+        frag = cls.__new__(cls)
+        frag._pieces = pieces
+        frag._query = frag._params = None
+        frag._params_type = params_type
+        return frag
+
+    def _materialize(self):
+        queries = []
+        params = []
+        stack = [self]
+        # Walk the pieces depth first, without recursing, as filters can
+        # nest deeply.
+        while stack:
+            piece = stack.pop()
+            if not isinstance(piece, SqlFragment):
+                queries.append(piece)
+            elif piece._pieces is None:
+                queries.append(piece._query)
+                params.extend(piece._params)
+            else:
+                stack.extend(reversed(piece._pieces))
+        self._query = ''.join(queries)
+        self._params = self._params_type(params)
+        self._pieces = None
+
+    @property
+    def query(self):
+        if self._pieces is not None:
+            self._materialize()
+        return self._query
+
+    @query.setter
+    def query(self, query):
+        if self._pieces is not None:
+            self._materialize()
+        self._query = query
+
+    @property
+    def params(self):
+        if self._pieces is not None:
+            self._materialize()
+        return self._params
+
+    @params.setter
+    def params(self, params):
+        if self._pieces is not None:
+            self._materialize()
+        self._params = params
+        self._params_type = type(params)
+
+    def __add__(self, other):
+        return SqlFragment._concat((self, other), self._params_type)
+
+    def wrap(self, prefix, suffix):
+        """This fragment with `prefix` and `suffix` around its query."""
+        return SqlFragment._concat((prefix, self, suffix), self._params_type)
+
+    def __reduce__(self):
+        return (SqlFragment, (self.query, self.params))
+
+    def __iter__(self):
+        """
+        to support
+            `cursor.execute(*fragment)`
+            `query, params = fragment`
+        """
+        return iter((self.query, self.params))
+
+    def __eq__(self, other):
+        return self.query == other.query and self.params == other.params
+
+
+    def __repr__(self):
+        return '{}({}, {})'.format(
+            self.__class__.__name__,
+            repr(self.query),
+            repr(self.params))
+
+    __str__ = __unicode__ = __repr__
+
+    @staticmethod
+    def join(sep, elems):
+        pieces = []
+        for ix, elem in enumerate(elems):
+            if ix:
+                pieces.append(sep)
+            pieces.append(elem)
+        return SqlFragment._concat(pieces, tuple)
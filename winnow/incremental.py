@@ -0,0 +1,98 @@
+'''winnow/incremental.py
+
+Recompile a filter after an edit, reusing the SQL built last time for
+every part of it that didn't change.
+
+    compiled = compile_incremental(wnw, filt)
+    ...  # the user changes one clause
+    compiled = compile_incremental(wnw, edited_filt, compiled)
+    query, params = compiled.sql
+    compiled.rebuilt  # just the edited clause and the groups above it
+
+Fragments are remembered by the content of the node they were built
+for (see optimizer.node_key), not its position, so identical subtrees
+share a single fragment, and a clause that moved is still reused. The
+SQL is the same as Winnow.where_clauses builds.
+'''
+from __future__ import unicode_literals
+
+from .error import WinnowError
+from .fragments import SqlFragment
+from .nodes import ResolvedConstant
+from .optimizer import node_key
+
+
+class CompiledFilter(object):
+    """
+    The result of compile_incremental:
+
+        sql: the WHERE clause, as from Winnow.where_clauses
+        fragments: {node key: SqlFragment} for every node of the filter
+        rebuilt: the nodes whose SQL was built this time, children first
+    """
+    __slots__ = ('sql', 'fragments', 'rebuilt')
+
+    def __init__(self, sql, fragments, rebuilt):
+        self.sql = sql
+        self.fragments = fragments
+        self.rebuilt = rebuilt
+
+
+def compile_incremental(wnw, filt, previous=None):
+    """
+    Compile `filt` (a filter dict or resolved filter) into a
+    CompiledFilter, reusing fragments from `previous`, the CompiledFilter
+    for an earlier version of it from the same Winnow.
+    """
+    filt = wnw._compilable(filt)
+    if not filt['filter_clauses']:
+        return CompiledFilter(True, {}, [])
+    reusable = previous.fragments if previous is not None else {}
+    fragments = {}
+    rebuilt = []
+    key = _compile_node(wnw, filt, reusable, fragments, rebuilt)
+    return CompiledFilter(fragments[key], fragments, rebuilt)
+
+
+def _compile_node(wnw, node, reusable, fragments, rebuilt):
+    """
+    Make sure fragments holds the SQL for `node`, and return its key.
+    """
+    if 'logical_op' in node:
+        child_keys = tuple(_compile_node(wnw, child, reusable, fragments, rebuilt)
+                           for child in node['filter_clauses'])
+        key = ('group', node['logical_op'], child_keys)
+        build = lambda: _group_fragment(node['logical_op'], [fragments[k] for k in child_keys])
+    elif isinstance(node, ResolvedConstant):
+        key = node_key(node)
+        build = lambda: SqlFragment('TRUE' if node.constant else 'FALSE', [])
+    elif 'data_source_resolved' in node:
+        key = _clause_key(wnw, node)
+        build = lambda: wnw._dispatch_clause(node)
+    else:
+        raise WinnowError("Somehow, this is neither a nested filter, nor a resolved clause")
+
+    if key not in fragments:
+        if key in reusable:
+            fragments[key] = reusable[key]
+        else:
+            fragments[key] = build()
+            rebuilt.append(node)
+    return key
+
+
+def _group_fragment(logical_op, child_frags):
+    if not child_frags:
+        return SqlFragment('TRUE', [])
+    sep = '\nAND \n  ' if logical_op == '&' else '\nOR \n  '
+    return SqlFragment.join(sep, child_frags).wrap('(', ')')
+
+
+def _clause_key(wnw, clause):
+    key = node_key(clause)
+    if (clause['operator_resolved']['value_type'] == 'relative_date'
+            and wnw.relative_date_sql != 'server'):
+        # The range is bound as params, and 'today' means something
+        # different tomorrow.
+        key += (wnw.date_ranges.interpret(clause['value_vivified']),)
+    return key
@@ -0,0 +1,257 @@
+'''winnow/instrumentation.py
+
+Find out where the time goes when compiling a filter.
+
+    stats = StatsCollector()
+    wnw.instrumentation = stats
+    wnw.query(filt)
+    stats.summary()
+
+When a Winnow's `instrumentation` is set (to any callable), each call to
+where_clauses or query is measured, and the callable is handed a
+CompileStats describing it:
+
+    kind: 'where' or 'query'
+    total: seconds spent in the call
+    timings: {phase: seconds}, for the phases below
+    calls: {phase: how many times it ran}
+    clauses: how many clauses the filter has
+    params: how many bind params the SQL has
+    sql_length: the length of the SQL
+    plan_cache_hit: True / False (None when the plan cache is off)
+    template_cache_hits / template_cache_misses: compiled Jinja templates
+        reused / compiled during the call
+    error: the exception the call raised, if any
+
+The phases are resolve (which includes vivify), vivify, optimize, build
+(putting the SQL together on a plan cache miss, which includes
+special_cases and render), special_cases, render (Jinja templates) and
+assemble (joining the fragments into the final SQL).
+
+With `instrumentation` left as None, nothing is measured, and the only
+cost is checking that it's None.
+'''
+from __future__ import unicode_literals
+
+import threading
+import time
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # python < 3.7
+    ContextVar = None
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+class CompileStats(object):
+    def __init__(self, kind, table):
+        self.kind = kind
+        self.table = table
+        self.total = 0.0
+        self.timings = {}
+        self.calls = {}
+        self.clauses = 0
+        self.params = 0
+        self.sql_length = 0
+        self.plan_cache_hit = None
+        self.template_cache_hits = 0
+        self.template_cache_misses = 0
+        self.error = None
+
+    def add(self, phase, seconds):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def as_dict(self):
+        return dict(
+            kind=self.kind, table=self.table, total=self.total,
+            timings=dict(self.timings), calls=dict(self.calls),
+            clauses=self.clauses, params=self.params, sql_length=self.sql_length,
+            plan_cache_hit=self.plan_cache_hit,
+            template_cache_hits=self.template_cache_hits,
+            template_cache_misses=self.template_cache_misses,
+            error=self.error)
+
+    def __repr__(self):
+        return 'CompileStats({!r})'.format(self.as_dict())
+
+
+# The CompileStats of the where_clauses / query call in progress.
+if ContextVar is not None:
+    _current = ContextVar('winnow_compile_stats', default=None)
+
+    def current_stats():
+        return _current.get()
+
+    def _set_current(stats):
+        return _current.set(stats)
+
+    def _reset_current(token):
+        _current.reset(token)
+else:
+    _local = threading.local()
+
+    def current_stats():
+        return getattr(_local, 'stats', None)
+
+    def _set_current(stats):
+        token = current_stats()
+        _local.stats = stats
+        return token
+
+    def _reset_current(token):
+        _local.stats = token
+
+
+class _NoPhase(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+NO_PHASE = _NoPhase()
+
+
+class _Phase(object):
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = _timer()
+
+    def __exit__(self, *exc_info):
+        self.stats.add(self.name, _timer() - self.start)
+
+
+def phase(name):
+    """
+    A context manager timing a phase of the call being measured (and
+    doing nothing if there isn't one).
+    """
+    stats = current_stats()
+    if stats is None:
+        return NO_PHASE
+    return _Phase(stats, name)
+
+
+def note_plan(hit):
+    stats = current_stats()
+    if stats is not None:
+        stats.plan_cache_hit = hit
+
+
+def measured(wnw, kind, compile_filter, filt):
+    """
+    Call compile_filter(filt), handing a CompileStats for the call to
+    wnw.instrumentation.
+    """
+    stats = CompileStats(kind, wnw.table)
+    stats.clauses = count_clauses(filt)
+    # Not wnw.sql, which would import jinja2 for calls that render nothing;
+    # and the sql_class may not cache templates at all.
+    template_cache = _template_cache(wnw)
+    template_hits, template_misses = _template_counts(template_cache)
+    token = _set_current(stats)
+    start = _timer()
+    try:
+        result = compile_filter(filt)
+        if result is not True:
+            # Fragments are joined lazily, when first read.
+            with _Phase(stats, 'assemble'):
+                query, params = result
+            stats.params = len(params)
+            stats.sql_length = len(query)
+        return result
+    except Exception as e:
+        stats.error = e
+        raise
+    finally:
+        stats.total = _timer() - start
+        _reset_current(token)
+        template_cache = _template_cache(wnw) if template_cache is None else template_cache
+        if template_cache is not None:
+            # Other threads using the same Winnow can inflate these.
+            stats.template_cache_hits = template_cache.hits - template_hits
+            stats.template_cache_misses = template_cache.misses - template_misses
+        wnw.instrumentation(stats)
+
+
+def _template_cache(wnw):
+    return getattr(wnw._sql, 'template_cache', None)
+
+
+def _template_counts(template_cache):
+    if template_cache is None:
+        return 0, 0
+    return template_cache.hits, template_cache.misses
+
+
+def count_clauses(filt):
+    count = 0
+    for clause in filt['filter_clauses']:
+        if 'logical_op' in clause:
+            count += count_clauses(clause)
+        else:
+            count += 1
+    return count
+
+
+class StatsCollector(object):
+    """
+    An instrumentation hook that adds up the CompileStats of every call,
+    and keeps the slowest few.
+    """
+    def __init__(self, keep_slowest=10):
+        self.keep_slowest = keep_slowest
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.errors = 0
+            self.total = 0.0
+            self.timings = {}
+            self.calls = {}
+            self.clauses = self.params = self.sql_length = 0
+            self.plan_cache_hits = self.plan_cache_misses = 0
+            self.template_cache_hits = self.template_cache_misses = 0
+            self.slowest = []
+
+    def __call__(self, stats):
+        with self._lock:
+            self.count += 1
+            self.errors += stats.error is not None
+            self.total += stats.total
+            for phase_name, seconds in stats.timings.items():
+                self.timings[phase_name] = self.timings.get(phase_name, 0.0) + seconds
+                self.calls[phase_name] = self.calls.get(phase_name, 0) + stats.calls[phase_name]
+            self.clauses += stats.clauses
+            self.params += stats.params
+            self.sql_length += stats.sql_length
+            if stats.plan_cache_hit is not None:
+                if stats.plan_cache_hit:
+                    self.plan_cache_hits += 1
+                else:
+                    self.plan_cache_misses += 1
+            self.template_cache_hits += stats.template_cache_hits
+            self.template_cache_misses += stats.template_cache_misses
+            if self.keep_slowest:
+                self.slowest.append(stats)
+                self.slowest.sort(key=lambda s: -s.total)
+                del self.slowest[self.keep_slowest:]
+
+    def summary(self):
+        with self._lock:
+            return dict(
+                count=self.count, errors=self.errors, total=self.total,
+                timings=dict(self.timings), calls=dict(self.calls),
+                clauses=self.clauses, params=self.params, sql_length=self.sql_length,
+                plan_cache_hits=self.plan_cache_hits, plan_cache_misses=self.plan_cache_misses,
+                template_cache_hits=self.template_cache_hits,
+                template_cache_misses=self.template_cache_misses)
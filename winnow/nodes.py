@@ -0,0 +1,112 @@
+'''winnow/nodes.py
+
+The tree returned by Winnow.resolve_filter. Unlike Winnow.resolve, which
+writes the resolved pieces back into the filter dict, these nodes are
+built alongside the filter and never modify it.
+
+Nodes also answer to item access with the same keys Winnow.resolve adds
+(`clause['value_vivified']`, `filt['filter_clauses']`, ...), so special
+case handlers written against resolved dicts keep working.
+'''
+from __future__ import unicode_literals
+
+
+class ResolvedNode(object):
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class ResolvedFilter(ResolvedNode):
+    __slots__ = ('logical_op', 'filter_clauses')
+    _fields = __slots__
+
+    def __init__(self, logical_op, filter_clauses):
+        self.logical_op = logical_op
+        self.filter_clauses = tuple(filter_clauses)
+
+    def __repr__(self):
+        return '{}({!r}, {!r})'.format(
+            self.__class__.__name__, self.logical_op, list(self.filter_clauses))
+
+
+class ResolvedClause(ResolvedNode):
+    __slots__ = (
+        'clause', 'data_source_resolved', 'operator_resolved', 'value_vivified',
+        '_winnow', '_summary')
+    _fields = (
+        'data_source', 'operator', 'value',
+        'data_source_resolved', 'operator_resolved', 'value_vivified', 'summary')
+
+    def __init__(self, winnow, clause, data_source, operator, value):
+        self._winnow = winnow
+        self.clause = clause
+        self.data_source_resolved = data_source
+        self.operator_resolved = operator
+        self.value_vivified = value
+        self._summary = None
+
+    @property
+    def data_source(self):
+        return self.clause['data_source']
+
+    @property
+    def operator(self):
+        return self.clause['operator']
+
+    @property
+    def value(self):
+        return self.clause['value']
+
+    @property
+    def summary(self):
+        """
+        A human readable description of the clause, computed on first use.
+        """
+        if self._summary is None:
+            self._summary = self._winnow.summarize(self)
+        return self._summary
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        # Any extra keys a client put on the clause
+        return self.clause[key]
+
+    def __contains__(self, key):
+        return key in self._fields or key in self.clause
+
+    def __repr__(self):
+        return '{}({!r}, {!r}, {!r})'.format(
+            self.__class__.__name__, self.data_source, self.operator, self.value_vivified)
+
+
+class ResolvedConstant(ResolvedNode):
+    """
+    Stands in for a clause (or group) that is always true or always
+    false, eg. after Winnow.optimize spots a contradiction.
+    """
+    __slots__ = ('constant',)
+    _fields = __slots__
+
+    def __init__(self, constant):
+        self.constant = bool(constant)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.constant)
+
+TRUE = ResolvedConstant(True)
+FALSE = ResolvedConstant(False)
@@ -0,0 +1,294 @@
+'''winnow/optimizer.py
+
+Simplify a resolved filter before it's turned into SQL:
+
+    - nested groups with the same logical_op as their parent are flattened
+    - duplicate clauses (and groups) are dropped
+    - `any of` / `not any of` clauses on the same source are merged
+    - numeric and absolute date ranges on the same source are tightened
+      (under &) or loosened (under |) to a single bound each way
+    - contradictions fold to FALSE and tautologies to TRUE
+
+Only flattening and de-duplication touch special case clauses. The
+value-aware rewrites are limited to clauses built by sql_prepare, where
+we know exactly what SQL they produce.
+'''
+from __future__ import unicode_literals
+
+from .error import WinnowError
+from .nodes import FALSE
+from .nodes import ResolvedClause
+from .nodes import ResolvedConstant
+from .nodes import ResolvedFilter
+from .nodes import TRUE
+from .utils import freeze
+
+
+def optimize(wnw, filt):
+    """
+    Return an optimized copy of the resolved filter `filt`. The result is
+    always a ResolvedFilter, even if it simplifies down to a constant.
+    """
+    result = _optimize_group(wnw, filt, wnw._default_dispatch())
+    if isinstance(result, ResolvedFilter):
+        return result
+    return ResolvedFilter(filt.logical_op, [result])
+
+
+def _optimize_group(wnw, filt, default_dispatch):
+    """
+    Returns a ResolvedFilter, or a single clause or constant if that's all
+    the group boils down to.
+    """
+    op = filt.logical_op
+    clauses = []
+    for clause in filt.filter_clauses:
+        if isinstance(clause, ResolvedFilter):
+            clause = _optimize_group(wnw, clause, default_dispatch)
+            if isinstance(clause, ResolvedFilter) and clause.logical_op == op:
+                clauses.extend(clause.filter_clauses)
+                continue
+        clauses.append(clause)
+
+    clauses = _dedupe(clauses)
+    if default_dispatch:
+        clauses = _merge_clauses(wnw, op, clauses)
+    clauses = _fold_constants(op, clauses)
+
+    if isinstance(clauses, ResolvedConstant):
+        return clauses
+    if len(clauses) == 1:
+        return clauses[0]
+    return ResolvedFilter(op, clauses)
+
+
+def node_key(node):
+    """
+    A hashable key such that two nodes with the same key produce the
+    same SQL.
+    """
+    if isinstance(node, ResolvedFilter):
+        return ('group', node.logical_op, tuple(node_key(c) for c in node.filter_clauses))
+    elif isinstance(node, ResolvedConstant):
+        return ('constant', node.constant)
+    op = node['operator_resolved']
+    return ('clause', node['data_source'], op['name'], op['value_type'],
+            freeze(node['value_vivified']))
+
+
+def _dedupe(clauses):
+    seen = set()
+    unique = []
+    for clause in clauses:
+        key = node_key(clause)
+        if key not in seen:
+            seen.add(key)
+            unique.append(clause)
+    return unique
+
+
+def _fold_constants(op, clauses):
+    """
+    Drop constants that can't change the outcome of the group, or return
+    a constant if one decides it. An empty group is treated like the
+    empty top-level filter: it matches everything.
+    """
+    absorbing = FALSE if op == '&' else TRUE
+    kept = []
+    for clause in clauses:
+        if isinstance(clause, ResolvedConstant):
+            if clause.constant == absorbing.constant:
+                return absorbing
+            continue
+        kept.append(clause)
+    if not kept:
+        return TRUE if not clauses or op == '&' else FALSE
+    return kept
+
+
+# (value_type, operator name) -> what the clause says about its column.
+_CLAUSE_KINDS = {
+    ('numeric', '>='): ('lower', True),
+    ('numeric', '>'): ('lower', False),
+    ('numeric', '<='): ('upper', True),
+    ('numeric', '<'): ('upper', False),
+    ('absolute_date', 'after'): ('lower', True),
+    ('absolute_date', 'before'): ('upper', False),
+    ('numeric', 'is'): ('is', None),
+    ('string', 'is'): ('is', None),
+    ('collection', 'any of'): ('in', None),
+    ('collection', 'not any of'): ('not_in', None),
+    ('bool', 'is'): ('bool', None),
+    ('nullable', 'is set'): ('bool', None),
+}
+
+
+def _clause_kind(wnw, clause):
+    if not isinstance(clause, ResolvedClause) or not wnw._rebindable(clause):
+        return None
+    op = clause['operator_resolved']
+    return _CLAUSE_KINDS.get((op['value_type'], op['name']))
+
+
+def _merge_clauses(wnw, logical_op, clauses):
+    """
+    Combine the clauses on each (source, value_type) into as few as
+    possible. Merged clauses take the place of the first clause they
+    replace.
+    """
+    buckets = {}
+    for ix, clause in enumerate(clauses):
+        kind = _clause_kind(wnw, clause)
+        if kind is None:
+            continue
+        op = clause['operator_resolved']
+        buckets.setdefault((clause['data_source'], op['value_type']), []).append(
+            (ix, kind, clause))
+
+    replacements = {}
+    for bucket in buckets.values():
+        try:
+            merged = _merge_bucket(wnw, logical_op, [(kind, clause) for ix, kind, clause in bucket])
+        except TypeError:
+            # eg. comparing naive and tz-aware datetimes. Leave these alone.
+            continue
+        first = bucket[0][0]
+        for ix, kind, clause in bucket:
+            replacements[ix] = []
+        replacements[first] = merged
+
+    if not replacements:
+        return clauses
+    result = []
+    for ix, clause in enumerate(clauses):
+        result.extend(replacements.get(ix, [clause]))
+    return result
+
+
+def _merge_bucket(wnw, logical_op, bucket):
+    """
+    Merge clauses that all share a source and value_type. Returns the
+    list of nodes to use instead.
+    """
+    conjunction = logical_op == '&'
+    by_kind = {}
+    for kind, clause in bucket:
+        by_kind.setdefault(kind[0], []).append((kind[1], clause))
+
+    merged = []
+    lower = _pick_bound(by_kind.get('lower', []), tighter=conjunction, is_lower=True)
+    upper = _pick_bound(by_kind.get('upper', []), tighter=conjunction, is_lower=False)
+    if conjunction and lower is not None and upper is not None and not _overlaps(lower, upper):
+        return [FALSE]
+
+    equals = [clause for inclusive, clause in by_kind.get('is', [])]
+    if conjunction and equals:
+        if len(set(freeze(clause['value_vivified']) for clause in equals)) > 1:
+            return [FALSE]
+        value = equals[0]['value_vivified']
+        for bound, is_lower in ((lower, True), (upper, False)):
+            if bound is not None and not _within(value, bound, is_lower):
+                return [FALSE]
+        # x = 3 AND x >= 2 is just x = 3
+        lower = upper = None
+    merged.extend(equals)
+    merged.extend(bound[2] for bound in (lower, upper) if bound is not None)
+
+    bools = [clause for inclusive, clause in by_kind.get('bool', [])]
+    if len(set(bool(clause['value_vivified']) for clause in bools)) > 1:
+        if conjunction:
+            return [FALSE]
+        elif bools[0]['operator_resolved']['value_type'] == 'nullable':
+            # IS NOT NULL OR IS NULL
+            return [TRUE]
+    merged.extend(bools)
+
+    for kind, union in (('in', not conjunction), ('not_in', conjunction)):
+        clauses = [clause for inclusive, clause in by_kind.get(kind, [])]
+        if not clauses:
+            continue
+        values = _combine([clause['value_vivified'] for clause in clauses], union)
+        if not values and kind == 'in':
+            # IN () matches nothing
+            if conjunction:
+                return [FALSE]
+            merged.append(FALSE)
+            continue
+        elif not values:
+            # NOT IN () matches everything but NULL, as `x NOT IN (...)` is
+            # NULL when x is.
+            is_set = _is_set(wnw, clauses[0])
+            merged.extend([is_set] if is_set is not None else clauses)
+            continue
+        merged.append(_with_value(wnw, clauses[0], values))
+    return merged
+
+
+def _pick_bound(bounds, tighter, is_lower):
+    """
+    From [(inclusive, clause)], pick the tightest (or loosest) bound.
+    Returns (value, inclusive, clause), or None.
+    """
+    best = None
+    for inclusive, clause in bounds:
+        value = clause['value_vivified']
+        if best is None:
+            best = (value, inclusive, clause)
+            continue
+        if value == best[0]:
+            # At the same value, exclusive bounds are the tighter ones.
+            replace = (not inclusive) if tighter else inclusive
+        else:
+            replace = (value > best[0]) == (is_lower == tighter)
+        if replace:
+            best = (value, inclusive, clause)
+    return best
+
+
+def _overlaps(lower, upper):
+    if lower[0] == upper[0]:
+        return lower[1] and upper[1]
+    return lower[0] < upper[0]
+
+
+def _within(value, bound, is_lower):
+    bound_value, inclusive, clause = bound
+    if value == bound_value:
+        return inclusive
+    return (value > bound_value) == is_lower
+
+
+def _combine(collections, union):
+    values = list(collections[0])
+    for other in collections[1:]:
+        if union:
+            values.extend(other)
+        else:
+            other = set(other)
+            values = [v for v in values if v in other]
+    seen = set()
+    return [v for v in values if not (v in seen or seen.add(v))]
+
+
+def _is_set(wnw, clause):
+    """
+    A clause for `clause`'s column IS NOT NULL, or None if we can't be
+    sure how one would be built.
+    """
+    if wnw.special_case_handler(clause['data_source'], 'nullable') is not None:
+        return None
+    try:
+        op = wnw.resolve_operator('is set', ['nullable'])
+    except WinnowError:
+        return None
+    return ResolvedClause(
+        wnw, dict(data_source=clause['data_source'], operator=op['name'], value=True),
+        clause['data_source_resolved'], op, True)
+
+
+def _with_value(wnw, clause, value):
+    if value == clause['value_vivified']:
+        return clause
+    return ResolvedClause(
+        wnw, dict(clause.clause, value=value),
+        clause['data_source_resolved'], clause['operator_resolved'], value)
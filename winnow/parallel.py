@@ -0,0 +1,105 @@
+'''winnow/parallel.py
+
+Compile a large batch of filters on a pool of worker processes, to get
+past the GIL.
+
+    for result in compile_parallel(wnw, saved_filters, processes=8):
+        ...
+
+Results come back in the same order as the filters, exactly as from
+Winnow.compile_many (which calls this when given `processes`): a query
+(or WHERE clause) per filter, or the WinnowError it raised.
+
+Each worker builds its own copy of the Winnow once, from its class,
+sources, operators and special case registry, pickled. If any of those
+can't be pickled (eg. a special case handler that's a lambda or a
+closure), or the pool can't be started, the batch is compiled in this
+process instead.
+'''
+from __future__ import unicode_literals
+
+# multiprocessing and pickle are imported when a batch is compiled, as
+# this module is imported along with the rest of winnow.
+
+# Instance attributes rebuilt in each worker rather than pickled.
+_REBUILT = ('_sources', 'schema', 'plan_cache', '_sql')
+
+DEFAULT_CHUNKSIZE = 256
+
+_worker_winnow = None
+
+
+def compile_parallel(wnw, filters, processes=None, chunksize=DEFAULT_CHUNKSIZE, kind='query'):
+    """
+    Yield wnw._compile_many(filters, kind)'s results, computed by
+    `processes` workers (default: one per CPU), `chunksize` filters at a
+    time.
+    """
+    payload = worker_payload(wnw)
+    if payload is None:
+        for result in wnw._compile_many(filters, kind):
+            yield result
+        return
+
+    import multiprocessing
+    try:
+        pool = multiprocessing.Pool(processes, _init_worker, (payload,))
+    except (OSError, ImportError):
+        # eg. no /dev/shm for the pool's semaphores
+        for result in wnw._compile_many(filters, kind):
+            yield result
+        return
+
+    try:
+        chunks = ((kind, chunk) for chunk in _chunked(filters, chunksize))
+        for results in pool.imap(_compile_chunk, chunks):
+            for result in results:
+                yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def worker_payload(wnw):
+    """
+    Everything a worker needs to rebuild `wnw`, pickled, or None if it
+    can't be.
+    """
+    import pickle
+    state = dict((k, v) for k, v in vars(wnw).items() if k not in _REBUILT)
+    try:
+        return pickle.dumps(
+            (type(wnw), state, wnw.sources, dict(wnw._special_cases)),
+            pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return None
+
+
+def _init_worker(payload):
+    global _worker_winnow
+    import pickle
+    cls, state, sources, special_cases = pickle.loads(payload)
+    wnw = cls.__new__(cls)
+    wnw.__dict__.update(state)
+    # The registry as it was in the parent, including handlers registered
+    # after the class was defined.
+    wnw._special_cases = special_cases
+    wnw.sources = sources
+    wnw.sql = None
+    _worker_winnow = wnw
+
+
+def _compile_chunk(args):
+    kind, filters = args
+    return list(_worker_winnow._compile_many(filters, kind))
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
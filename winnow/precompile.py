@@ -0,0 +1,112 @@
+'''winnow/precompile.py
+
+Compile the SQL templates ahead of time, into a directory of python
+modules that a fresh process imports instead of compiling each template
+the first time it's rendered.
+
+    python -m winnow.precompile build/sql_templates myapp.filters:recipe_winnow
+
+and then, at startup, before the first query:
+
+    WinnowSql.compiled_templates = 'build/sql_templates'
+
+The templates compiled are Winnow.query's, those of
+sql_prepare.template_where_clause for every operator, and the ones the
+given Winnows render in Winnow.warm_up (their special cases). A handler that builds its
+template source from the clause is only covered for the warm-up value.
+Any template that isn't in the directory is compiled as usual, so a
+stale build is slower, never wrong. Rebuild when upgrading jinja2,
+though: the modules only work with the version that compiled them.
+'''
+from __future__ import unicode_literals
+
+import argparse
+import copy
+import importlib
+import sys
+
+import jinja2
+
+from . import default_operators
+from .core import Winnow
+from .error import WinnowError
+from .sql_prepare import template_where_clause
+from .templating import template_name
+from .templating import WinnowSql
+
+
+def default_templates(operators=default_operators.OPERATORS):
+    """
+    The sources of the templates Winnow renders itself: the query, and
+    template_where_clause's for each of `operators`.
+    """
+    wnw = Winnow('table', [])
+    wnw.sql = WinnowSql(compiled_templates=None)
+    wnw.warm_up()
+    for op in operators:
+        value_type = wnw.coalesce_value_type(op['value_type'])
+        if value_type not in wnw.warm_up_values:
+            continue
+        value = wnw.vivify(value_type, wnw.warm_up_values[value_type])
+        template_where_clause('column', op, value, wnw.sql)
+    return wnw.sql.template_cache.keys()
+
+
+def winnow_templates(wnw, log=None):
+    """
+    The sources of the templates wnw renders during wnw.warm_up(). `log`
+    is called with a message for each special case handler that raised.
+    """
+    wnw = copy.copy(wnw)
+    wnw.sql = wnw.sql_class(compiled_templates=None)
+    for source_name, op_name, e in wnw.warm_up():
+        if log:
+            log('{} {!r} {!r}: {!r}'.format(type(wnw).__name__, source_name, op_name, e))
+    return wnw.sql.template_cache.keys()
+
+
+def compile_templates(sources, target, sql_class=WinnowSql):
+    """
+    Compile each template source into a module in the directory
+    `target`, for WinnowSql.compiled_templates. Templates are compiled
+    by an environment from `sql_class`, which should be the class that
+    renders them.
+    """
+    sql = sql_class(compiled_templates=None)
+    sql.env.loader = jinja2.DictLoader(dict((template_name(source), source) for source in sources))
+    sql.env.compile_templates(target, zip=None, ignore_errors=False)
+
+
+def load_winnow(spec):
+    """
+    Import 'package.module:name', where name is a Winnow, or a function
+    returning one.
+    """
+    module_name, _, attr = spec.partition(':')
+    if not attr:
+        raise WinnowError("Expected 'module:name', not '{}'".format(spec))
+    wnw = getattr(importlib.import_module(module_name), attr)
+    if not isinstance(wnw, Winnow):
+        wnw = wnw()
+    return wnw
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compile winnow SQL templates ahead of time.')
+    parser.add_argument('target', help='directory to write the compiled templates to')
+    parser.add_argument('winnows', nargs='*', metavar='module:name',
+                        help='Winnows whose special cases to compile the templates of')
+    args = parser.parse_args(argv)
+
+    def log(message):
+        sys.stderr.write(message + '\n')
+
+    sources = set(default_templates())
+    for spec in args.winnows:
+        sources.update(winnow_templates(load_winnow(spec), log))
+    compile_templates(sources, args.target)
+    log('compiled {} templates into {}'.format(len(sources), args.target))
+
+
+if __name__ == '__main__':
+    main()
@@ -37,89 +37,191 @@ valid_rel_date_values = (
 )
 
 
-def interpret_date_range(drange):
+a_few_seconds = timedelta(seconds=3)
+one_day = timedelta(days=1)
+seven_days = timedelta(days=7)
+fourteen_days = timedelta(days=14)
+thirty_days = timedelta(days=30)
+fortyfive_days = timedelta(days=45)
+at_now = timedelta(0)
 
-    drange = drange.lower().replace(' ', '_')
 
-    today = datetime.now()
-    a_few_seconds = timedelta(seconds=3)
-    one_day = timedelta(days=1)
-    start_of_day = dt.time()
-    beginning_today = datetime.combine(today.date(), start_of_day)
+def first_day_of_month(d):
+    return datetime(year=d.year, month=d.month, day=1)
+
+def last_day_of_month(d):
+    """The last moment of d's month."""
+    start = first_day_of_month(d)
+    return first_day_of_month(start + timedelta(days=32)) - dt.datetime.resolution
+
+def first_day_of_year(d, base_month=1):
+    year = d.year if d.month >= base_month else d.year - 1
+    return datetime(year=year, month=base_month, day=1)
+
+def last_day_of_year(d, base_month=1):
+    """The last moment of the (possibly fiscal) year containing d."""
+    start = first_day_of_year(d, base_month)
+    return datetime(year=start.year + 1, month=base_month, day=1) - dt.datetime.resolution
+
+
+def date_ranges_for_day(today, base_month=1):
+    """
+    Compute every relative date range for the date `today`.
+
+    Returns {drange: (start, end)}. Endpoints that depend on the time of
+    day (like the end of 'last_7_days') are timedeltas, to be added to the
+    current time; the rest are datetimes.
+    """
+    beginning_today = datetime.combine(today, dt.time())
     end_today = beginning_today + one_day
-    weekstart = datetime.combine(today.date(), start_of_day) - timedelta(days=(today.isoweekday() % 7))
-    seven_days = timedelta(days=7)
-    fourteen_days = timedelta(days=14)
-    thirty_days = timedelta(days=30)
-    fortyfive_days = timedelta(days=45)
-
-    if drange == 'last_full_week':
-        return weekstart - seven_days, weekstart
-    elif drange == 'last_two_full_weeks':
-        return weekstart - fourteen_days, weekstart
-    elif drange == 'last_7_days':
-        return today - seven_days, today + a_few_seconds
-    elif drange == 'last_14_days':
-        return today - fourteen_days, today + a_few_seconds
-    elif drange == 'last_30_days':
-        return today - thirty_days, today + a_few_seconds
-    elif drange == 'last_45_days':
-        return today - fortyfive_days, today + a_few_seconds
-    elif drange == 'last_60_days':
-        return today - (2 * thirty_days), today + a_few_seconds
-    elif drange == 'next_7_days':
-        return today, today + seven_days
-    elif drange == 'next_14_days':
-        return today, today + fourteen_days
-    elif drange == 'next_30_days':
-        return today, today + thirty_days
-    elif drange == 'next_45_days':
-        return today, today + fortyfive_days
-    elif drange == 'next_60_days':
-        return today, today + (2 * thirty_days)
-    elif drange == 'next_week':
-        return weekstart + seven_days, weekstart + seven_days + seven_days
-    elif drange == 'current_week':
-        return weekstart, weekstart + seven_days
-    elif drange == 'current_month':
-        return first_day_of_month(today), last_day_of_month(today)
-    elif drange == 'current_and_next_month':
-        start_of_current = first_day_of_month(today)
-        return start_of_current, last_day_of_month(start_of_current + fortyfive_days)
-    elif drange == 'current_and_next_year':
-        next_year = last_day_of_year(today, base_month) + timedelta(days=2)
-        return first_day_of_year(today, base_month), last_day_of_year(next_year, base_month)
-    elif drange == 'two_weeks_past_end_of_month':
-        return first_day_of_month(today), last_day_of_month(today) + fourteen_days
-    elif drange == 'two_weeks_past_end_of_year':
-        return first_day_of_year(today, base_month), last_day_of_year(today, base_month) + fourteen_days
-    elif drange == 'current_year':
-        return (datetime(year=today.year, month=1, day=1),
-                datetime(year=today.year+1, month=1, day=1) - dt.datetime.resolution)
-    elif drange == 'next_year':
-        next_year = last_day_of_year(today, base_month=1)
-        return first_day_of_year(next_year + seven_days, base_month=1), last_day_of_year(next_year + seven_days, base_month=1)
-    elif drange == 'last_month':
-        last_month = first_day_of_month(today) - timedelta(days=2)
-        return first_day_of_month(last_month), last_day_of_month(last_month)
-    elif drange == 'next_month':
-        next_month = last_day_of_month(today) + timedelta(days=2)
-        return first_day_of_month(next_month), last_day_of_month(next_month)
-    elif drange == 'past':
-        return datetime.fromtimestamp(0), beginning_today - timedelta(microseconds=1)
-    elif drange == 'past_and_today':
-        return datetime.fromtimestamp(0), today
-    elif drange == 'future':
-        return today, datetime(year=today.year+1000, month=1, day=1)
-    elif drange == 'future_and_today':
-        return beginning_today, datetime(year=today.year+1000, month=1, day=1)
-    elif drange == 'past_and_future':
-        return datetime.fromtimestamp(0), datetime(year=today.year+1000, month=1, day=1)
-    elif drange == 'yesterday':
-        return beginning_today - one_day, beginning_today
-    elif drange == 'today':
-        return beginning_today, end_today
-    elif drange == 'tomorrow':
-        return end_today, end_today + one_day
-    else:
-        raise WinnowError("unknown date description '{}'".format(drange))
+    weekstart = beginning_today - timedelta(days=(today.isoweekday() % 7))
+    epoch = datetime.fromtimestamp(0)
+    far_future = datetime(year=today.year+1000, month=1, day=1)
+    start_of_current = first_day_of_month(today)
+    next_year = last_day_of_year(today, base_month=1) + seven_days
+    last_month = start_of_current - timedelta(days=2)
+    next_month = last_day_of_month(today) + timedelta(days=2)
+
+    return {
+        'last_full_week': (weekstart - seven_days, weekstart),
+        'last_two_full_weeks': (weekstart - fourteen_days, weekstart),
+        'last_7_days': (-seven_days, a_few_seconds),
+        'last_14_days': (-fourteen_days, a_few_seconds),
+        'last_30_days': (-thirty_days, a_few_seconds),
+        'last_45_days': (-fortyfive_days, a_few_seconds),
+        'last_60_days': (-(2 * thirty_days), a_few_seconds),
+        'next_7_days': (at_now, seven_days),
+        'next_14_days': (at_now, fourteen_days),
+        'next_30_days': (at_now, thirty_days),
+        'next_45_days': (at_now, fortyfive_days),
+        'next_60_days': (at_now, 2 * thirty_days),
+        'next_week': (weekstart + seven_days, weekstart + seven_days + seven_days),
+        'current_week': (weekstart, weekstart + seven_days),
+        'current_month': (start_of_current, last_day_of_month(today)),
+        'current_and_next_month': (
+            start_of_current, last_day_of_month(start_of_current + fortyfive_days)),
+        'current_and_next_year': (
+            first_day_of_year(today, base_month),
+            last_day_of_year(last_day_of_year(today, base_month) + timedelta(days=2), base_month)),
+        'two_weeks_past_end_of_month': (
+            start_of_current, last_day_of_month(today) + fourteen_days),
+        'two_weeks_past_end_of_year': (
+            first_day_of_year(today, base_month), last_day_of_year(today, base_month) + fourteen_days),
+        'current_year': (
+            datetime(year=today.year, month=1, day=1),
+            datetime(year=today.year+1, month=1, day=1) - dt.datetime.resolution),
+        'next_year': (
+            first_day_of_year(next_year, base_month=1), last_day_of_year(next_year, base_month=1)),
+        'last_month': (first_day_of_month(last_month), last_day_of_month(last_month)),
+        'next_month': (first_day_of_month(next_month), last_day_of_month(next_month)),
+        'past': (epoch, beginning_today - timedelta(microseconds=1)),
+        'past_and_today': (epoch, at_now),
+        'future': (at_now, far_future),
+        'future_and_today': (beginning_today, far_future),
+        'past_and_future': (epoch, far_future),
+        'yesterday': (beginning_today - one_day, beginning_today),
+        'today': (beginning_today, end_today),
+        'tomorrow': (end_today, end_today + one_day),
+    }
+
+
+class DateRangeTable(object):
+    """
+    Answers interpret_date_range from a table of every range, rebuilt only
+    when the date changes.
+
+    `clock` returns the current (naive) datetime; pass your own to pin
+    the time in tests.
+    """
+    def __init__(self, clock=datetime.now, base_month=1):
+        self.clock = clock
+        self.base_month = base_month
+        self._day_and_ranges = (None, None)
+
+    def ranges(self, now):
+        day, ranges = self._day_and_ranges
+        if day != now.date():
+            day = now.date()
+            ranges = date_ranges_for_day(day, self.base_month)
+            # A single assignment, so other threads see the old table or the
+            # new one, never a mix of the two.
+            self._day_and_ranges = (day, ranges)
+        return ranges
+
+    def interpret(self, drange, now=None):
+        """
+        Return the (start, end) datetimes for a relative date value,
+        as of `now` (default: the clock's current time).
+        """
+        if now is None:
+            now = self.clock()
+        try:
+            start, end = self.ranges(now)[drange]
+        except KeyError:
+            drange = drange.lower().replace(' ', '_')
+            try:
+                start, end = self.ranges(now)[drange]
+            except KeyError:
+                raise WinnowError("unknown date description '{}'".format(drange))
+        if isinstance(start, timedelta):
+            start = now + start
+        if isinstance(end, timedelta):
+            end = now + end
+        return start, end
+
+default_date_ranges = DateRangeTable()
+
+
+def interpret_date_range(drange, now=None):
+    return default_date_ranges.interpret(drange, now)
+
+
+# The same ranges, computed by PostgreSQL at query time, as (start, end)
+# SQL expressions. Queries built from these never change from day to day.
+_today = "date_trunc('day', LOCALTIMESTAMP)"
+_weekstart = "({} - extract(dow from LOCALTIMESTAMP) * interval '1 day')".format(_today)
+_month = "date_trunc('month', LOCALTIMESTAMP)"
+_year = "date_trunc('year', LOCALTIMESTAMP)"
+_epoch = "'epoch'::timestamp"
+_far_future = "({} + interval '1000 years')".format(_year)
+_soon = "(LOCALTIMESTAMP + interval '3 seconds')"
+
+def _days(base, n):
+    return "({} {} interval '{} days')".format(base, '-' if n < 0 else '+', abs(n))
+
+def _end_of(base, span):
+    return "({} + interval '{}' - interval '1 microsecond')".format(base, span)
+
+SERVER_DATE_RANGES = {
+    'last_full_week': (_days(_weekstart, -7), _weekstart),
+    'last_two_full_weeks': (_days(_weekstart, -14), _weekstart),
+    'last_7_days': (_days('LOCALTIMESTAMP', -7), _soon),
+    'last_14_days': (_days('LOCALTIMESTAMP', -14), _soon),
+    'last_30_days': (_days('LOCALTIMESTAMP', -30), _soon),
+    'last_45_days': (_days('LOCALTIMESTAMP', -45), _soon),
+    'last_60_days': (_days('LOCALTIMESTAMP', -60), _soon),
+    'next_7_days': ('LOCALTIMESTAMP', _days('LOCALTIMESTAMP', 7)),
+    'next_14_days': ('LOCALTIMESTAMP', _days('LOCALTIMESTAMP', 14)),
+    'next_30_days': ('LOCALTIMESTAMP', _days('LOCALTIMESTAMP', 30)),
+    'next_45_days': ('LOCALTIMESTAMP', _days('LOCALTIMESTAMP', 45)),
+    'next_60_days': ('LOCALTIMESTAMP', _days('LOCALTIMESTAMP', 60)),
+    'next_week': (_days(_weekstart, 7), _days(_weekstart, 14)),
+    'current_week': (_weekstart, _days(_weekstart, 7)),
+    'current_month': (_month, _end_of(_month, '1 month')),
+    'current_and_next_month': (_month, _end_of(_month, '2 months')),
+    'current_and_next_year': (_year, _end_of(_year, '2 years')),
+    'two_weeks_past_end_of_month': (_month, _days(_end_of(_month, '1 month'), 14)),
+    'two_weeks_past_end_of_year': (_year, _days(_end_of(_year, '1 year'), 14)),
+    'current_year': (_year, _end_of(_year, '1 year')),
+    'next_year': ("({} + interval '1 year')".format(_year), _end_of(_year, '2 years')),
+    'last_month': ("({} - interval '1 month')".format(_month), "({} - interval '1 microsecond')".format(_month)),
+    'next_month': ("({} + interval '1 month')".format(_month), _end_of(_month, '2 months')),
+    'past': (_epoch, "({} - interval '1 microsecond')".format(_today)),
+    'past_and_today': (_epoch, 'LOCALTIMESTAMP'),
+    'future': ('LOCALTIMESTAMP', _far_future),
+    'future_and_today': (_today, _far_future),
+    'past_and_future': (_epoch, _far_future),
+    'yesterday': (_days(_today, -1), _today),
+    'today': (_today, _days(_today, 1)),
+    'tomorrow': (_days(_today, 1), _days(_today, 2)),
+}
@@ -0,0 +1,238 @@
+'''winnow/result_cache.py
+
+Cache the rows a filter's query returns, so that many users opening the
+same saved view within a short time cost one query between them.
+
+    cache = ResultCache(wnw, connection, MemoryStore(maxsize=256, ttl=30))
+    rows = cache.rows(filt)
+
+    # after writing to the table
+    cache.invalidate()
+
+Results are keyed by fingerprint(wnw, filt), which is the same for
+filters that only differ in the order of their clauses, the order of an
+`any of` list, or how their values were written ('3' and 3), and which
+changes when a relative date like 'today' or 'last 7 days' starts
+meaning another day.
+
+Storage is pluggable. Anything with get / set / invalidate(table) /
+clear methods will do; MemoryStore keeps results in-process, and
+FileStore on disk, where they're shared between processes (put it
+under /dev/shm to keep them in shared memory).
+'''
+from __future__ import unicode_literals
+
+import errno
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from six.moves.urllib.parse import quote
+
+from .nodes import ResolvedConstant
+from .nodes import ResolvedFilter
+from .utils import LRUCache
+
+
+def fingerprint(wnw, filt):
+    """
+    A hex digest identifying the rows wnw.query(filt) returns.
+    """
+    canonical = [wnw.table, _canonical(wnw, wnw._compilable(filt))]
+    dumped = json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(dumped.encode('utf-8')).hexdigest()
+
+
+def _canonical(wnw, node):
+    """
+    A json-able description of a resolved node, with the children of
+    groups sorted (and de-duplicated), as & and | don't care about order.
+    """
+    if isinstance(node, ResolvedFilter):
+        children = set(json.dumps(_canonical(wnw, c), sort_keys=True) for c in node.filter_clauses)
+        return ['group', node.logical_op, sorted(children)]
+    elif isinstance(node, ResolvedConstant):
+        return ['constant', node.constant]
+    op = node['operator_resolved']
+    return ['clause', node['data_source'], node['data_source_resolved'].get('column'),
+            op['name'], _normalized_value(wnw, op['value_type'], node['value_vivified'])]
+
+
+def _normalized_value(wnw, value_type, value):
+    if value_type == 'relative_date':
+        return _date_range(wnw, value)
+    elif value_type == 'collection':
+        value = sorted(set(value))
+    return wnw.stringify(value_type, value)
+
+
+def _date_range(wnw, value):
+    """
+    The range a relative date covers today. Endpoints relative to the
+    current time (eg. the end of 'last 7 days') stay relative, along with
+    today's date, so the fingerprint changes from day to day rather than
+    from one second to the next; a store's ttl bounds how stale those
+    results get within the day.
+    """
+    date_ranges = wnw.date_ranges
+    now = date_ranges.clock()
+    endpoints = date_ranges.ranges(now)[value]
+    if any(isinstance(e, timedelta) for e in endpoints):
+        return [('now{:+d}s'.format(int(e.total_seconds())) if isinstance(e, timedelta)
+                 else e.isoformat()) for e in endpoints] + [now.date().isoformat()]
+    return [e.isoformat() for e in endpoints]
+
+
+class ResultCache(object):
+    """
+    Run wnw.query(filt) on `connection` (any DB-API connection), and keep
+    the rows it returns in `store` (default: an in-process MemoryStore).
+    """
+    def __init__(self, wnw, connection, store=None):
+        self.wnw = wnw
+        self.connection = connection
+        self.store = store if store is not None else MemoryStore()
+
+    def rows(self, filt):
+        key = fingerprint(self.wnw, filt)
+        rows = self.store.get(self.wnw.table, key)
+        if rows is None:
+            cursor = self.connection.cursor()
+            try:
+                cursor.execute(*self.wnw.query(filt))
+                rows = list(cursor.fetchall())
+            finally:
+                cursor.close()
+            self.store.set(self.wnw.table, key, rows)
+        return rows
+
+    def invalidate(self, table=None):
+        """
+        Forget the cached results for `table` (by default, the Winnow's
+        own). Call this whenever the table is written to.
+        """
+        self.store.invalidate(self.wnw.table if table is None else table)
+
+
+class MemoryStore(object):
+    """
+    Keeps up to `maxsize` results in memory, evicting the least recently
+    used. Results older than `ttl` seconds (if given) are dropped.
+    """
+    def __init__(self, maxsize=256, ttl=None, clock=time.time):
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = LRUCache(maxsize)
+
+    def get(self, table, key):
+        entry = self.entries.get((table, key))
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and self.clock() >= expires:
+            self.entries.pop((table, key))
+            return None
+        return value
+
+    def set(self, table, key, value):
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        self.entries.set((table, key), (expires, value))
+
+    def invalidate(self, table):
+        for entry_key in self.entries.keys():
+            if entry_key[0] == table:
+                self.entries.pop(entry_key)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class FileStore(object):
+    """
+    Keeps up to `maxsize` pickled results in `directory`, one sub-directory
+    per table, evicting the least recently used. Results older than `ttl`
+    seconds (if given) are dropped.
+
+    Only share a directory between processes that trust each other, as
+    the results are unpickled.
+    """
+    suffix = '.pickle'
+
+    def __init__(self, directory, maxsize=1024, ttl=None, clock=time.time):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+
+    def _table_dir(self, table):
+        return os.path.join(self.directory, quote(table, safe=''))
+
+    def _path(self, table, key):
+        return os.path.join(self._table_dir(table), key + self.suffix)
+
+    def get(self, table, key):
+        path = self._path(table, key)
+        try:
+            with open(path, 'rb') as f:
+                expires, value = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and self.clock() >= expires:
+            self._remove(path)
+            return None
+        try:
+            # Eviction goes by modification time, so mark it as used.
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def set(self, table, key, value):
+        if not self.maxsize:
+            return
+        table_dir = self._table_dir(table)
+        try:
+            os.makedirs(table_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        # Write then rename, so readers never see half a file.
+        fd, tmp_path = tempfile.mkstemp(dir=table_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires, value), f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, self._path(table, key))
+        self._evict()
+
+    def _evict(self):
+        paths = []
+        for table_dir in os.listdir(self.directory):
+            table_dir = os.path.join(self.directory, table_dir)
+            for name in os.listdir(table_dir):
+                if name.endswith(self.suffix):
+                    path = os.path.join(table_dir, name)
+                    try:
+                        paths.append((os.path.getmtime(path), path))
+                    except OSError:
+                        pass  # removed by another process
+        paths.sort()
+        for mtime, path in paths[:max(0, len(paths) - self.maxsize)]:
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def invalidate(self, table):
+        shutil.rmtree(self._table_dir(table), ignore_errors=True)
+
+    def clear(self):
+        for table_dir in os.listdir(self.directory):
+            shutil.rmtree(os.path.join(self.directory, table_dir), ignore_errors=True)
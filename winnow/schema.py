@@ -0,0 +1,89 @@
+'''winnow/schema.py
+
+A precomputed index over a Winnow's sources and operators, so that
+resolving a filter clause is a couple of dict lookups rather than
+several scans of the (possibly very long) sources and operators lists.
+
+A Schema is never modified after it's built. If the sources or
+operators change, build a new one.
+'''
+from __future__ import unicode_literals
+
+from .error import WinnowError
+from .utils import LRUCache
+from .utils import string_types
+
+
+class Schema(object):
+    __slots__ = (
+        'sources', 'operators',
+        '_sources_by_name', '_ambiguous_sources', '_operators_by_key',
+        '_coalesced_value_types')
+
+    def __init__(self, sources, operators):
+        self.sources = tuple(sources)
+        self.operators = operators
+
+        # (lowercase op name, value_type) -> (position, op). When several
+        # operators match, the one listed last wins.
+        self._operators_by_key = {}
+        self._coalesced_value_types = {}
+        for ix, op in enumerate(operators):
+            self._operators_by_key[(op['name'].lower(), op['value_type'])] = (ix, op)
+            self._coalesced_value_types.setdefault(
+                op['value_type'], op.get('coalesced_value_type', op['value_type']))
+
+        self._sources_by_name = {}
+        self._ambiguous_sources = set()
+        for source in self.sources:
+            name = source['display_name']
+            if name in self._sources_by_name:
+                self._ambiguous_sources.add(name)
+            self._sources_by_name[name] = source
+
+    def resolve_source(self, source_name):
+        """
+        Given a source name, return a resolved data source.
+
+        Raise an error if the source name is not allowable
+        """
+        try:
+            source = self._sources_by_name[source_name]
+        except (KeyError, TypeError):
+            raise WinnowError("Unknown data source '{}'".format(source_name))
+        if source_name in self._ambiguous_sources:
+            raise WinnowError("Ambiguous data source '{}'".format(source_name))
+        return source
+
+    def resolve_operator(self, op_name, value_types):
+        '''Given an operator name, return an Op object.
+
+        Raise an error if the operator is not found'''
+        if not isinstance(op_name, string_types):
+            raise WinnowError("Bad operator type, '{}'. expected string".format(type(op_name)))
+        op_name = op_name.lower()
+        matches = [self._operators_by_key[(op_name, vt)]
+                   for vt in value_types if (op_name, vt) in self._operators_by_key]
+        if not matches:
+            raise WinnowError("Unknown operator '{}'".format(op_name))
+        return max(matches, key=lambda match: match[0])[1]
+
+    def coalesce_value_type(self, value_type):
+        return self._coalesced_value_types.get(value_type, value_type)
+
+
+_operator_schemas = LRUCache(64)
+
+def operator_schema(operators):
+    """
+    Return a (source-less) Schema for an operators list, building it only
+    the first time that list is seen.
+
+    Operator lists are identified by identity, so extend them by building
+    a new list (`Winnow.operators + [...]`) rather than appending in place.
+    """
+    schema = _operator_schemas.get(id(operators))
+    if schema is None or schema.operators is not operators:
+        schema = Schema((), operators)
+        _operator_schemas.set(id(operators), schema)
+    return schema
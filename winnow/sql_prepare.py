@@ -1,6 +1,19 @@
 from . import default_operators
+from . import relative_dates
 from .error import WinnowError
-from .templating import WinnowSql
+from .fragments import adapt_param
+from .fragments import SqlFragment
+
+# Shared by every call so that the compiled templates below are cached.
+# Made on first use, as it means importing jinja2.
+_sql = None
+
+def _template_sql():
+    global _sql
+    if _sql is None:
+        from .templating import WinnowSql
+        _sql = WinnowSql()
+    return _sql
 
 def sql_type(value_type):
     if value_type in ('absolute_date', 'relative_date'):
@@ -9,18 +22,273 @@ def sql_type(value_type):
         return value_type
     return None
 
-def where_clause(column, op, value):
+
+def more_than_words_regex(value):
+    return r'(\S+\s+){' + str(int(value)) + r'}\S+$'
+
+def fewer_than_words_regex(value):
+    return r'^(\S+\s+){0,' + str(int(value) - 1) + r'}\S*$'
+
+
+def where_clause(column, op, value, collection_strategy=None, collection_sql_type=None):
     """
     Convert a default case filter clause into a WHERE clause.
 
-    Expects a column, operator, and a value.
+    Expects a column, operator, and a value. For collections,
+    collection_strategy picks how the values are bound (see
+    COLLECTION_STRATEGIES); the default is one parameter per value.
+    Collection values are strings, so for a column of another type,
+    collection_sql_type (eg. 'bigint') is what they're cast to.
+
+    The built-in value types are assembled directly (see CLAUSE_BUILDERS),
+    anything else goes through the jinja templates in template_where_clause.
+    """
+    if collection_strategy is not None and op['value_type'] == 'collection':
+        return collection_builder(collection_strategy)(column, op, value, collection_sql_type)
+    builder = CLAUSE_BUILDERS.get(op['value_type'])
+    if builder is not None:
+        return builder(column, op, value)
+    return template_where_clause(column, op, value)
+
+
+def _binary_clause(column, op, value):
+    value, suffix = adapt_param(value)
+    return SqlFragment(
+        '({} {} %s{})'.format(column, default_operators.get_sql_binary_op(op['name']), suffix),
+        [value])
+
+def _nullable_clause(column, op, value):
+    return SqlFragment(
+        '{} IS {} NULL'.format(column, ' NOT' if value else ''),
+        [])
+
+def _collection_clause(column, op, value, sql_type=None):
+    # Postgres coerces the (untyped) values to the column's type itself.
+    return SqlFragment(
+        '({} {} IN ({}) )'.format(
+            column,
+            'NOT' if op['negative'] else '',
+            ','.join('%s' for _ in value)),
+        list(value))
+
+def _array_collection_clause(column, op, value, sql_type=None):
+    # The whole list is a single parameter, so the SQL is the same no
+    # matter how many values there are. It's bound as a text[], which
+    # only compares with a text column unless it's cast.
+    return SqlFragment(
+        '({} {}(%s{}))'.format(
+            column, '<> ALL' if op['negative'] else '= ANY', _cast(sql_type, array=True)),
+        [list(value)])
+
+def _values_collection_clause(column, op, value, sql_type=None):
+    # Like templating._anyclause
+    rows = ', '.join('(%s{})'.format(_cast(sql_type)) for _ in value) or '(NULL)'
+    return SqlFragment(
+        '({} {}(VALUES {}))'.format(column, '<> ALL' if op['negative'] else '= ANY', rows),
+        list(value))
+
+class TableValues(list):
     """
-    w = WinnowSql()
+    A collection value whose elements have been loaded into a (temporary)
+    table with a single `value` column, of type `sql_type`. See
+    temp_tables.py.
+    """
+    def __init__(self, table_name, values, sql_type=None):
+        super(TableValues, self).__init__(values)
+        self.table_name = table_name
+        self.sql_type = sql_type
+
+def _table_collection_clause(column, op, value, sql_type=None):
+    exists = 'EXISTS (SELECT 1 FROM {table} WHERE {table}.value = {column})'.format(
+        table=value.table_name, column=column)
+    if op['negative']:
+        # NOT IN never matches a NULL column, so NOT EXISTS shouldn't either.
+        return SqlFragment('({} IS NOT NULL AND NOT {})'.format(column, exists), [])
+    return SqlFragment('({})'.format(exists), [])
+
+def _cast(sql_type, array=False):
+    if sql_type is None:
+        return ''
+    return '::{}{}'.format(sql_type, '[]' if array else '')
+
+# Ways of binding the values of a collection clause:
+#   inclause: col IN (%s,%s,...), one param per value
+#   array: col = ANY(%s), the whole list as one (array) param
+#   values: col = ANY(VALUES (%s),(%s),...), one param per value
+#   table: EXISTS (SELECT 1 FROM <table> ...), for TableValues only
+COLLECTION_STRATEGIES = {
+    'inclause': _collection_clause,
+    'array': _array_collection_clause,
+    'values': _values_collection_clause,
+    'table': _table_collection_clause,
+}
+
+def collection_builder(strategy):
+    try:
+        return COLLECTION_STRATEGIES[strategy]
+    except KeyError:
+        raise WinnowError("Unknown collection strategy '{}'".format(strategy))
+
+def collection_shape(strategy, value):
+    """
+    Like CLAUSE_SHAPES['collection'], for a given collection strategy.
+    """
+    if strategy == 'array':
+        return strategy
+    elif strategy == 'table':
+        return strategy, value.table_name
+    return strategy, len(value)
+
+def collection_params(strategy, value):
+    if strategy == 'array':
+        return [list(value)]
+    elif strategy == 'table':
+        return []
+    return list(value)
+
+def _relative_date_sql(column, op, start, end):
+    if op['negative']:
+        return '({column} < {start} OR {column} >= {end})'.format(column=column, start=start, end=end)
+    return '({column} >= {start} AND {column} < {end})'.format(column=column, start=start, end=end)
+
+def relative_date_clause(column, op, value, date_ranges=None, server_side=False):
+    """
+    Build a 'within' / 'outside of' clause. The range is looked up in
+    `date_ranges` (a relative_dates.DateRangeTable) and bound as params,
+    or with server_side=True, computed by the database at query time.
+    """
+    if server_side:
+        try:
+            start, end = relative_dates.SERVER_DATE_RANGES[value]
+        except KeyError:
+            raise WinnowError("unknown date description '{}'".format(value))
+        return SqlFragment(_relative_date_sql(column, op, start, end), [])
+    params = _relative_date_params(op, value, date_ranges)
+    return SqlFragment(_relative_date_sql(column, op, '%s::timestamp', '%s::timestamp'), params)
+
+def _relative_date_params(op, value, date_ranges=None):
+    return list((date_ranges or relative_dates.default_date_ranges).interpret(value))
+
+def _bool_clause(column, op, value):
+    return SqlFragment(
+        '({} {})'.format('' if value else 'NOT ', column),
+        [])
+
+# The whitespace here matches what the jinja template in
+# template_where_clause renders, so both paths give identical SQL.
+_STRING_IS_TAIL = '\n            \n            )'
+_STRING_IS_BLANK_TAIL = (
+    '\n            \n                \n'
+    '                OR {} IS NULL\n            \n            )')
+
+def _string_clause(column, op, value):
+    value, suffix = adapt_param(value)
+    if op['name'] == 'contains':
+        return SqlFragment(
+            "({} ILIKE '%%' || %s{} || '%%')".format(column, suffix),
+            [value])
+    elif op['name'] == 'starts with':
+        return SqlFragment(
+            "({} ILIKE %s{} || '%%')".format(column, suffix),
+            [value])
+    if op['name'] == 'is' and value == '':
+        tail = _STRING_IS_BLANK_TAIL.format(column)
+    else:
+        tail = _STRING_IS_TAIL
+    return SqlFragment(
+        '({} {} %s{}'.format(column, default_operators.get_sql_binary_op(op['name']), suffix) + tail,
+        [value])
+
+def _string_length_clause(column, op, value):
+    if op['name'] == 'more than __ words':
+        return SqlFragment('({} ~ %s )'.format(column), [more_than_words_regex(value)])
+    elif op['name'] == 'fewer than __ words':
+        if value <= 0:
+            return SqlFragment('({} IS NULL)'.format(column), [])
+        return SqlFragment('({} ~ %s)'.format(column), [fewer_than_words_regex(value)])
+    return template_where_clause(column, op, value)
+
+CLAUSE_BUILDERS = {
+    'numeric': _binary_clause,
+    'absolute_date': _binary_clause,
+    'nullable': _nullable_clause,
+    'collection': _collection_clause,
+    'bool': _bool_clause,
+    'string': _string_clause,
+    'string_length': _string_length_clause,
+    'relative_date': relative_date_clause,
+}
+
+
+def _binary_shape(op, value):
+    return adapt_param(value)[1]
+
+def _binary_params(op, value):
+    return [adapt_param(value)[0]]
+
+def _string_shape(op, value):
+    return adapt_param(value)[1], op['name'] == 'is' and value == ''
+
+def _string_length_shape(op, value):
+    return op['name'] == 'fewer than __ words' and value <= 0
+
+def _string_length_params(op, value):
+    if op['name'] == 'more than __ words':
+        return [more_than_words_regex(value)]
+    elif value <= 0:
+        return []
+    return [fewer_than_words_regex(value)]
+
+# The parts of a value that change the SQL text CLAUSE_BUILDERS produce
+# (rather than just the params). Two clauses on the same column and
+# operator with equal shapes render identical SQL.
+CLAUSE_SHAPES = {
+    'numeric': _binary_shape,
+    'absolute_date': _binary_shape,
+    'nullable': lambda op, value: bool(value),
+    'collection': lambda op, value: len(value),
+    'bool': lambda op, value: bool(value),
+    'string': _string_shape,
+    'string_length': _string_length_shape,
+    'relative_date': lambda op, value: None,
+}
+
+# Just the params CLAUSE_BUILDERS would bind, without building the SQL.
+CLAUSE_PARAMS = {
+    'numeric': _binary_params,
+    'absolute_date': _binary_params,
+    'nullable': lambda op, value: [],
+    'collection': lambda op, value: list(value),
+    'bool': lambda op, value: [],
+    'string': _binary_params,
+    'string_length': _string_length_params,
+    'relative_date': _relative_date_params,
+}
+
+
+def template_where_clause(column, op, value, sql=None):
+    """
+    The jinja-template implementation of where_clause, rendered with
+    `sql` (a WinnowSql; by default, one shared by every call).
+
+    Slower than the CLAUSE_BUILDERS, but kept as the reference
+    implementation and as the fallback for unknown operators.
+    """
+    w = sql if sql is not None else _template_sql()
     if op['value_type'] == 'nullable':
         return w.prepare_query(
             '{{ column | sqlsafe }} IS {{ maybe_not | sqlsafe }} NULL',
             column=column,
             maybe_not=' NOT' if value else '')
+    elif op['value_type'] == 'relative_date':
+        start, end = relative_dates.interpret_date_range(value)
+        if op['negative']:
+            return w.prepare_query(
+                '''({{ column | sqlsafe }} < {{ start }} OR {{ column | sqlsafe }} >= {{ end }})''',
+                column=column, start=start, end=end)
+        return w.prepare_query(
+            '''({{ column | sqlsafe }} >= {{ start }} AND {{ column | sqlsafe }} < {{ end }})''',
+            column=column, start=start, end=end)
     elif op['value_type'] == 'absolute_date':
         return w.prepare_query(
             '''({{ column | sqlsafe }} {{ bin_op | sqlsafe }} {{ value  }})''',
@@ -65,18 +333,17 @@ def where_clause(column, op, value):
             )''',
             column=column,
             bin_op=default_operators.get_sql_binary_op(op['name']),
+            op_name=op['name'],
             value=value)
     elif op['value_type'] == 'string_length':
         if op['name'] == 'more than __ words':
-            regex = '(\S+\s+){' + str(int(value)) + '}\S+$'
             return w.prepare_query(
-                '''({{ column | sqlsafe }} ~ {{ regex | sqlsafe }} )''',
-                                     column=column, regex=regex)
+                '''({{ column | sqlsafe }} ~ {{ regex }} )''',
+                column=column, regex=more_than_words_regex(value))
         elif op['name'] == 'fewer than __ words':
             if value <= 0:
-                return '({column} IS NULL)'.format(column=column)
-            regex = '^(\S+\s+){0,' + str(int(value) - 1) + '}\S*$'
-            return w.prepare_query('''({{column}} ~ {{ regex | sqlsafe }})''',
-                                   column=column, regex=regex)
-    else:
-        raise WinnowError("Unknown operator type '{}'".format(op['value_type']))
+                return w.prepare_query(
+                    '''({{ column | sqlsafe }} IS NULL)''', column=column)
+            return w.prepare_query('''({{ column | sqlsafe }} ~ {{ regex }})''',
+                                   column=column, regex=fewer_than_words_regex(value))
+    raise WinnowError("Unknown operator type '{}'".format(op['value_type']))
@@ -0,0 +1,151 @@
+'''winnow/subsumption.py
+
+Decide whether one filter only ever matches a subset of another's rows,
+so that refining a filter can be answered from the rows already fetched
+for it.
+
+    rows = refine_rows(wnw, new_filt, old_filt, old_rows)
+    if rows is None:
+        rows = run_query(new_filt)
+
+implies(wnw, narrow, broad) recognizes the ways a filter usually gets
+refined: extra clauses AND-ed on, clauses dropped from an OR, tighter
+numeric and date ranges, relative date ranges inside others, and smaller
+`any of` (or larger `not any of`) sets. It is conservative: False means
+"can't tell", not "no".
+'''
+from __future__ import unicode_literals
+
+from .error import WinnowError
+from .evaluate import filter_rows
+from .nodes import ResolvedConstant
+from .nodes import ResolvedFilter
+from .optimizer import _CLAUSE_KINDS
+from .optimizer import node_key
+
+
+def implies(wnw, narrow, broad):
+    """
+    True if every row matching the filter `narrow` also matches `broad`.
+    Both may be filter dicts or already resolved filters.
+    """
+    return _implies(wnw, wnw._compilable(narrow), wnw._compilable(broad), wnw._default_dispatch())
+
+
+def refine_rows(wnw, filt, superset_filt, superset_rows):
+    """
+    The rows matching `filt`, picked out of `superset_rows` (all the rows
+    matching `superset_filt`, as dicts keyed by column). None if `filt`
+    may match rows outside of them, or can't be evaluated in python.
+    """
+    if not implies(wnw, filt, superset_filt):
+        return None
+    try:
+        return filter_rows(wnw, filt, superset_rows)
+    except WinnowError:
+        # eg. a special case without a python predicate
+        return None
+
+
+def _constant(node):
+    """True or False if the node always (or never) matches, else None."""
+    if isinstance(node, ResolvedConstant):
+        return node.constant
+    elif isinstance(node, ResolvedFilter) and not node.filter_clauses:
+        # Like where_clauses, an empty group matches everything.
+        return True
+    return None
+
+
+def _implies(wnw, a, b, default_dispatch):
+    if _constant(a) is False or _constant(b) is True:
+        return True
+    elif _constant(a) is True or _constant(b) is False:
+        return False
+
+    if isinstance(b, ResolvedFilter) and b.logical_op == '&':
+        return all(_implies(wnw, a, child, default_dispatch) for child in b.filter_clauses)
+    if isinstance(a, ResolvedFilter) and a.logical_op == '|':
+        return all(_implies(wnw, child, b, default_dispatch) for child in a.filter_clauses)
+    if isinstance(a, ResolvedFilter):
+        if any(_implies(wnw, child, b, default_dispatch) for child in a.filter_clauses):
+            return True
+    if isinstance(b, ResolvedFilter):
+        return any(_implies(wnw, a, child, default_dispatch) for child in b.filter_clauses)
+    if isinstance(a, ResolvedFilter):
+        return False
+    return _clause_implies(wnw, a, b, default_dispatch)
+
+
+def _clause_implies(wnw, a, b, default_dispatch):
+    if node_key(a) == node_key(b):
+        return True
+    a_op = a['operator_resolved']
+    b_op = b['operator_resolved']
+    # Beyond identical clauses, we can only reason about the SQL
+    # sql_prepare builds, on the same column.
+    if (not default_dispatch or a['data_source'] != b['data_source']
+            or a_op['value_type'] != b_op['value_type']
+            or not wnw._rebindable(a) or not wnw._rebindable(b)):
+        return False
+    a_value = a['value_vivified']
+    b_value = b['value_vivified']
+    try:
+        if a_op['value_type'] == 'relative_date':
+            return _range_implies(wnw, a_op, a_value, b_op, b_value)
+        a_kind = _CLAUSE_KINDS.get((a_op['value_type'], a_op['name']))
+        b_kind = _CLAUSE_KINDS.get((b_op['value_type'], b_op['name']))
+        if a_kind is None or b_kind is None:
+            return False
+        return _kind_implies(a_kind, a_value, b_kind, b_value)
+    except TypeError:
+        # eg. comparing naive and tz-aware datetimes
+        return False
+
+
+def _kind_implies(a_kind, a_value, b_kind, b_value):
+    a_kind, a_inclusive = a_kind
+    b_kind, b_inclusive = b_kind
+    if a_kind == 'is':
+        if b_kind == 'is':
+            return a_value == b_value
+        elif b_kind in ('lower', 'upper'):
+            return _satisfies(a_value, b_kind, b_inclusive, b_value)
+    elif a_kind == b_kind and a_kind in ('lower', 'upper'):
+        if a_value == b_value:
+            # x > 3 implies x >= 3, but not the other way round
+            return b_inclusive or not a_inclusive
+        return (a_value > b_value) == (a_kind == 'lower')
+    elif a_kind == 'in':
+        if b_kind == 'in':
+            return set(a_value) <= set(b_value)
+        elif b_kind == 'not_in':
+            return not set(a_value) & set(b_value)
+    elif a_kind == 'not_in' and b_kind == 'not_in':
+        return set(b_value) <= set(a_value)
+    elif a_kind == 'bool' and b_kind == 'bool':
+        return bool(a_value) == bool(b_value)
+    return False
+
+
+def _satisfies(value, kind, inclusive, bound):
+    if value == bound:
+        return inclusive
+    return (value > bound) == (kind == 'lower')
+
+
+def _range_implies(wnw, a_op, a_value, b_op, b_value):
+    """
+    'within' / 'outside of' two relative date ranges, as they stand now.
+    """
+    now = wnw.date_ranges.clock()
+    a_start, a_end = wnw.date_ranges.interpret(a_value, now)
+    b_start, b_end = wnw.date_ranges.interpret(b_value, now)
+    if not a_op['negative'] and not b_op['negative']:
+        return b_start <= a_start and a_end <= b_end
+    elif a_op['negative'] and b_op['negative']:
+        return a_start <= b_start and b_end <= a_end
+    elif not a_op['negative']:
+        # within a range that doesn't overlap the excluded one
+        return a_end <= b_start or b_end <= a_start
+    return False
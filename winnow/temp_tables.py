@@ -0,0 +1,165 @@
+'''winnow/temp_tables.py
+
+Run a Winnow query with its huge `any of` collections loaded into
+temporary tables, rather than bound as parameters.
+
+Above a few tens of thousands of values even a single array parameter
+is megabytes of bind data, and PostgreSQL can't estimate how many rows
+it will match. Copying the values into an (analyzed) temp table and
+joining against it fixes both.
+
+    with temp_table_query(wnw, connection, filt) as cursor:
+        rows = cursor.fetchall()
+
+The temp table's column takes its type from the data source's
+'collection_sql_type' (eg. 'bigint' for an integer id column), as the
+values themselves are strings. Values are streamed with COPY when the driver supports it (psycopg2's
+`copy_expert`, or psycopg 3's `copy`), and inserted with `executemany`
+otherwise, so any DB-API connection will do.
+'''
+from __future__ import unicode_literals
+
+from contextlib import contextmanager
+
+from six import integer_types
+from six import text_type
+
+from .nodes import ResolvedClause
+from .nodes import ResolvedFilter
+from .sql_prepare import TableValues
+
+DEFAULT_THRESHOLD = 50000
+
+
+@contextmanager
+def temp_table_query(wnw, connection, filt, threshold=DEFAULT_THRESHOLD,
+                     analyze=True, placeholder='%s'):
+    """
+    Execute wnw.query(filt) on a new cursor from `connection`, yielding the
+    cursor. Collection clauses with more than `threshold` values are
+    answered from temp tables, which are dropped again on the way out.
+    Not after an error, though: the transaction is likely aborted, so the
+    DROPs would fail and hide it. Rolling back drops tables created in
+    the transaction, and load_values replaces any that are left over.
+
+    `placeholder` is only used if the driver can't COPY.
+    """
+    filt = wnw._compilable(filt)
+    tables = []
+    filt = _use_temp_tables(wnw, filt, threshold, tables)
+
+    cursor = connection.cursor()
+    try:
+        for values in tables:
+            load_values(cursor, values.table_name, values, sql_type=values.sql_type,
+                        analyze=analyze, placeholder=placeholder)
+        cursor.execute(*wnw.query(filt))
+        yield cursor
+        for values in tables:
+            cursor.execute('DROP TABLE IF EXISTS {}'.format(values.table_name))
+    finally:
+        cursor.close()
+
+
+def _use_temp_tables(wnw, filt, threshold, tables):
+    """
+    Return a copy of the resolved filter with each large collection's
+    value replaced by TableValues, which are also appended to `tables`.
+    """
+    clauses = []
+    for clause in filt.filter_clauses:
+        if isinstance(clause, ResolvedFilter):
+            clause = _use_temp_tables(wnw, clause, threshold, tables)
+        elif (isinstance(clause, ResolvedClause)
+              and clause.operator_resolved['value_type'] == 'collection'
+              and len(clause.value_vivified) > threshold
+              and wnw._default_dispatch() and wnw._rebindable(clause)):
+            # Names are reused from query to query (temp tables are private
+            # to the session) so these plans stay cacheable. They're in
+            # pg_temp, so a DROP can't reach a permanent table of the same
+            # name elsewhere on the search_path.
+            values = TableValues(
+                'pg_temp.winnow_values_{}'.format(len(tables)), clause.value_vivified,
+                clause.data_source_resolved.get('collection_sql_type'))
+            tables.append(values)
+            clause = ResolvedClause(
+                wnw, clause.clause, clause.data_source_resolved,
+                clause.operator_resolved, values)
+        clauses.append(clause)
+    return ResolvedFilter(filt.logical_op, clauses)
+
+
+def load_values(cursor, table_name, values, analyze=True, placeholder='%s', sql_type=None):
+    """
+    (Re)create the temp table `table_name` with a single `value` column of
+    type `sql_type` and fill it with `values`. By default the column is
+    bigint if every value is an int, and text otherwise.
+
+    Qualify `table_name` with pg_temp: it's dropped first, and unqualified
+    that could drop a permanent table.
+    """
+    values = list(values)
+    if sql_type is None:
+        sql_type = 'bigint' if values and all(
+            isinstance(v, integer_types) and not isinstance(v, bool) for v in values) else 'text'
+    cursor.execute('DROP TABLE IF EXISTS {}'.format(table_name))
+    cursor.execute('CREATE TEMPORARY TABLE {} (value {})'.format(table_name, sql_type))
+
+    copy_sql = 'COPY {} (value) FROM STDIN'.format(table_name)
+    if hasattr(cursor, 'copy_expert'):
+        cursor.copy_expert(copy_sql, CopyStream(values))
+    elif hasattr(cursor, 'copy'):
+        with cursor.copy(copy_sql) as copy:
+            for line in copy_lines(values):
+                copy.write(line)
+    else:
+        cursor.executemany(
+            'INSERT INTO {} (value) VALUES ({})'.format(table_name, placeholder),
+            [(v,) for v in values])
+    if analyze:
+        cursor.execute('ANALYZE {}'.format(table_name))
+
+
+def _copy_escape(value):
+    return (text_type(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+def copy_lines(values):
+    """
+    Yield `values` as lines of COPY's text format.
+    """
+    for value in values:
+        yield ('\\N' if value is None else _copy_escape(value)) + '\n'
+
+
+class CopyStream(object):
+    """
+    A read-only file-like object over copy_lines(values), so the values
+    are encoded as COPY reads them rather than all up front.
+    """
+    def __init__(self, values):
+        self._lines = copy_lines(values)
+        self._buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._lines)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    def readline(self, size=-1):
+        if not self._buffer:
+            self._buffer = next(self._lines, '')
+        line, sep, rest = self._buffer.partition('\n')
+        line += sep
+        self._buffer = rest
+        return line
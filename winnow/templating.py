@@ -1,16 +1,116 @@
 from __future__ import unicode_literals
 
-import datetime
-import decimal
-import json
-from collections import Iterable
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 
 import jinja2
 import jinjasql
 from jinja2.utils import Markup
-from jinjasql.core import _bind_param
-from jinjasql.core import _thread_local
-from six import string_types
+
+# These used to live here, and are still imported from here.
+from .fragments import adapt_param  # noqa
+from .fragments import json_custom_parser  # noqa
+from .fragments import jsonify  # noqa
+from .fragments import pg_null  # noqa
+from .fragments import PGJson  # noqa
+from .fragments import SqlFragment
+from .utils import LRUCache
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # python < 3.7
+    ContextVar = None
+
+
+class RenderState(object):
+    """
+    The bind params collected while rendering one template.
+
+    jinjasql keeps these in a thread local, which nested renders (and
+    coroutines sharing a thread) trample. We keep ours per render
+    instead, see rendering().
+    """
+    __slots__ = ('bind_params', 'param_style', 'param_index', '_next_suffix')
+
+    def __init__(self, param_style):
+        self.bind_params = OrderedDict()
+        self.param_style = param_style
+        self.param_index = 0
+        self._next_suffix = {}
+
+    def store(self, key, value):
+        """Record a param under a name not used yet, and return the name."""
+        new_key = key
+        suffix = self._next_suffix.get(key, 0)
+        while new_key in self.bind_params:
+            suffix += 1
+            new_key = '{}#{}'.format(key, suffix)
+        self._next_suffix[key] = suffix
+        self.bind_params[new_key] = value
+        return new_key
+
+    def bind(self, key, value):
+        """Record a param, and return its placeholder."""
+        new_key = self.store(key, value)
+        if self.param_style == 'qmark':
+            return '?'
+        elif self.param_style == 'format':
+            return '%s'
+        elif self.param_style == 'numeric':
+            self.param_index += 1
+            return ':{}'.format(self.param_index)
+        elif self.param_style == 'named':
+            return ':{}'.format(new_key)
+        elif self.param_style == 'pyformat':
+            return '%({})s'.format(new_key)
+        raise AssertionError('Invalid param_style - {}'.format(self.param_style))
+
+
+# rendering(param_style) makes a fresh RenderState current for the
+# template filters below, restoring the enclosing render's (if any) on the
+# way out. A context variable follows asyncio tasks; without one, we fall
+# back to a stack per thread.
+if ContextVar is not None:
+    _current_render = ContextVar('winnow_render_state', default=None)
+
+    def current_render_state():
+        return _current_render.get()
+
+    @contextmanager
+    def rendering(param_style):
+        state = RenderState(param_style)
+        token = _current_render.set(state)
+        try:
+            yield state
+        finally:
+            _current_render.reset(token)
+else:
+    _renders = threading.local()
+
+    def current_render_state():
+        stack = getattr(_renders, 'stack', None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def rendering(param_style):
+        state = RenderState(param_style)
+        if not hasattr(_renders, 'stack'):
+            _renders.stack = []
+        _renders.stack.append(state)
+        try:
+            yield state
+        finally:
+            _renders.stack.pop()
+
+
+
+def _render_state():
+    state = current_render_state()
+    if state is None:
+        raise RuntimeError('SQL template filters can only be used while rendering')
+    return state
 
 
 # Replace the bind function to support more types.
@@ -20,28 +120,17 @@ def _better_bind(value, name):
     This filter is automatically applied to every {{variable}}
     during the lexing stage, so developers can't forget to bind
     """
-    suffix = ''
     if isinstance(value, Markup):
         return value
     elif isinstance(value, SqlFragment):
         # Copy in the params from the child fragment in order
+        state = _render_state()
         for ix, param in enumerate(value.params):
-            _thread_local.bind_params['{}#param#{}'.format(name, ix)] = param
+            state.store('{}#param#{}'.format(name, ix), param)
         # return the sql unchanged
         return Markup(value.query)
-    elif isinstance(value, pg_null):
-        suffix = '::' + value.pg_type
-        value = None
-    if isinstance(value, (dict, PGJson)):
-        suffix = '::jsonb'
-        value = jsonify(getattr(value, 'adapted', value))
-    elif isinstance(value, datetime.datetime):
-        suffix = '::timestamp'
-    elif isinstance(value, decimal.Decimal):
-        value = float(value)
-    elif isinstance(value, jinja2.Undefined):
-        value = None
-    return _bind_param(_thread_local.bind_params, name, value) + suffix
+    value, suffix = adapt_param(value)
+    return _render_state().bind(name, value) + suffix
 
 
 def _anyclause(str_list):
@@ -55,95 +144,65 @@ def _anyclause(str_list):
     if not len(values):
         return "(NULL)"
 
-    results = []
-    for v in values:
-        results.append(
-            '(' + _bind_param(_thread_local.bind_params, "anyclause", v) + ')')
-
-    clause = ", ".join(results)
-    return clause
-
-
-
-class WinnowSql(jinjasql.JinjaSql):
-    def __init__(self, *args, **kwargs):
-        super(WinnowSql, self).__init__(*args, **kwargs)
-        self.env.filters['bind'] = _better_bind
-        self.env.filters['anyclause'] = _anyclause
-
-    def prepare_query(self, temp_data, **ctx):
-        query, params = super(WinnowSql, self).prepare_query(temp_data, ctx)
-        return SqlFragment(query, list(params))
-
-
-def json_custom_parser(obj):
-    """
-    A custom json parser to handle json.dumps calls properly for Decimal and
-    Datetime data types.
-    """
-    if not isinstance(obj, string_types) and isinstance(obj, Iterable):
-        return list(obj)
-    elif isinstance(obj, datetime.datetime) or isinstance(obj, datetime.date):
-        dot_ix = 19  # 'YYYY-MM-DDTHH:MM:SS.mmmmmm+HH:MM'.find('.')
-        return obj.isoformat()[:dot_ix]
-    else:
-        raise TypeError(obj)
+    state = _render_state()
+    return ", ".join('(' + state.bind("anyclause", v) + ')' for v in values)
 
 
-def jsonify(obj):
-    return json.dumps(obj, default=json_custom_parser, sort_keys=True)
+def _inclause(values):
+    state = _render_state()
+    return "(" + ",".join(state.bind("inclause", v) for v in values) + ")"
 
 
-class PGJson(object):
-    def __init__(self, adapted):
-        self.adapted = adapted
 
+def template_name(source):
+    """The name a template is compiled under, ahead of time."""
+    return 'winnow/' + hashlib.sha1(source.encode('utf-8')).hexdigest()
 
-class pg_null(object):
-    def __init__(self, pg_type):
-        self.pg_type = pg_type
-
-    def __unicode__(self):
-        return 'NULL::{}'.format(self.pg_type)
-
-    __str__ = __unicode__
 
+class WinnowSql(jinjasql.JinjaSql):
+    # Compiled templates are kept per instance (they're bound to self.env),
+    # keyed by their source text. Set to 0 to compile on every call.
+    template_cache_size = 512
 
-class SqlFragment(object):
-    """
-    A wrapper around (query, params) that supports addition
-    """
-    def __init__(self, query, params):
-        self.query = query
-        self.params = params
+    # A directory of templates compiled ahead of time (see precompile.py),
+    # to load templates from rather than compiling them. Templates that
+    # aren't there are compiled as usual. Can also be passed to __init__.
+    compiled_templates = None
 
-    def __add__(self, other):
-        return SqlFragment(
-            query=self.query + other.query,
-            params=self.params + other.params)
+    def __init__(self, *args, **kwargs):
+        self.compiled_templates = kwargs.pop('compiled_templates', self.compiled_templates)
+        super(WinnowSql, self).__init__(*args, **kwargs)
+        self.env.filters['bind'] = _better_bind
+        self.env.filters['anyclause'] = _anyclause
+        self.env.filters['inclause'] = _inclause
+        self.template_cache = LRUCache(self.template_cache_size)
+        self.compiled_loader = None
+        if self.compiled_templates is not None:
+            self.compiled_loader = jinja2.ModuleLoader(self.compiled_templates)
 
-    def __iter__(self):
+    def get_template(self, source):
         """
-        to support
-            `cursor.execute(*fragment)`
-            `query, params = fragment`
+        Return the compiled jinja template for `source`, compiling it
+        only if we haven't seen it recently.
         """
-        return iter((self.query, self.params))
+        return self.template_cache.get_or_create(source, lambda: self._compile(source))
 
-    def __eq__(self, other):
-        return self.query == other.query and self.params == other.params
+    def _compile(self, source):
+        if self.compiled_loader is not None:
+            try:
+                return self.compiled_loader.load(self.env, template_name(source))
+            except jinja2.TemplateNotFound:
+                pass
+        return self.env.from_string(source)
 
+    def prepare_query(self, temp_data, **ctx):
+        query, params = self._prepare_query(self.get_template(temp_data), ctx)
+        return SqlFragment(query, list(params))
 
-    def __repr__(self):
-        return '{}({}, {})'.format(
-            self.__class__.__name__,
-            repr(self.query),
-            repr(self.params))
-
-    __str__ = __unicode__ = __repr__
-
-    @staticmethod
-    def join(sep, elems):
-        return SqlFragment(
-            sep.join(e.query for e in elems),
-            tuple(v for e in elems for v in e.params))
+    def _prepare_query(self, template, data):
+        # Like jinjasql's, but with the params collected per render.
+        with rendering(self.param_style) as state:
+            query = template.render(data)
+        if self.param_style in ('named', 'pyformat'):
+            return query, state.bind_params
+        return query, list(state.bind_params.values())
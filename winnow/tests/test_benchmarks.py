@@ -0,0 +1,29 @@
+import json
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_equals
+
+from ..benchmarks import main
+from ..benchmarks import run
+
+def test_benchmarks_run():
+    results = run(quick=True, only='flat', repeat=1, min_time=0)
+    assert_equals(set(r['workload'] for r in results), set(['flat']))
+    assert_equals([r['operation'] for r in results], [
+        'resolve_filter', 'resolve', 'deepcopy', 'validate', 'where_clauses', 'query', 'query_cold'])
+    assert all(r['best_s'] >= 0 and r['calls_per_run'] == 1 for r in results)
+
+def test_benchmarks_write_json():
+    directory = tempfile.mkdtemp()
+    try:
+        output = os.path.join(directory, 'results.json')
+        main(['--quick', '--only', 'numeric', '--repeat', '1', '--min-time', '0', '-o', output])
+        with open(output) as f:
+            report = json.load(f)
+        assert_equals([(r['group'], r['workload']) for r in report['results']],
+                      [('vivify', 'numeric')])
+        assert 'python' in report['environment']
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,139 @@
+import datetime
+import sqlite3
+
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+
+from ..bitmaps import Bitmap
+from ..bitmaps import BitmapIndex
+from ..core import Winnow
+from ..error import WinnowError
+
+sources = [
+    dict(display_name='Scoops', column='num_scoops', value_types=['numeric', 'nullable']),
+    dict(display_name='Flavor', column='flavor', value_types=['collection']),
+    dict(display_name='Sold', column='sold_at', value_types=['relative_date']),
+]
+
+wnw = Winnow('ice_cream', sources)
+
+
+class SqliteConnection(object):
+    """
+    A sqlite3 connection that accepts the %s placeholders winnow emits,
+    and counts the queries it runs.
+    """
+    def __init__(self):
+        self.db = sqlite3.connect(':memory:')
+        self.queries = 0
+        self.db.execute('CREATE TABLE ice_cream (id integer, num_scoops integer, flavor text)')
+        self.db.executemany('INSERT INTO ice_cream VALUES (?, ?, ?)', [
+            (1, 3, 'Vanilla'),
+            (2, 1, 'Coffee'),
+            (3, None, None),
+            (4, 2, 'Strawberry'),
+            (70, 5, 'Vanilla'),
+        ])
+
+    def cursor(self):
+        connection = self
+        cursor = self.db.cursor()
+
+        class Cursor(object):
+            def execute(self, query, params=()):
+                connection.queries += 1
+                # sqlite compares the dates as text
+                params = [p.isoformat(str(' ')) if isinstance(p, datetime.datetime) else p
+                          for p in params]
+                cursor.execute(query.replace('::timestamp', '').replace('%s', '?'), params)
+
+            def fetchall(self):
+                return cursor.fetchall()
+
+            def close(self):
+                cursor.close()
+        return Cursor()
+
+
+def as_filter(logical_op, *clauses):
+    return dict(logical_op=logical_op, filter_clauses=[
+        dict(data_source=ds, operator=op, value=value) for ds, op, value in clauses])
+
+def test_bitmap():
+    bitmap = Bitmap.from_ids([70, 1, 3, 8, 3])
+    assert_equals(list(bitmap), [1, 3, 8, 70])
+    assert_equals(len(bitmap), 4)
+    assert 70 in bitmap and 2 not in bitmap and -1 not in bitmap
+    other = Bitmap.from_ids([3, 4])
+    assert_equals(list(bitmap & other), [3])
+    assert_equals(list(bitmap | other), [1, 3, 4, 8, 70])
+    assert_equals(list(bitmap - other), [1, 8, 70])
+    assert_equals(list(other.invert(Bitmap.from_ids(range(6)))), [0, 1, 2, 5])
+    assert_equals(list(Bitmap.from_ids([])), [])
+    assert not Bitmap()
+    assert_raises(WinnowError, Bitmap.from_ids, [-1])
+    assert_raises(WinnowError, Bitmap.from_ids, ['a'])
+
+def test_matching_ids():
+    conn = SqliteConnection()
+    index = BitmapIndex(wnw, conn)
+    filt = as_filter('|', ('Scoops', '>=', 3), ('Flavor', 'any of', ['Coffee']))
+    assert_equals(list(index.matching_ids(filt)), [1, 2, 70])
+    # Both clauses were fetched in a single query
+    assert_equals(conn.queries, 1)
+
+    filt = dict(logical_op='&', filter_clauses=[
+        dict(data_source='Flavor', operator='any of', value=['Coffee']),
+        dict(logical_op='|', filter_clauses=[
+            dict(data_source='Scoops', operator='>=', value=3),
+            dict(data_source='Scoops', operator='<', value=2),
+        ]),
+    ])
+    assert_equals(list(index.matching_ids(filt)), [2])
+    # Only 'Scoops < 2' was new
+    assert_equals(conn.queries, 2)
+    assert_equals(list(index.matching_ids(filt)), [2])
+    assert_equals(conn.queries, 2)
+
+    assert_equals(list(index.matching_ids(as_filter('&'))), [1, 2, 3, 4, 70])
+    assert_equals(list(index.clause_ids(wnw.resolve_filter_clause(
+        dict(data_source='Scoops', operator='is set', value=False)))), [3])
+
+def test_cache_is_bounded_by_bytes():
+    conn = SqliteConnection()
+    index = BitmapIndex(wnw, conn, maxbytes=12)
+    # ids up to 70 take 9 bytes, just 2 takes 1
+    index.matching_ids(as_filter('|', ('Scoops', '>=', 3), ('Flavor', 'any of', ['Coffee'])))
+    assert_equals(index.cache_info().currsize, 10)
+    index.matching_ids(as_filter('&', ('Scoops', 'is set', True)))
+    assert_equals(index.cache_info().currsize, 10)
+    assert_equals(index.cache_info().evictions, 1)
+    index.matching_ids(as_filter('&', ('Flavor', 'any of', ['Coffee'])))
+    assert_equals(conn.queries, 2)
+    assert_equals(Bitmap.from_ids([70]).nbytes, 9)
+
+def test_relative_dates():
+    conn = SqliteConnection()
+    yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
+    conn.db.execute('ALTER TABLE ice_cream ADD COLUMN sold_at text')
+    conn.db.execute('UPDATE ice_cream SET sold_at = ? WHERE id = 4', [yesterday.isoformat(str(' '))])
+    index = BitmapIndex(wnw, conn)
+    filt = as_filter('|', ('Sold', 'within', 'last_7_days'), ('Scoops', '>=', 5))
+    assert_equals(list(index.matching_ids(filt)), [4, 70])
+    assert_equals(list(index.matching_ids(filt)), [4, 70])
+    assert_equals(conn.queries, 1)
+
+def test_invalidate():
+    conn = SqliteConnection()
+    cache_shared_with = BitmapIndex(Winnow('other', sources), conn)
+    index = BitmapIndex(wnw, conn, cache=cache_shared_with.cache)
+    filt = as_filter('&', ('Scoops', '>=', 3))
+    assert_equals(list(index.matching_ids(filt)), [1, 70])
+
+    conn.db.execute('UPDATE ice_cream SET num_scoops = 4 WHERE id = 2')
+    assert_equals(list(index.matching_ids(filt)), [1, 70])
+    cache_shared_with.invalidate()
+    assert_equals(list(index.matching_ids(filt)), [1, 70])
+    cache_shared_with.invalidate('ice_cream')
+    assert_equals(list(index.matching_ids(filt)), [1, 2, 70])
+    assert_equals(conn.queries, 2)
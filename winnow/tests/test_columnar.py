@@ -0,0 +1,139 @@
+import datetime
+from unittest import SkipTest
+
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+
+from ..core import Winnow
+from ..error import WinnowError
+from ..evaluate import filter_rows
+
+try:
+    import numpy as np
+except ImportError:
+    raise SkipTest('numpy is not installed')
+
+from ..columnar import filter_mask
+from ..columnar import null_mask
+from ..columnar import unsupported_sources
+
+sources = [
+    dict(display_name='Scoops', column='num_scoops', value_types=['numeric', 'nullable']),
+    dict(display_name='Flavor', column='flavor', value_types=['collection']),
+    dict(display_name='Scooper', column='scooper', value_types=['string', 'string_length']),
+    dict(display_name='Waffle Cone', column='waffle_cone', value_types=['bool']),
+    dict(display_name='Sold', column='sold_at', value_types=['absolute_date']),
+    dict(display_name='Sprinkles', value_types=['bool']),
+    dict(display_name='Cherry', value_types=['bool']),
+    dict(display_name='Acct', column='id', value_types=['collection']),
+]
+
+class ColumnarWinnow(Winnow):
+    _special_cases = {}
+
+@ColumnarWinnow.special_case('Sprinkles', 'bool')
+@ColumnarWinnow.special_case('Cherry', 'bool')
+def topping(wnw, clause):
+    return wnw.prepare_query("toppings @> '{sprinkles}'")
+
+@ColumnarWinnow.special_case_predicate('Sprinkles', 'bool')
+def sprinkles_predicate(wnw, clause):
+    return lambda row: ('sprinkles' in row['toppings']) == clause['value_vivified']
+
+@ColumnarWinnow.special_case_columnar('Sprinkles', 'bool')
+def sprinkles_mask(wnw, clause):
+    return lambda columns: columns['has_sprinkles'] == clause['value_vivified']
+
+wnw = ColumnarWinnow('ice_cream', sources)
+
+rows = [
+    dict(id=1, num_scoops=3, flavor='Vanilla', scooper='Heidi Klum', waffle_cone=True,
+         sold_at=datetime.datetime(2017, 3, 1), toppings=['sprinkles']),
+    dict(id=2, num_scoops=1, flavor='Coffee', scooper='heidi', waffle_cone=False,
+         sold_at=datetime.datetime(2017, 4, 1), toppings=[]),
+    dict(id=3, num_scoops=None, flavor=None, scooper=None, waffle_cone=None,
+         sold_at=None, toppings=['sprinkles']),
+    dict(id=4, num_scoops=2, flavor='Strawberry', scooper='', waffle_cone=True,
+         sold_at=datetime.datetime(2017, 2, 1), toppings=[]),
+]
+
+# Object arrays, with None for NULL
+object_columns = dict(
+    (key, np.array([row[key] for row in rows], dtype=object))
+    for key in ('id', 'num_scoops', 'flavor', 'scooper', 'waffle_cone', 'sold_at'))
+object_columns['has_sprinkles'] = np.array(['sprinkles' in row['toppings'] for row in rows])
+
+# Native dtypes, with NaN / NaT / masks for NULL
+typed_columns = dict(
+    id=np.array([1, 2, 3, 4]),
+    num_scoops=np.array([3, 1, np.nan, 2]),
+    flavor=np.ma.masked_array(['Vanilla', 'Coffee', '', 'Strawberry'], mask=[0, 0, 1, 0]),
+    scooper=np.array(['Heidi Klum', 'heidi', None, ''], dtype=object),
+    waffle_cone=np.ma.masked_array([True, False, False, True], mask=[0, 0, 1, 0]),
+    sold_at=np.array(['2017-03-01', '2017-04-01', 'NaT', '2017-02-01'], dtype='datetime64[us]'),
+    has_sprinkles=object_columns['has_sprinkles'],
+)
+
+filters = [
+    ('&', ('Scoops', '>=', 2)),
+    ('&', ('Scoops', 'is not', 1)),
+    ('&', ('Scoops', 'is set', False)),
+    ('&', ('Scoops', 'is set', True)),
+    ('&', ('Scooper', 'contains', 'HEIDI')),
+    ('&', ('Scooper', 'starts with', 'heidi k')),
+    ('&', ('Scooper', 'contains', 'h_idi')),
+    ('&', ('Scooper', 'is', 'heidi')),
+    ('&', ('Scooper', 'is', '')),
+    ('&', ('Scooper', 'more than __ words', 1)),
+    ('&', ('Scooper', 'fewer than __ words', 2)),
+    ('&', ('Scooper', 'fewer than __ words', 0)),
+    ('&', ('Flavor', 'any of', ['Vanilla', 'Coffee'])),
+    ('&', ('Flavor', 'not any of', ['Vanilla', 'Coffee'])),
+    ('|', ('Flavor', 'not any of', ['Vanilla']), ('Waffle Cone', 'is', True)),
+    ('&', ('Acct', 'any of', ['1', '3'])),
+    ('&', ('Acct', 'not any of', ['2', '2.5', 'x'])),
+    ('&', ('Waffle Cone', 'is', False)),
+    ('&', ('Sold', 'before', '2017-03-01')),
+    ('&', ('Sold', 'after', '2017-03-01')),
+    ('|', ('Sprinkles', 'is', True), ('Scoops', '<', 2)),
+    ('&',),
+]
+
+def as_filter(logical_op, *clauses):
+    return dict(logical_op=logical_op, filter_clauses=[
+        dict(data_source=ds, operator=op, value=value) for ds, op, value in clauses])
+
+def test_matches_python_evaluator():
+    for spec in filters:
+        filt = as_filter(*spec)
+        expected = [row['id'] for row in filter_rows(wnw, filt, rows)]
+        for columns in (object_columns, typed_columns):
+            mask = filter_mask(wnw, filt, columns)
+            assert_equals((spec, list(columns['id'][mask])), (spec, expected))
+
+def test_collections_on_integer_columns():
+    # Like the SQL, the string values match the integer ids
+    filt = as_filter('&', ('Acct', 'any of', ['1', '3']))
+    assert_equals(list(filter_mask(wnw, filt, typed_columns)), [True, False, True, False])
+    assert_equals(list(filter_mask(wnw, filt, dict(id=np.array([1.0, 3.5])))), [True, False])
+
+def test_nested():
+    filt = dict(logical_op='|', filter_clauses=[
+        dict(data_source='Sprinkles', operator='is', value=True),
+        dict(logical_op='&', filter_clauses=[
+            dict(data_source='Scoops', operator='<', value=3),
+            dict(data_source='Waffle Cone', operator='is', value=True),
+        ]),
+    ])
+    assert_equals(list(filter_mask(wnw, filt, typed_columns)), [True, False, True, True])
+
+def test_null_mask():
+    assert_equals(list(null_mask(typed_columns['num_scoops'])), [False, False, True, False])
+    assert_equals(list(null_mask(typed_columns['flavor'])), [False, False, True, False])
+    assert_equals(list(null_mask(typed_columns['id'])), [False] * 4)
+
+def test_unsupported_sources():
+    filt = as_filter('|', ('Cherry', 'is', True), ('Sprinkles', 'is', True), ('Cherry', 'is', False))
+    assert_equals(unsupported_sources(wnw, filt), ['Cherry'])
+    assert_equals(unsupported_sources(wnw, as_filter('&', ('Sprinkles', 'is', True))), [])
+    assert_raises(WinnowError, filter_mask, wnw, filt, typed_columns)
@@ -0,0 +1,114 @@
+import datetime
+
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+
+from ..core import Winnow
+from ..error import WinnowError
+from ..evaluate import compile_predicate
+from ..evaluate import filter_rows
+from ..evaluate import like_regex
+
+sources = [
+    dict(display_name='Scoops', column='num_scoops', value_types=['numeric', 'nullable']),
+    dict(display_name='Flavor', column='flavor', value_types=['collection']),
+    dict(display_name='Scooper', column='scooper', value_types=['string', 'string_length']),
+    dict(display_name='Waffle Cone', column='waffle_cone', value_types=['bool']),
+    dict(display_name='Sold', column='sold_at', value_types=['absolute_date']),
+    dict(display_name='Sprinkles', value_types=['bool']),
+]
+
+class EvaluatingWinnow(Winnow):
+    _special_cases = {}
+
+@EvaluatingWinnow.special_case('Sprinkles', 'bool')
+def sprinkles(wnw, clause):
+    return wnw.prepare_query("toppings @> '{sprinkles}'")
+
+@EvaluatingWinnow.special_case_predicate('Sprinkles', 'bool')
+def sprinkles_predicate(wnw, clause):
+    return lambda row: ('sprinkles' in row['toppings']) == clause['value_vivified']
+
+wnw = EvaluatingWinnow('ice_cream', sources)
+
+rows = [
+    dict(id=1, num_scoops=3, flavor='Vanilla', scooper='Heidi Klum', waffle_cone=True,
+         sold_at=datetime.datetime(2017, 3, 1), toppings=['sprinkles']),
+    dict(id=2, num_scoops=1, flavor='Coffee', scooper='heidi', waffle_cone=False,
+         sold_at=datetime.datetime(2017, 4, 1), toppings=[]),
+    dict(id=3, num_scoops=None, flavor=None, scooper=None, waffle_cone=None,
+         sold_at=None, toppings=['sprinkles']),
+    dict(id=4, num_scoops=2, flavor='Strawberry', scooper='', waffle_cone=True,
+         sold_at=datetime.datetime(2017, 2, 1), toppings=[]),
+]
+
+def matching(logical_op, *clauses):
+    filt = dict(logical_op=logical_op, filter_clauses=[
+        dict(data_source=ds, operator=op, value=value) for ds, op, value in clauses])
+    return [row['id'] for row in filter_rows(wnw, filt, rows)]
+
+def test_numeric():
+    assert_equals(matching('&', ('Scoops', '>=', 2)), [1, 4])
+    assert_equals(matching('&', ('Scoops', 'is not', 1)), [1, 4])
+    assert_equals(matching('&', ('Scoops', 'is set', False)), [3])
+
+def test_strings():
+    assert_equals(matching('&', ('Scooper', 'contains', 'HEIDI')), [1, 2])
+    assert_equals(matching('&', ('Scooper', 'starts with', 'heidi k')), [1])
+    assert_equals(matching('&', ('Scooper', 'contains', 'h_idi')), [1, 2])
+    assert_equals(matching('&', ('Scooper', 'is', 'heidi')), [2])
+    # A blank string also matches NULL
+    assert_equals(matching('&', ('Scooper', 'is', '')), [3, 4])
+    assert_equals(matching('&', ('Scooper', 'more than __ words', 1)), [1])
+    # Matches the SQL regex, which allows up to (not fewer than) 2 words
+    assert_equals(matching('&', ('Scooper', 'fewer than __ words', 2)), [1, 2, 4])
+    assert_equals(matching('&', ('Scooper', 'fewer than __ words', 1)), [2, 4])
+
+def test_collections_and_nulls():
+    assert_equals(matching('&', ('Flavor', 'any of', ['Vanilla', 'Coffee'])), [1, 2])
+    assert_equals(matching('&', ('Flavor', 'not any of', ['Vanilla', 'Coffee'])), [4])
+    assert_equals(matching('|', ('Flavor', 'not any of', ['Vanilla']), ('Waffle Cone', 'is', True)),
+                  [1, 2, 4])
+
+def test_collections_compare_like_sql_literals():
+    # IN ('1', '2') on an integer column matches the numbers
+    accounts = Winnow('accounts', [
+        dict(display_name='Acct', column='acct_id', value_types=['collection']),
+    ])
+    acct_rows = [dict(acct_id=1), dict(acct_id=3), dict(acct_id=2.0), dict(acct_id='2')]
+
+    def accts(op, value):
+        filt = dict(logical_op='&', filter_clauses=[dict(data_source='Acct', operator=op, value=value)])
+        return filter_rows(accounts, filt, acct_rows)
+
+    assert_equals(accts('any of', ['1', '2']), [dict(acct_id=1), dict(acct_id=2.0), dict(acct_id='2')])
+    assert_equals(accts('not any of', ['1', '2', 'x']), [dict(acct_id=3)])
+    assert_equals(accts('any of', [dict(id=2)]), [dict(acct_id=2.0), dict(acct_id='2')])
+
+def test_bools_and_dates():
+    assert_equals(matching('&', ('Waffle Cone', 'is', False)), [2])
+    assert_equals(matching('&', ('Sold', 'before', '2017-03-01')), [4])
+    assert_equals(matching('&', ('Sold', 'after', '2017-03-01')), [1, 2])
+
+def test_nested_and_special_cases():
+    filt = dict(logical_op='|', filter_clauses=[
+        dict(data_source='Sprinkles', operator='is', value=True),
+        dict(logical_op='&', filter_clauses=[
+            dict(data_source='Scoops', operator='<', value=3),
+            dict(data_source='Waffle Cone', operator='is', value=True),
+        ]),
+    ])
+    assert_equals([row['id'] for row in rows if compile_predicate(wnw, filt)(row)], [1, 3, 4])
+
+def test_special_cases_need_a_predicate():
+    class NoPredicateWinnow(Winnow):
+        _special_cases = {}
+
+    NoPredicateWinnow.special_case('Sprinkles', 'bool')(sprinkles)
+    filt = dict(logical_op='&', filter_clauses=[
+        dict(data_source='Sprinkles', operator='is', value=True)])
+    assert_raises(WinnowError, compile_predicate, NoPredicateWinnow('ice_cream', sources), filt)
+
+def test_like_regex():
+    assert like_regex('50\\%%').match('50% off')
+    assert not like_regex('50\\%%').match('500 off')
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+from unittest import SkipTest
+
+from nose.tools import assert_equals
+
+if sys.version_info < (3, 7):
+    raise SkipTest('python -X importtime needs python 3.7')
+
+# Only loaded once they're needed: rendering a template, parsing a
+# free-form date, reading json or compiling on a process pool.
+DEFERRED = ['jinja2', 'jinjasql', 'dateutil', 'six', 'json', 'multiprocessing']
+
+# Generous, so as not to fail on a slow machine: `import winnow` took
+# ~90ms with its dependencies imported up front, ~20ms without.
+BUDGET_US = 250000
+
+package_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def import_times(statement):
+    """
+    Run `statement` in a fresh interpreter under -X importtime, and return
+    {module: cumulative microseconds} for every module it imported.
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=package_dir, stderr=subprocess.STDOUT, universal_newlines=True)
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():  # not the header
+            times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_import_defers_heavy_dependencies():
+    times = import_times('import winnow')
+    imported = set(module.split('.')[0] for module in times)
+    assert_equals(sorted(imported & set(DEFERRED)), [])
+    assert times['winnow'] < BUDGET_US, times['winnow']
+
+
+def test_where_clauses_without_templates():
+    # The SQL for plain clauses is built without jinja2.
+    times = import_times(
+        'import winnow; winnow.Winnow("t", [dict(display_name="A", column="a", value_types=["numeric"])])'
+        '.where_clauses(dict(logical_op="&", filter_clauses=['
+        'dict(data_source="A", operator=">", value=3)]))')
+    assert 'jinja2' not in times
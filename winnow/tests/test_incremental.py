@@ -0,0 +1,49 @@
+from nose.tools import assert_equals
+
+from ..core import Winnow
+from ..incremental import compile_incremental
+
+sources = [
+    dict(display_name='Scoops', column='num_scoops', value_types=['numeric']),
+    dict(display_name='Flavor', column='flavor', value_types=['collection']),
+    dict(display_name='Scooper', column='scooper', value_types=['string']),
+]
+
+wnw = Winnow('ice_cream', sources)
+
+def ice_cream_filt(min_scoops, flavors, scooper='Heidi'):
+    return dict(logical_op='|', filter_clauses=[
+        dict(logical_op='&', filter_clauses=[
+            dict(data_source='Scoops', operator='>=', value=min_scoops),
+            dict(data_source='Flavor', operator='any of', value=flavors),
+        ]),
+        dict(logical_op='&', filter_clauses=[
+            dict(data_source='Scooper', operator='is', value=scooper),
+            dict(data_source='Flavor', operator='any of', value=flavors),
+        ]),
+    ])
+
+def rebuilt(compiled):
+    return [node.get('data_source', node.get('logical_op')) for node in compiled.rebuilt]
+
+def test_matches_where_clauses():
+    filt = ice_cream_filt(2, ['Vanilla'])
+    compiled = compile_incremental(wnw, filt)
+    assert_equals(tuple(compiled.sql), tuple(wnw.where_clauses(filt)))
+    # The shared 'Flavor' clause is only built once
+    assert_equals(rebuilt(compiled), ['Scoops', 'Flavor', '&', 'Scooper', '&', '|'])
+    assert_equals(compile_incremental(wnw, dict(logical_op='&', filter_clauses=[])).sql, True)
+
+def test_only_the_edited_path_is_rebuilt():
+    compiled = compile_incremental(wnw, ice_cream_filt(2, ['Vanilla']))
+    filt = ice_cream_filt(3, ['Vanilla'])
+    compiled = compile_incremental(wnw, filt, compiled)
+    assert_equals(rebuilt(compiled), ['Scoops', '&', '|'])
+    assert_equals(tuple(compiled.sql), tuple(wnw.where_clauses(filt)))
+
+    filt = ice_cream_filt(3, ['Vanilla', 'Coffee'])
+    compiled = compile_incremental(wnw, filt, compiled)
+    assert_equals(rebuilt(compiled), ['Flavor', '&', '&', '|'])
+    assert_equals(tuple(compiled.sql), tuple(wnw.where_clauses(filt)))
+
+    assert_equals(rebuilt(compile_incremental(wnw, filt, compiled)), [])
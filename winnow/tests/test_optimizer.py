@@ -0,0 +1,102 @@
+from nose.tools import assert_equals
+
+from ..core import Winnow
+from ..evaluate import filter_rows
+from ..utils import squish_ws
+
+sources = [
+    dict(display_name='Scoops', column='num_scoops',
+         value_types=['numeric', 'nullable']),
+    dict(display_name='Flavor', column='flavor', value_types=['collection']),
+    dict(display_name='Waffle Cone', column='waffle_cone', value_types=['bool']),
+    dict(display_name='Scooper', column='scooper', value_types=['string']),
+]
+
+class OptimizingWinnow(Winnow):
+    optimize_filters = True
+
+wnw = OptimizingWinnow('ice_cream', sources)
+
+def clause(data_source, operator, value):
+    return dict(data_source=data_source, operator=operator, value=value)
+
+def where(logical_op, *clauses):
+    query, params = wnw.where_clauses(dict(logical_op=logical_op, filter_clauses=list(clauses)))
+    return squish_ws(query), list(params)
+
+def test_nested_groups_are_flattened():
+    assert_equals(
+        where('&', clause('Scooper', 'is', 'Heidi'),
+              dict(logical_op='&', filter_clauses=[clause('Waffle Cone', 'is', True)])),
+        ('((scooper = %s ) AND ( waffle_cone))', ['Heidi']))
+
+def test_duplicates_are_dropped():
+    assert_equals(
+        where('|', clause('Scooper', 'is', 'Heidi'), clause('Scooper', 'is', 'Heidi')),
+        ('((scooper = %s ))', ['Heidi']))
+
+def test_any_of_clauses_are_merged():
+    assert_equals(
+        where('|', clause('Flavor', 'any of', ['Vanilla', 'Coffee']),
+              clause('Scooper', 'is', 'Heidi'),
+              clause('Flavor', 'any of', ['Coffee', 'Strawberry'])),
+        ('((flavor IN (%s,%s,%s) ) OR (scooper = %s ))',
+         ['Vanilla', 'Coffee', 'Strawberry', 'Heidi']))
+    assert_equals(
+        where('&', clause('Flavor', 'any of', ['Vanilla', 'Coffee']),
+              clause('Flavor', 'any of', ['Coffee', 'Strawberry'])),
+        ('((flavor IN (%s) ))', ['Coffee']))
+
+def test_ranges_are_tightened():
+    assert_equals(
+        where('&', clause('Scoops', '>', 3), clause('Scoops', '>=', 5),
+              clause('Scoops', '<', 9)),
+        ('((num_scoops >= %s) AND (num_scoops < %s))', [5, 9]))
+    assert_equals(
+        where('|', clause('Scoops', '>', 3), clause('Scoops', '>=', 5)),
+        ('((num_scoops > %s))', [3]))
+
+def test_contradictions_are_false():
+    assert_equals(
+        where('&', clause('Scoops', 'is', 3), clause('Scoops', 'is', 4)),
+        ('(FALSE)', []))
+    assert_equals(
+        where('&', clause('Scoops', '>', 5), clause('Scoops', '<=', 5)),
+        ('(FALSE)', []))
+    assert_equals(
+        where('|', clause('Scooper', 'is', 'Heidi'),
+              dict(logical_op='&', filter_clauses=[
+                  clause('Scoops', 'is', 3), clause('Scoops', '<', 2)])),
+        ('((scooper = %s ))', ['Heidi']))
+
+def test_tautologies_are_true():
+    assert_equals(
+        where('|', clause('Scoops', 'is set', True),
+              clause('Scoops', 'is set', False)),
+        ('(TRUE)', []))
+def test_disjoint_not_any_of_keeps_out_nulls():
+    # flavor NOT IN ('Vanilla') OR flavor NOT IN ('Coffee') is NULL, not
+    # TRUE, when flavor is.
+    filt = dict(logical_op='|', filter_clauses=[
+        clause('Flavor', 'not any of', ['Vanilla']), clause('Flavor', 'not any of', ['Coffee'])])
+    assert_equals(where('|', *filt['filter_clauses']), ('(flavor IS NOT NULL)', []))
+    rows = [dict(flavor=None), dict(flavor='Vanilla')]
+    assert_equals(filter_rows(wnw, filt, rows), filter_rows(Winnow('ice_cream', sources), filt, rows))
+    assert_equals(filter_rows(wnw, filt, rows), [dict(flavor='Vanilla')])
+    assert_equals(
+        where('&', clause('Flavor', 'not any of', []), clause('Scooper', 'is', 'Heidi')),
+        ('(flavor IS NOT NULL AND (scooper = %s ))', ['Heidi']))
+
+def test_special_cases_are_left_alone():
+    class SpecialWinnow(OptimizingWinnow):
+        _special_cases = {}
+
+    @SpecialWinnow.special_case('Scoops', 'numeric')
+    def scoops(wnw, clause):
+        return wnw.prepare_query('scoops({{ n }})', n=clause['value_vivified'])
+
+    special = SpecialWinnow('ice_cream', sources)
+    query, params = special.where_clauses(dict(logical_op='&', filter_clauses=[
+        clause('Scoops', 'is', 3), clause('Scoops', 'is', 4)]))
+    assert_equals(squish_ws(query), '(scoops(%s) AND scoops(%s))')
+    assert_equals(list(params), [3, 4])
@@ -0,0 +1,46 @@
+from nose.tools import assert_equals
+
+from ..core import Winnow
+from ..error import WinnowError
+from ..parallel import compile_parallel
+from ..parallel import worker_payload
+
+sources = [
+    dict(display_name='Scoops', column='num_scoops', value_types=['numeric']),
+    dict(display_name='Flavor', column='flavor', value_types=['collection']),
+    dict(display_name='Sprinkles', value_types=['bool']),
+]
+
+class ParallelWinnow(Winnow):
+    _special_cases = {}
+
+@ParallelWinnow.special_case('Sprinkles', 'bool')
+def sprinkles(wnw, clause):
+    return wnw.prepare_query("toppings @> '{sprinkles}'")
+
+def saved_filters(n):
+    return [dict(logical_op='&', filter_clauses=[
+        dict(data_source='Scoops', operator='>=', value=i % 7),
+        dict(data_source='Flavor', operator='any of', value=['Vanilla'] * (i % 3)),
+        dict(data_source='Sprinkles', operator='is', value=True),
+    ]) for i in range(n)] + [dict(logical_op='&', filter_clauses=[
+        dict(data_source='Cones', operator='is', value=True)])]
+
+def test_parallel_matches_in_process():
+    wnw = ParallelWinnow('ice_cream', sources)
+    filters = saved_filters(50)
+    expected = list(wnw.compile_many(filters))
+    results = list(wnw.compile_many(filters, processes=2, chunksize=7))
+    assert_equals([str(r) if isinstance(r, WinnowError) else tuple(r) for r in results],
+                  [str(r) if isinstance(r, WinnowError) else tuple(r) for r in expected])
+    assert isinstance(results[-1], WinnowError)
+
+def test_unpicklable_handlers_compile_in_process():
+    class LocalWinnow(Winnow):
+        _special_cases = {}
+    LocalWinnow.special_case('Sprinkles', 'bool')(lambda wnw, clause: wnw.prepare_query('TRUE'))
+    wnw = LocalWinnow('ice_cream', sources)
+    assert_equals(worker_payload(wnw), None)
+    filters = saved_filters(3)[:3]
+    assert_equals(list(compile_parallel(wnw, filters, processes=2)),
+                  list(wnw.compile_many(filters)))
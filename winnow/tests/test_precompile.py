@@ -0,0 +1,97 @@
+import shutil
+import tempfile
+
+from nose.tools import assert_equals
+
+from ..core import Winnow
+from ..precompile import compile_templates
+from ..precompile import default_templates
+from ..precompile import main
+from ..precompile import winnow_templates
+from ..sql_prepare import template_where_clause
+from ..templating import WinnowSql
+
+sources = [
+    dict(display_name='Scoops', column='num_scoops', value_types=['numeric']),
+    dict(display_name='Scooper', column='scooper', value_types=['string']),
+    dict(display_name='Toppings', value_types=['collection']),
+    dict(display_name='Sprinkles', value_types=['bool']),
+    dict(display_name='Cone', value_types=['nullable']),
+]
+
+class PrecompiledWinnow(Winnow):
+    _special_cases = {}
+
+@PrecompiledWinnow.special_case('Toppings', 'collection')
+def toppings(wnw, clause):
+    return wnw.prepare_query(
+        "{% if negative %}NOT {% endif %}toppings && {{ value }}",
+        negative=clause['operator_resolved']['negative'], value=clause['value_vivified'])
+
+@PrecompiledWinnow.special_case('Sprinkles', 'bool')
+def sprinkles(wnw, clause):
+    return wnw.prepare_query("toppings @> '{sprinkles}'")
+
+@PrecompiledWinnow.special_case('Cone', 'nullable')
+def cone(wnw, clause):
+    # No 'column' on this source
+    return wnw.prepare_query(
+        "{{ column | sqlsafe }} IS NULL", column=clause['data_source_resolved']['column'])
+
+filt = dict(logical_op='&', filter_clauses=[
+    dict(data_source='Scoops', operator='>=', value=2),
+    dict(data_source='Scooper', operator='contains', value='heidi'),
+    dict(data_source='Toppings', operator='not any of', value=['nuts']),
+    dict(data_source='Sprinkles', operator='is', value=True),
+])
+
+class NoCompilingSql(WinnowSql):
+    def _compile(self, source):
+        template = super(NoCompilingSql, self)._compile(source)
+        assert template.name is not None, 'compiled {!r}'.format(source)
+        return template
+
+def test_warm_up():
+    wnw = PrecompiledWinnow('ice_cream', sources)
+    failed = wnw.warm_up()
+    assert_equals([(source, op) for source, op, e in failed], [('Cone', 'is set')])
+    assert isinstance(failed[0][2], KeyError)
+    # The query, Toppings (for 'any of' and 'not any of') and Sprinkles
+    info = wnw.sql.template_cache.cache_info()
+    assert_equals((info.misses, info.currsize), (3, 3))
+    wnw.query(filt)
+    assert_equals(wnw.sql.template_cache.cache_info().misses, 3)
+
+def test_precompiled_templates_are_loaded():
+    target = tempfile.mkdtemp()
+    try:
+        wnw = PrecompiledWinnow('ice_cream', sources)
+        templates = set(default_templates()) | set(winnow_templates(wnw))
+        compile_templates(templates, target)
+
+        class LoadingWinnow(PrecompiledWinnow):
+            sql_class = NoCompilingSql
+        NoCompilingSql.compiled_templates = target
+        try:
+            loading = LoadingWinnow('ice_cream', sources)
+            assert_equals(tuple(loading.query(filt)), tuple(wnw.query(filt)))
+            op = dict(name='contains', value_type='string', negative=False)
+            assert_equals(tuple(template_where_clause('scooper', op, 'heidi', loading.sql)),
+                          tuple(template_where_clause('scooper', op, 'heidi')))
+        finally:
+            NoCompilingSql.compiled_templates = None
+    finally:
+        shutil.rmtree(target)
+
+def make_winnow():
+    return PrecompiledWinnow('ice_cream', sources)
+
+def test_main():
+    target = tempfile.mkdtemp()
+    try:
+        main([target, 'winnow.tests.test_precompile:make_winnow'])
+        loading = PrecompiledWinnow('ice_cream', sources)
+        loading.sql = NoCompilingSql(compiled_templates=target)
+        assert_equals(loading.warm_up()[0][:2], ('Cone', 'is set'))
+    finally:
+        shutil.rmtree(target)
@@ -0,0 +1,102 @@
+import datetime
+
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+
+from .. import sql_prepare
+from ..core import Winnow
+from ..error import WinnowError
+from ..relative_dates import DateRangeTable
+from ..relative_dates import SERVER_DATE_RANGES
+from ..relative_dates import valid_rel_date_values
+
+class Clock(object):
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+clock = Clock(datetime.datetime(2017, 3, 22, 18, 14, 30))
+date_ranges = DateRangeTable(clock)
+
+def test_every_value_has_a_range():
+    for value in valid_rel_date_values:
+        start, end = date_ranges.interpret(value)
+        assert start <= end, value
+        assert value in SERVER_DATE_RANGES, value
+
+def test_ranges():
+    assert_equals(date_ranges.interpret('today'), (
+        datetime.datetime(2017, 3, 22), datetime.datetime(2017, 3, 23)))
+    assert_equals(date_ranges.interpret('Last 7 Days'), (
+        datetime.datetime(2017, 3, 15, 18, 14, 30), datetime.datetime(2017, 3, 22, 18, 14, 33)))
+    assert_equals(date_ranges.interpret('current_month'), (
+        datetime.datetime(2017, 3, 1), datetime.datetime(2017, 3, 31, 23, 59, 59, 999999)))
+    assert_raises(WinnowError, date_ranges.interpret, 'the_before_times')
+
+def test_table_is_rebuilt_when_the_day_changes():
+    table = DateRangeTable(Clock(datetime.datetime(2017, 3, 22, 9)))
+    ranges = table.ranges(table.clock())
+    table.clock.now = datetime.datetime(2017, 3, 22, 17)
+    assert table.ranges(table.clock()) is ranges
+    assert_equals(table.interpret('last_7_days')[1], datetime.datetime(2017, 3, 22, 17, 0, 3))
+    table.clock.now = datetime.datetime(2017, 3, 23, 9)
+    assert table.ranges(table.clock()) is not ranges
+    assert_equals(table.interpret('yesterday')[0], datetime.datetime(2017, 3, 22))
+
+
+sources = [
+    dict(display_name='Purchase Date', column='purchased_at',
+         value_types=['relative_date', 'absolute_date']),
+]
+
+def purchased(operator, value):
+    return dict(logical_op='&', filter_clauses=[
+        dict(data_source='Purchase Date', operator=operator, value=value)])
+
+class PinnedWinnow(Winnow):
+    date_ranges = date_ranges
+
+def test_within_and_outside_of():
+    wnw = PinnedWinnow('purchases', sources)
+    assert_equals(tuple(wnw.where_clauses(purchased('within', 'today'))), (
+        '((purchased_at >= %s::timestamp AND purchased_at < %s::timestamp))',
+        (datetime.datetime(2017, 3, 22), datetime.datetime(2017, 3, 23))))
+    assert_equals(tuple(wnw.where_clauses(purchased('outside of', 'yesterday'))), (
+        '((purchased_at < %s::timestamp OR purchased_at >= %s::timestamp))',
+        (datetime.datetime(2017, 3, 21), datetime.datetime(2017, 3, 22))))
+
+def test_builder_matches_template():
+    within = dict(name='within', value_type='relative_date', negative=False)
+    assert_equals(
+        sql_prepare.where_clause('purchased_at', within, 'last_month'),
+        sql_prepare.template_where_clause('purchased_at', within, 'last_month'))
+
+def test_server_side_ranges():
+    class ServerSideWinnow(Winnow):
+        relative_date_sql = 'server'
+
+    wnw = ServerSideWinnow('purchases', sources)
+    query, params = wnw.where_clauses(purchased('within', 'today'))
+    assert_equals(query, (
+        "((purchased_at >= date_trunc('day', LOCALTIMESTAMP) AND "
+        "purchased_at < (date_trunc('day', LOCALTIMESTAMP) + interval '1 days')))"))
+    assert_equals(params, ())
+
+def test_overridden_where_clause_follows_the_clock():
+    class PassThroughWinnow(Winnow):
+        date_ranges = DateRangeTable(Clock(datetime.datetime(2017, 3, 22, 9)))
+
+        def where_clause(self, data_source, operator, value):
+            return super(PassThroughWinnow, self).where_clause(data_source, operator, value)
+
+    wnw = PassThroughWinnow('ice_cream', [
+        dict(display_name='Purchased', column='purchased_at', value_types=['relative_date'])])
+    filt = dict(logical_op='&', filter_clauses=[
+        dict(data_source='Purchased', operator='within', value='today')])
+    query, params = wnw.where_clauses(filt)
+    assert_equals(params[0], datetime.datetime(2017, 3, 22))
+    wnw.date_ranges.clock.now = datetime.datetime(2017, 3, 25, 9)
+    query, params = wnw.where_clauses(filt)
+    assert_equals(params[0], datetime.datetime(2017, 3, 25))
@@ -0,0 +1,98 @@
+import datetime
+import shutil
+import tempfile
+
+from nose.tools import assert_equals
+
+from ..core import Winnow
+from ..relative_dates import DateRangeTable
+from ..result_cache import FileStore
+from ..result_cache import fingerprint
+from ..result_cache import MemoryStore
+from ..result_cache import ResultCache
+from .test_bitmaps import SqliteConnection
+from .test_relative_dates import Clock
+
+sources = [
+    dict(display_name='Scoops', column='num_scoops', value_types=['numeric', 'nullable']),
+    dict(display_name='Flavor', column='flavor', value_types=['collection']),
+    dict(display_name='Sold', column='sold_at', value_types=['relative_date']),
+]
+
+clock = Clock(datetime.datetime(2017, 3, 22, 18, 14, 30))
+
+class PinnedWinnow(Winnow):
+    date_ranges = DateRangeTable(clock)
+
+wnw = PinnedWinnow('ice_cream', sources)
+
+def as_filter(logical_op, *clauses):
+    return dict(logical_op=logical_op, filter_clauses=[
+        dict(data_source=ds, operator=op, value=value) for ds, op, value in clauses])
+
+def test_fingerprint_ignores_order_and_spelling():
+    a = as_filter('&', ('Scoops', '>=', 2), ('Flavor', 'any of', ['Vanilla', 'Coffee']))
+    b = as_filter('&', ('Flavor', 'any of', ['Coffee', 'Vanilla', 'Coffee']), ('Scoops', '>=', '2'))
+    assert_equals(fingerprint(wnw, a), fingerprint(wnw, b))
+    assert fingerprint(wnw, a) != fingerprint(wnw, dict(a, logical_op='|'))
+    assert fingerprint(wnw, a) != fingerprint(Winnow('other', sources), a)
+    assert fingerprint(wnw, a) != fingerprint(wnw, as_filter('&', ('Scoops', '>=', 3),
+                                                             ('Flavor', 'any of', ['Vanilla', 'Coffee'])))
+
+def test_fingerprint_follows_relative_dates():
+    today = as_filter('&', ('Sold', 'within', 'today'))
+    last_week = as_filter('&', ('Sold', 'within', 'last_7_days'))
+    before = fingerprint(wnw, today), fingerprint(wnw, last_week)
+    clock.now = datetime.datetime(2017, 3, 22, 20)
+    assert_equals((fingerprint(wnw, today), fingerprint(wnw, last_week)), before)
+    clock.now = datetime.datetime(2017, 3, 23, 9)
+    assert fingerprint(wnw, today) != before[0]
+    assert fingerprint(wnw, last_week) != before[1]
+
+def test_memory_store():
+    now = Clock(100)
+    store = MemoryStore(maxsize=2, ttl=10, clock=now)
+    store.set('ice_cream', 'a', [1])
+    store.set('ice_cream', 'b', [2])
+    store.set('cones', 'c', [3])
+    assert_equals(store.get('ice_cream', 'a'), None)
+    assert_equals(store.get('ice_cream', 'b'), [2])
+    store.invalidate('ice_cream')
+    assert_equals(store.get('ice_cream', 'b'), None)
+    assert_equals(store.get('cones', 'c'), [3])
+    now.now = 110
+    assert_equals(store.get('cones', 'c'), None)
+
+def test_file_store():
+    directory = tempfile.mkdtemp()
+    try:
+        now = Clock(100)
+        store = FileStore(directory, maxsize=2, ttl=10, clock=now)
+        store.set('ice_cream', 'a', [(1, 'Vanilla')])
+        assert_equals(store.get('ice_cream', 'a'), [(1, 'Vanilla')])
+        assert_equals(FileStore(directory, clock=now).get('ice_cream', 'a'), [(1, 'Vanilla')])
+        store.set('public.cones', 'b', [2])
+        store.set('public.cones', 'c', [3])
+        assert_equals(sum(store.get(*key) is not None for key in (
+            ('ice_cream', 'a'), ('public.cones', 'b'), ('public.cones', 'c'))), 2)
+        store.invalidate('public.cones')
+        assert_equals(store.get('public.cones', 'c'), None)
+        store.set('ice_cream', 'a', [1])
+        now.now = 110
+        assert_equals(store.get('ice_cream', 'a'), None)
+    finally:
+        shutil.rmtree(directory)
+
+def test_result_cache():
+    conn = SqliteConnection()
+    cache = ResultCache(wnw, conn)
+    filt = as_filter('&', ('Scoops', '>=', 3))
+    assert_equals(cache.rows(filt), [(1, 3, 'Vanilla'), (70, 5, 'Vanilla')])
+    assert_equals(cache.rows(as_filter('&', ('Scoops', '>=', '3'))),
+                  [(1, 3, 'Vanilla'), (70, 5, 'Vanilla')])
+    assert_equals(conn.queries, 1)
+
+    conn.db.execute('DELETE FROM ice_cream WHERE id = 70')
+    cache.invalidate()
+    assert_equals(cache.rows(filt), [(1, 3, 'Vanilla')])
+    assert_equals(conn.queries, 2)
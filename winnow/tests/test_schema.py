@@ -0,0 +1,44 @@
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+
+from ..core import Winnow
+from ..default_operators import OPERATORS
+from ..error import WinnowError
+from ..schema import Schema
+
+sources = [
+    dict(display_name='Number Scoops', column='num_scoops',
+         value_types=['numeric', 'nullable']),
+    dict(display_name='Flavor', column='flavor', value_types=['collection']),
+    dict(display_name='Flavor', column='flavour', value_types=['collection']),
+    dict(display_name='Scooper', column='scooper', value_types=['bool', 'string']),
+]
+
+schema = Schema(sources, OPERATORS)
+
+def test_resolve_source():
+    assert_equals(schema.resolve_source('Number Scoops')['column'], 'num_scoops')
+    assert_raises(WinnowError, schema.resolve_source, 'Cone Type')
+    assert_raises(WinnowError, schema.resolve_source, 'Flavor')
+
+def test_resolve_operator_is_case_insensitive():
+    op = schema.resolve_operator('IS NOT', ['numeric'])
+    assert_equals((op['name'], op['value_type']), ('is not', 'numeric'))
+    assert_raises(WinnowError, schema.resolve_operator, 'any of', ['numeric'])
+    assert_raises(WinnowError, schema.resolve_operator, None, ['numeric'])
+
+def test_resolve_operator_prefers_last_listed():
+    # Both the string and the bool 'is' match; bool comes later in OPERATORS
+    op = schema.resolve_operator('is', ['string', 'bool'])
+    assert_equals(op['value_type'], 'bool')
+
+def test_coalesce_value_type():
+    assert_equals(schema.coalesce_value_type('nullable'), 'bool')
+    assert_equals(schema.coalesce_value_type('numeric'), 'numeric')
+    assert_equals(schema.coalesce_value_type('made_up'), 'made_up')
+
+def test_assigning_sources_rebuilds_schema():
+    wnw = Winnow('ice_cream', sources[:1])
+    assert_raises(WinnowError, wnw.resolve_source, 'Scooper')
+    wnw.sources = sources
+    assert_equals(wnw.resolve_source('Scooper')['column'], 'scooper')
@@ -0,0 +1,69 @@
+import datetime
+import decimal
+
+from nose.tools import assert_equals
+
+from .. import sql_prepare
+from ..default_operators import OPERATORS
+
+sample_values = {
+    'numeric': [3, 0, -2.5, decimal.Decimal('1.5')],
+    'string': ['Heidi', '', "O'Brien"],
+    'string_length': [3, 1, 0],
+    'collection': [['Strawberry', 'Chocolate'], ['Vanilla'], []],
+    'bool': [True, False],
+    'nullable': [True, False],
+    'absolute_date': [datetime.datetime(2017, 3, 22, 18, 14, 30)],
+}
+
+def test_builders_match_templates():
+    for op in OPERATORS:
+        for value in sample_values.get(op['value_type'], []):
+            fast = sql_prepare.where_clause('num_scoops', op, value)
+            slow = sql_prepare.template_where_clause('num_scoops', op, value)
+            assert_equals(fast, slow)
+
+def test_blank_string_is_also_null():
+    op = dict(name='is', value_type='string', negative=False)
+    query, params = sql_prepare.where_clause('name', op, '')
+    assert 'OR name IS NULL' in query
+    assert_equals(params, [''])
+
+def test_word_count_binds_regex():
+    op = dict(name='more than __ words', value_type='string_length', negative=False)
+    query, params = sql_prepare.where_clause('name', op, 2)
+    assert_equals(query, '(name ~ %s )')
+    assert_equals(params, [r'(\S+\s+){2}\S+$'])
+
+def test_clause_params_match_builders():
+    for op in OPERATORS:
+        for value in sample_values.get(op['value_type'], []):
+            params = sql_prepare.CLAUSE_PARAMS[op['value_type']](op, value)
+            assert_equals(params, sql_prepare.where_clause('num_scoops', op, value).params)
+
+def test_collection_strategies():
+    any_of, not_any_of = [op for op in OPERATORS if op['value_type'] == 'collection']
+    flavors = ['Vanilla', 'Coffee']
+    assert_equals(
+        tuple(sql_prepare.where_clause('flavor', any_of, flavors, 'array')),
+        ('(flavor = ANY(%s))', [flavors]))
+    assert_equals(
+        tuple(sql_prepare.where_clause('flavor', not_any_of, flavors, 'array')),
+        ('(flavor <> ALL(%s))', [flavors]))
+    assert_equals(
+        tuple(sql_prepare.where_clause('flavor', any_of, flavors, 'values')),
+        ('(flavor = ANY(VALUES (%s), (%s)))', flavors))
+    assert_equals(
+        sql_prepare.where_clause('flavor', any_of, flavors, 'inclause'),
+        sql_prepare.where_clause('flavor', any_of, flavors))
+    for strategy in ('inclause', 'array', 'values'):
+        assert_equals(
+            sql_prepare.collection_params(strategy, flavors),
+            sql_prepare.where_clause('flavor', any_of, flavors, strategy).params)
+
+def test_table_values_use_exists():
+    any_of = [op for op in OPERATORS if op['name'] == 'any of'][0]
+    values = sql_prepare.TableValues('winnow_values_0', ['Vanilla'])
+    assert_equals(
+        tuple(sql_prepare.where_clause('flavor', any_of, values, 'table')),
+        ('(EXISTS (SELECT 1 FROM winnow_values_0 WHERE winnow_values_0.value = flavor))', []))
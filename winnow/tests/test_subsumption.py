@@ -0,0 +1,93 @@
+import datetime
+
+from nose.tools import assert_equals
+
+from ..core import Winnow
+from ..relative_dates import DateRangeTable
+from ..subsumption import implies
+from ..subsumption import refine_rows
+from .test_relative_dates import Clock
+
+sources = [
+    dict(display_name='Scoops', column='num_scoops', value_types=['numeric']),
+    dict(display_name='Flavor', column='flavor', value_types=['collection']),
+    dict(display_name='Sold', column='sold_at', value_types=['relative_date', 'absolute_date']),
+    dict(display_name='Sprinkles', value_types=['bool']),
+    dict(display_name='Acct', column='acct_id', value_types=['numeric', 'collection']),
+]
+
+class SubsumingWinnow(Winnow):
+    _special_cases = {}
+    date_ranges = DateRangeTable(Clock(datetime.datetime(2017, 3, 22, 18, 14, 30)))
+
+@SubsumingWinnow.special_case('Sprinkles', 'bool')
+def sprinkles(wnw, clause):
+    return wnw.prepare_query("toppings @> '{sprinkles}'")
+
+wnw = SubsumingWinnow('ice_cream', sources)
+
+def as_filter(logical_op, *clauses):
+    return dict(logical_op=logical_op, filter_clauses=[
+        dict(data_source=ds, operator=op, value=value) for ds, op, value in clauses])
+
+vanilla = ('Flavor', 'any of', ['Vanilla'])
+vanilla_or_coffee = ('Flavor', 'any of', ['Vanilla', 'Coffee'])
+
+def test_extra_clauses():
+    broad = as_filter('&', vanilla)
+    assert implies(wnw, as_filter('&', vanilla, ('Scoops', '>=', 2)), broad)
+    assert not implies(wnw, broad, as_filter('&', vanilla, ('Scoops', '>=', 2)))
+    assert implies(wnw, as_filter('|', vanilla), as_filter('|', vanilla, ('Scoops', '>=', 2)))
+    assert implies(wnw, as_filter('&', ('Sprinkles', 'is', True), vanilla),
+                   as_filter('&', ('Sprinkles', 'is', True)))
+    assert not implies(wnw, as_filter('&', ('Sprinkles', 'is', True)),
+                       as_filter('&', ('Sprinkles', 'is', False)))
+    assert implies(wnw, as_filter('&', vanilla), as_filter('&'))
+    assert not implies(wnw, as_filter('&'), as_filter('&', vanilla))
+
+def test_ranges():
+    def scoops(op, value):
+        return as_filter('&', ('Scoops', op, value))
+    assert implies(wnw, scoops('>=', 3), scoops('>=', 2))
+    assert implies(wnw, scoops('>', 2), scoops('>=', 2))
+    assert not implies(wnw, scoops('>=', 2), scoops('>', 2))
+    assert not implies(wnw, scoops('>=', 1), scoops('>=', 2))
+    assert implies(wnw, scoops('<', 2), scoops('<=', 5))
+    assert implies(wnw, scoops('is', 3), scoops('<=', 3))
+    assert not implies(wnw, scoops('is', 3), scoops('<', 3))
+    assert implies(wnw, as_filter('&', ('Sold', 'after', '2017-03-01')),
+                   as_filter('&', ('Sold', 'after', '2017-02-01')))
+
+def test_relative_dates():
+    def sold(op, value):
+        return as_filter('&', ('Sold', op, value))
+    assert implies(wnw, sold('within', 'today'), sold('within', 'current_week'))
+    assert implies(wnw, sold('within', 'last_7_days'), sold('within', 'last_14_days'))
+    assert not implies(wnw, sold('within', 'current_week'), sold('within', 'today'))
+    assert implies(wnw, sold('outside of', 'current_week'), sold('outside of', 'today'))
+    assert implies(wnw, sold('within', 'yesterday'), sold('outside of', 'today'))
+
+def test_collections():
+    assert implies(wnw, as_filter('&', vanilla), as_filter('&', vanilla_or_coffee))
+    assert not implies(wnw, as_filter('&', vanilla_or_coffee), as_filter('&', vanilla))
+    assert implies(wnw, as_filter('&', ('Flavor', 'not any of', ['Vanilla', 'Coffee'])),
+                   as_filter('&', ('Flavor', 'not any of', ['Coffee'])))
+    assert implies(wnw, as_filter('&', vanilla), as_filter('&', ('Flavor', 'not any of', ['Coffee'])))
+
+def test_refine_rows():
+    rows = [dict(id=1, flavor='Vanilla', num_scoops=3), dict(id=2, flavor='Coffee', num_scoops=1),
+            dict(id=3, flavor='Vanilla', num_scoops=1)]
+    broad = as_filter('&', vanilla_or_coffee)
+    assert_equals(refine_rows(wnw, as_filter('&', vanilla, ('Scoops', '<', 2)), broad, rows),
+                  [rows[2]])
+    assert_equals(refine_rows(wnw, as_filter('&', ('Scoops', '<', 2)), broad, rows), None)
+    # Sprinkles has no python predicate to filter with
+    assert_equals(refine_rows(wnw, as_filter('&', ('Sprinkles', 'is', True), vanilla_or_coffee),
+                              broad, rows), None)
+
+def test_refine_rows_with_ids():
+    # Like the SQL, '1' matches an integer id
+    rows = [dict(acct_id=1), dict(acct_id=3)]
+    broad = as_filter('&', ('Acct', '>=', 0))
+    assert_equals(refine_rows(wnw, as_filter('&', ('Acct', '>=', 0), ('Acct', 'any of', ['1', '2'])),
+                              broad, rows), [rows[0]])
@@ -0,0 +1,136 @@
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+
+from ..core import Winnow
+from ..temp_tables import copy_lines
+from ..temp_tables import CopyStream
+from ..temp_tables import temp_table_query
+from ..utils import squish_ws
+
+sources = [
+    dict(display_name='Account', column='account_id', value_types=['collection']),
+    dict(display_name='Region', column='region', value_types=['collection']),
+]
+
+wnw = Winnow('accounts', sources)
+
+
+class StandInCursor(object):
+    """
+    Records what it's asked to do, in place of a real database cursor.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=()):
+        self.connection.executed.append((squish_ws(query), list(params)))
+
+    def close(self):
+        self.connection.closed_cursors += 1
+
+
+class CopyingCursor(StandInCursor):
+    def copy_expert(self, sql, stream):
+        self.connection.copied.append((sql, stream.read()))
+
+
+class StandInConnection(object):
+    cursor_class = CopyingCursor
+
+    def __init__(self):
+        self.executed = []
+        self.copied = []
+        self.closed_cursors = 0
+
+    def cursor(self):
+        return self.cursor_class(self)
+
+
+def accounts_filt(n):
+    return dict(logical_op='&', filter_clauses=[
+        dict(data_source='Account', operator='not any of', value=[str(i) for i in range(n)]),
+        dict(data_source='Region', operator='any of', value=['west']),
+    ])
+
+def test_large_collections_are_copied_to_temp_tables():
+    conn = StandInConnection()
+    with temp_table_query(wnw, conn, accounts_filt(5), threshold=3) as cursor:
+        assert isinstance(cursor, CopyingCursor)
+
+    assert_equals(conn.copied, [('COPY pg_temp.winnow_values_0 (value) FROM STDIN', '0\n1\n2\n3\n4\n')])
+    assert_equals(conn.executed, [
+        ('DROP TABLE IF EXISTS pg_temp.winnow_values_0', []),
+        ('CREATE TEMPORARY TABLE pg_temp.winnow_values_0 (value text)', []),
+        ('ANALYZE pg_temp.winnow_values_0', []),
+        ('SELECT * FROM accounts WHERE ((account_id IS NOT NULL AND NOT EXISTS '
+         '(SELECT 1 FROM pg_temp.winnow_values_0 WHERE pg_temp.winnow_values_0.value = account_id)) '
+         'AND (region IN (%s) ))', ['west']),
+        ('DROP TABLE IF EXISTS pg_temp.winnow_values_0', []),
+    ])
+    assert_equals(conn.closed_cursors, 1)
+
+class FailingCursor(CopyingCursor):
+    def execute(self, query, params=()):
+        super(FailingCursor, self).execute(query, params)
+        if query.startswith('SELECT'):
+            raise ValueError('current transaction is aborted')
+
+def test_tables_are_left_to_the_rollback_after_errors():
+    conn = StandInConnection()
+    conn.cursor_class = FailingCursor
+    with assert_raises(ValueError):
+        with temp_table_query(wnw, conn, accounts_filt(5), threshold=3):
+            pass
+    assert conn.executed[-1][0].startswith('SELECT')
+    assert_equals(conn.closed_cursors, 1)
+
+    conn = StandInConnection()
+    with assert_raises(KeyError):
+        with temp_table_query(wnw, conn, accounts_filt(5), threshold=3):
+            raise KeyError('while fetching')
+    assert conn.executed[-1][0].startswith('SELECT')
+    assert_equals(conn.closed_cursors, 1)
+
+def test_column_type_comes_from_the_source():
+    typed = Winnow('accounts', [
+        dict(source, collection_sql_type='bigint') if source['display_name'] == 'Account' else source
+        for source in sources])
+    conn = StandInConnection()
+    with temp_table_query(typed, conn, accounts_filt(5), threshold=3):
+        pass
+    assert_equals(conn.executed[1], ('CREATE TEMPORARY TABLE pg_temp.winnow_values_0 (value bigint)', []))
+
+def test_small_collections_are_bound():
+    conn = StandInConnection()
+    with temp_table_query(wnw, conn, accounts_filt(2), threshold=3):
+        pass
+    assert_equals(conn.copied, [])
+    query, params = wnw.query(accounts_filt(2))
+    assert_equals(conn.executed, [(squish_ws(query), params)])
+
+class InsertingCursor(StandInCursor):
+    def executemany(self, query, rows):
+        self.connection.inserted.append((query, list(rows)))
+
+
+class InsertingConnection(StandInConnection):
+    cursor_class = InsertingCursor
+
+    def __init__(self):
+        super(InsertingConnection, self).__init__()
+        self.inserted = []
+
+def test_insert_when_copy_is_unavailable():
+    conn = InsertingConnection()
+    with temp_table_query(wnw, conn, accounts_filt(4), threshold=3, analyze=False):
+        pass
+    assert_equals(conn.inserted, [(
+        'INSERT INTO pg_temp.winnow_values_0 (value) VALUES (%s)',
+        [('0',), ('1',), ('2',), ('3',)])])
+
+def test_copy_text_format():
+    assert_equals(list(copy_lines(['a\tb', None, 'c\\d'])), ['a\\tb\n', '\\N\n', 'c\\\\d\n'])
+    stream = CopyStream(['apple', 'banana'])
+    assert_equals(stream.read(3), 'app')
+    assert_equals(stream.read(), 'le\nbanana\n')
+    assert_equals(stream.read(), '')
@@ -0,0 +1,66 @@
+from __future__ import unicode_literals
+
+from datetime import date
+from datetime import datetime
+
+from dateutil.parser import parse as parse_date
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+
+from ..error import WinnowError
+from ..utils import LRUCache
+from ..values import parse_iso_datetime
+from ..values import vivify_absolute_date
+
+
+def test_iso_matches_dateutil():
+    for value in [
+        '2017-03-22',
+        '2017-03-22T18:14',
+        '2017-03-22T18:14:30',
+        '2017-03-22 18:14:30',
+        '2017-03-22T18:14:30.5',
+        '2017-03-22T18:14:30.123456',
+        '2017-03-22T18:14:30Z',
+        '2017-03-22T18:14:30+00:00',
+        '2017-03-22T18:14:30-07:00',
+        '2017-03-22T18:14:30.250+0530',
+        datetime(2017, 3, 22, 18, 14, 30, 42).isoformat(),
+    ]:
+        parsed = parse_iso_datetime(value)
+        assert_equals(parsed, parse_date(value))
+        assert_equals(parsed.utcoffset(), parse_date(value).utcoffset())
+        assert_equals(vivify_absolute_date(value), parsed)
+
+
+def test_not_iso():
+    for value in ['March 22, 2017', '2017-03-22T18', '2017-13-01', '2017-03-22T18:14:30 junk']:
+        assert_equals(parse_iso_datetime(value), None)
+    assert_equals(vivify_absolute_date('March 22, 2017'), datetime(2017, 3, 22))
+
+
+def test_datetimes():
+    now = datetime.now()
+    assert vivify_absolute_date(now) is now
+    assert_equals(vivify_absolute_date(date(2017, 3, 22)), datetime(2017, 3, 22))
+
+
+def test_invalid():
+    for value in ['not a date', '2017-13-45', None, 12]:
+        with assert_raises(WinnowError):
+            vivify_absolute_date(value)
+
+
+def test_strict():
+    assert_equals(vivify_absolute_date('2017-03-22', strict=True), datetime(2017, 3, 22))
+    with assert_raises(WinnowError):
+        vivify_absolute_date('March 22, 2017', strict=True)
+
+
+def test_memo():
+    memo = LRUCache(10)
+    first = vivify_absolute_date('March 22, 2017', memo=memo)
+    assert vivify_absolute_date('March 22, 2017', memo=memo) is first
+    assert_equals(memo.cache_info().hits, 1)
+    with assert_raises(WinnowError):
+        vivify_absolute_date('March 22, 2017', strict=True, memo=LRUCache(10))
@@ -1,6 +1,11 @@
+import copy
+import threading
+
 from nose.tools import assert_equals
 
 from ..core import Winnow
+from ..error import WinnowError
+from ..nodes import ResolvedClause
 from ..utils import squish_ws
 
 sources = [
@@ -120,3 +125,246 @@ def test_special_case_override():
 
     assert_equals(query, expected)
     assert_equals(params, ())
+
+
+def scoops_filt(min_scoops, flavors):
+    return dict(
+        logical_op='|',
+        filter_clauses=[
+            dict(data_source='Number Scoops', operator='>=', value=min_scoops),
+            dict(data_source='Flavor', operator='any of', value=flavors),
+            dict(data_source='More Scoops than Avg', operator='is', value=True),
+        ])
+
+def test_plans_are_reused_for_new_values():
+    wnw = Winnow('ice_cream', sources)
+    first = wnw.query(scoops_filt(2, ['Vanilla', 'Coffee']))
+    second = wnw.query(scoops_filt(5, ['Strawberry', 'Chocolate']))
+    assert_equals(wnw.plan_cache_info().hits, 1)
+    assert_equals(second.query, first.query)
+    assert_equals(second.params, [5, 'Strawberry', 'Chocolate'])
+
+def test_plans_match_uncached_sql():
+    class UncachedWinnow(Winnow):
+        plan_cache_size = 0
+
+    cached = Winnow('ice_cream', sources)
+    uncached = UncachedWinnow('ice_cream', sources)
+    for filt in (scoops_filt(2, ['Vanilla']), scoops_filt(3, ['Coffee']),
+                 scoops_filt(3, ['Coffee', 'Vanilla']), nested_filt, special_filt):
+        assert_equals(cached.where_clauses(filt), uncached.where_clauses(filt))
+        assert_equals(cached.query(filt), uncached.query(filt))
+    assert_equals(uncached.plan_cache_info().currsize, 0)
+
+def test_collection_size_is_part_of_the_plan():
+    wnw = Winnow('ice_cream', sources)
+    wnw.where_clauses(scoops_filt(2, ['Vanilla']))
+    wnw.where_clauses(scoops_filt(2, ['Vanilla', 'Coffee']))
+    assert_equals(wnw.plan_cache_info().hits, 0)
+
+def test_invalidate_plans():
+    wnw = Winnow('ice_cream', sources)
+    wnw.where_clauses(ice_cream_filt)
+    wnw.invalidate_plans()
+    assert_equals(wnw.plan_cache_info().currsize, 0)
+    wnw.where_clauses(ice_cream_filt)
+    assert_equals(wnw.plan_cache_info().misses, 1)
+
+def test_plans_rebuild_special_cases():
+    class UserWinnow(Winnow):
+        _special_cases = {}
+        user = 1
+
+    @UserWinnow.special_case('More Scoops than Avg', 'bool')
+    def scooped_by_user(wnw, clause):
+        return wnw.prepare_query('scooper_id = {{ user }}', user=wnw.user)
+
+    wnw = UserWinnow('ice_cream', sources)
+    filt = scoops_filt(2, ['Vanilla'])
+    assert_equals(wnw.where_clauses(filt).params, (2, 'Vanilla', 1))
+    wnw.user = 2
+    assert_equals(wnw.where_clauses(filt).params, (2, 'Vanilla', 2))
+    assert_equals(wnw.plan_cache_info().hits, 1)
+
+
+def test_resolve_filter_leaves_input_alone():
+    filt = copy.deepcopy(nested_filt)
+    resolved = ice_cream_winnow.resolve_filter(filt)
+    assert_equals(filt, nested_filt)
+
+    clause = resolved.filter_clauses[0].filter_clauses[0]
+    assert isinstance(clause, ResolvedClause)
+    assert_equals(clause['value_vivified'], 2)
+    assert_equals(clause['data_source_resolved']['column'], 'num_scoops')
+    assert_equals(clause.summary, 'Number Scoops >= 2')
+
+def test_compiling_does_not_modify_filter():
+    filt = copy.deepcopy(nested_filt)
+    ice_cream_winnow.validate(filt)
+    ice_cream_winnow.where_clauses(filt)
+    ice_cream_winnow.query(filt)
+    assert_equals(filt, nested_filt)
+
+def test_one_filter_can_compile_on_many_threads():
+    filt = scoops_filt(3, ['Vanilla', 'Coffee'])
+    expected = ice_cream_winnow.query(filt)
+    results = []
+
+    def compile_filter():
+        for _ in range(50):
+            results.append(ice_cream_winnow.query(filt))
+
+    threads = [threading.Thread(target=compile_filter) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert_equals(len(results), 200)
+    assert all(result == expected for result in results)
+
+def test_summaries_are_lazy():
+    clause = ice_cream_winnow.resolve_filter(ice_cream_filt).filter_clauses[1]
+    assert_equals(clause._summary, None)
+    assert_equals(clause['summary'], 'Flavor any of Strawberry, Chocolate')
+
+def test_resolve_can_skip_summaries():
+    filt = ice_cream_winnow.resolve(copy.deepcopy(ice_cream_filt), with_summary=False)
+    assert 'summary' not in filt['filter_clauses'][0]
+    assert 'value_vivified' in filt['filter_clauses'][0]
+
+def test_summarize_filter():
+    assert_equals(ice_cream_winnow.summarize_filter(nested_filt), dict(
+        logical_op='|',
+        filter_clauses=[
+            dict(logical_op='&', filter_clauses=[
+                'Number Scoops >= 2',
+                'Flavor any of Strawberry, Chocolate',
+            ]),
+            'Flavor any of Mint Chocolate Chip, Cherry Garcia',
+        ]))
+
+def test_large_collections_bind_an_array():
+    class ArrayWinnow(Winnow):
+        collection_array_threshold = 2
+
+    wnw = ArrayWinnow('ice_cream', sources)
+    flavors = ['Vanilla', 'Coffee', 'Strawberry']
+    query, params = wnw.where_clauses(scoops_filt(2, flavors[:2]))
+    assert 'flavor  IN (%s,%s)' in query
+    query, params = wnw.where_clauses(scoops_filt(2, flavors))
+    assert 'flavor = ANY(%s)' in query
+    assert_equals(params, (2, flavors))
+    # Any size of array shares one plan
+    wnw.where_clauses(scoops_filt(2, flavors * 2))
+    assert_equals(wnw.plan_cache_info().hits, 1)
+
+def test_sources_can_pick_a_collection_strategy():
+    wnw = Winnow('ice_cream', [
+        dict(source, collection_strategy='values') if source['display_name'] == 'Flavor' else source
+        for source in sources])
+    query, params = wnw.where_clauses(ice_cream_filt)
+    assert 'flavor = ANY(VALUES (%s), (%s))' in query
+
+def test_collections_are_not_arrays_by_default():
+    wnw = Winnow('ice_cream', sources)
+    query, params = wnw.where_clauses(scoops_filt(2, [str(i) for i in range(2000)]))
+    assert 'flavor  IN (%s,' in query
+
+def test_collection_sql_type():
+    class ArrayWinnow(Winnow):
+        collection_array_threshold = 2
+
+    wnw = ArrayWinnow('ice_cream', [
+        dict(display_name='Scooper', column='scooper_id', value_types=['collection'],
+             collection_sql_type='bigint'),
+        dict(display_name='Server', column='server_id', value_types=['collection'],
+             collection_sql_type='bigint', collection_strategy='values'),
+    ])
+    query, params = wnw.where_clauses(dict(logical_op='&', filter_clauses=[
+        dict(data_source='Scooper', operator='not any of', value=['1', '2', '3']),
+        dict(data_source='Server', operator='any of', value=['4', '5']),
+    ]))
+    assert 'scooper_id <> ALL(%s::bigint[])' in query
+    assert 'server_id = ANY(VALUES (%s::bigint), (%s::bigint))' in query
+    assert_equals(params, (['1', '2', '3'], '4', '5'))
+
+def test_compile_many():
+    wnw = Winnow('ice_cream', sources)
+    filters = [
+        scoops_filt(2, ['Vanilla']),
+        scoops_filt(2, ['Vanilla']),
+        dict(logical_op='&', filter_clauses=[
+            dict(data_source='Number Scoops', operator='>=', value='lots')]),
+        dict(logical_op='&'),
+        scoops_filt(3, ['Coffee']),
+    ]
+    results = wnw.compile_many(iter(filters))
+    assert not isinstance(results, list)
+    results = list(results)
+    assert_equals(results[0], wnw.query(filters[0]))
+    assert_equals(results[1], results[0])
+    # Repeats are copies, so changing one result leaves the others alone
+    results[0].params.append('extra')
+    results[0].query = 'SELECT 1'
+    assert_equals(results[1], wnw.query(filters[0]))
+    assert isinstance(results[2], WinnowError)
+    assert isinstance(results[3], WinnowError)
+    assert_equals(results[4], wnw.query(filters[4]))
+    assert_equals(list(wnw.compile_many(filters[:1], kind='where')), [wnw.where_clauses(filters[0])])
+
+def test_instrumentation():
+    from ..instrumentation import StatsCollector
+
+    class InstrumentedWinnow(Winnow):
+        pass
+
+    wnw = InstrumentedWinnow('ice_cream', sources)
+    seen = []
+    wnw.instrumentation = seen.append
+    query, params = wnw.query(scoops_filt(2, ['Vanilla', 'Coffee']))
+    stats, = seen
+    assert_equals((stats.kind, stats.clauses, stats.params, stats.sql_length, stats.plan_cache_hit),
+                  ('query', 3, len(params), len(query), False))
+    assert_equals(stats.calls['special_cases'], 1)
+    assert_equals(stats.calls['vivify'], 3)
+    for phase in ('resolve', 'vivify', 'build', 'special_cases', 'render', 'assemble'):
+        assert stats.timings[phase] >= 0, phase
+    assert stats.total >= stats.timings['resolve']
+
+    collector = StatsCollector()
+    wnw.instrumentation = collector
+    wnw.where_clauses(scoops_filt(2, ['Vanilla']))
+    wnw.where_clauses(scoops_filt(3, ['Vanilla']))
+    try:
+        wnw.where_clauses(dict(logical_op='&', filter_clauses=[
+            dict(data_source='Cones', operator='is', value=True)]))
+    except WinnowError:
+        pass
+    summary = collector.summary()
+    assert_equals((summary['count'], summary['errors'], summary['clauses']), (3, 1, 7))
+    assert_equals((summary['plan_cache_hits'], summary['plan_cache_misses']), (1, 1))
+    assert_equals(collector.slowest[0].total, max(s.total for s in collector.slowest))
+
+def test_instrumentation_leaves_the_sql_alone():
+    import jinjasql
+
+    class InstrumentedWinnow(Winnow):
+        pass
+
+    wnw = InstrumentedWinnow('ice_cream', sources)
+    seen = []
+    wnw.instrumentation = seen.append
+    filt = dict(logical_op='&', filter_clauses=[
+        dict(data_source='Number Scoops', operator='>=', value=2)])
+    wnw.where_clauses(filt)
+    # No templates, so no WinnowSql (and no jinja2) either
+    assert wnw._sql is None
+    assert_equals((seen[0].template_cache_hits, seen[0].template_cache_misses), (0, 0))
+
+    class PlainSqlWinnow(InstrumentedWinnow):
+        sql_class = jinjasql.JinjaSql
+
+    wnw = PlainSqlWinnow('ice_cream', sources)
+    wnw.instrumentation = seen.append
+    query, params = wnw.where_clauses(filt)
+    assert_equals((query, list(params)), ('((num_scoops >= %s))', [2]))
@@ -1,10 +1,17 @@
 import datetime
+import pickle
+import sys
+import threading
+from unittest import SkipTest
 
 from nose.tools import assert_equals
 
+from ..core import Winnow
 from ..templating import jsonify
 from ..templating import pg_null
 from ..templating import PGJson
+from ..templating import rendering
+from ..templating import SqlFragment
 from ..templating import WinnowSql
 
 sql = WinnowSql()
@@ -99,3 +106,111 @@ def test_sqlfragments_can_be_composed():
     assert_equals(
         recipe_requirements.params,
         [12, 100])
+
+def test_templates_are_compiled_once():
+    cached_sql = WinnowSql()
+    for n in range(3):
+        query, params = cached_sql.prepare_query('SELECT {{ n }}', n=n)
+        assert_equals(query, 'SELECT %s')
+        assert_equals(params, [n])
+    info = cached_sql.template_cache.cache_info()
+    assert_equals((info.hits, info.misses, info.currsize), (2, 1, 1))
+
+def test_template_cache_evicts_least_recently_used():
+    class TinyCacheSql(WinnowSql):
+        template_cache_size = 2
+
+    tiny = TinyCacheSql()
+    tiny.prepare_query('SELECT 1')
+    tiny.prepare_query('SELECT 2')
+    tiny.prepare_query('SELECT 1')
+    tiny.prepare_query('SELECT 3')
+    assert_equals(tiny.template_cache.keys(), ['SELECT 1', 'SELECT 3'])
+    assert_equals(tiny.template_cache.cache_info().evictions, 1)
+
+
+def test_nested_renders_keep_their_own_params():
+    nesting_sql = WinnowSql()
+    nesting_sql.env.filters['wrapped'] = lambda value: nesting_sql.prepare_query(
+        'coalesce({{ value }}, {{ fallback }})', value=value, fallback=0)
+    query, params = nesting_sql.prepare_query(
+        'SELECT {{ a }}, {{ b | wrapped }}, {{ c }}', a=1, b=2, c=3)
+    assert_equals(query, 'SELECT %s, coalesce(%s, %s), %s')
+    assert_equals(params, [1, 2, 0, 3])
+
+
+def test_concurrent_renders_stress():
+    wnw = Winnow('ice_cream', [
+        dict(display_name='Scoops', column='num_scoops', value_types=['numeric']),
+        dict(display_name='Flavor', column='flavor', value_types=['collection']),
+    ])
+    failures = []
+
+    def render(worker):
+        for i in range(500):
+            n = worker * 1000 + i
+            flavors = [str(n + k) for k in range(n % 5)]
+            filt = dict(logical_op='|', filter_clauses=[
+                dict(data_source='Scoops', operator='>=', value=n),
+                dict(data_source='Flavor', operator='any of', value=flavors),
+            ])
+            query, params = wnw.query(filt)
+            if list(params) != [n] + flavors or query.count('%s') != len(params):
+                failures.append((n, query, params))
+            query, params = wnw.prepare_query(
+                '{{ a }} {{ b | anyclause | sqlsafe }} {{ c | inclause }}', a=n, b=flavors, c=[n])
+            if params != [n] + flavors + [n]:
+                failures.append((n, query, params))
+
+    threads = [threading.Thread(target=render, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert_equals(failures, [])
+
+
+def test_interleaved_coroutines_keep_their_own_params():
+    if sys.version_info < (3, 7):
+        raise SkipTest('renders only follow asyncio tasks with contextvars, in python 3.7')
+    import asyncio
+
+    bind = sql.env.filters['bind']
+    results = {}
+
+    class Render(object):
+        # Binds its values one at a time, letting the other tasks run in
+        # between, all inside one render.
+        def __init__(self, worker):
+            self.worker = worker
+
+        def __await__(self):
+            with rendering(sql.param_style) as state:
+                for i in range(self.worker + 2):
+                    bind(self.worker * 100 + i, 'value')
+                    yield
+            results[self.worker] = list(state.bind_params.values())
+
+    loop = asyncio.new_event_loop()
+    try:
+        tasks = [asyncio.ensure_future(Render(worker), loop=loop) for worker in range(8)]
+        loop.run_until_complete(asyncio.gather(*tasks))
+    finally:
+        loop.close()
+    assert_equals(results, dict(
+        (worker, [worker * 100 + i for i in range(worker + 2)]) for worker in range(8)))
+
+
+def test_sqlfragments_are_assembled_lazily():
+    frag = SqlFragment('x = %s', [0])
+    for i in range(1, 5000):
+        # Deeper than python would let us recurse
+        frag = SqlFragment.join(' OR ', [frag, SqlFragment('x = %s', [i])]).wrap('(', ')')
+    query, params = frag
+    assert query.startswith('(' * 4999 + 'x = %s OR x = %s)')
+    assert_equals(params, tuple(range(5000)))
+
+    added = SqlFragment('a = %s', [1]) + SqlFragment(' AND b = %s', [2])
+    assert_equals(tuple(added), ('a = %s AND b = %s', [1, 2]))
+    added.query = '(' + added.query + ')'
+    assert_equals(tuple(pickle.loads(pickle.dumps(added))), ('(a = %s AND b = %s)', [1, 2]))
@@ -1,3 +1,122 @@
+import threading
+from collections import namedtuple
+from collections import OrderedDict
+
+# six.string_types, without importing six (and what it imports) up front.
+try:
+    string_types = (basestring,)  # noqa: F821
+except NameError:  # python 3
+    string_types = (str,)
+
 
 def squish_ws(s):
     return ' '.join(s.split()).strip()
+
+
+def freeze(value):
+    """
+    Make a hashable stand-in for a (possibly nested) json-ish value.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses evictions maxsize currsize')
+
+
+class LRUCache(object):
+    """
+    A bounded, thread-safe mapping that evicts the least recently used
+    entry once it holds more than `maxsize` items.
+
+    A `maxsize` of 0 disables caching entirely (every lookup is a miss).
+
+    With `weigh`, a function value -> its size, `maxsize` bounds the total
+    size of the entries rather than their number (and currsize reports
+    that total). An entry bigger than `maxsize` isn't kept at all.
+    """
+    def __init__(self, maxsize=128, weigh=None):
+        self.maxsize = maxsize
+        self.weigh = weigh
+        self._data = OrderedDict()
+        self._weights = {}
+        self._weight = 0
+        self._lock = threading.RLock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._discard(key)
+            self._data[key] = value
+            if self.weigh is not None:
+                self._weights[key] = self.weigh(value)
+                self._weight += self._weights[key]
+            while self._size() > self.maxsize:
+                self._discard(next(iter(self._data)))
+                self.evictions += 1
+
+    def _size(self):
+        return self._weight if self.weigh is not None else len(self._data)
+
+    def _discard(self, key):
+        self._weight -= self._weights.pop(key, 0)
+        return self._data.pop(key, None)
+
+    def get_or_create(self, key, create):
+        """
+        Return the value cached under `key`, calling `create()` to
+        build (and remember) it on a miss.
+        """
+        missing = self._missing
+        value = self.get(key, missing)
+        if value is missing:
+            value = create()
+            self.set(key, value)
+        return value
+
+    _missing = object()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self._weight = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions,
+                             self.maxsize, self._size())
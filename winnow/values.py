@@ -17,24 +17,28 @@ To stringify is to serialize. This would be like turning the
 '''
 from __future__ import unicode_literals
 
-import json
+import re
+from datetime import date
 from datetime import datetime
 
-from dateutil.parser import parse as parse_date
-from six import string_types
-
 from .error import WinnowError
 from .relative_dates import valid_rel_date_values
+from .utils import string_types
 
 # TODO : Since we're storing filters denormalized as JSON now, we probably need
 # Less of this crazy vivification stuff. For another day, perhaps.
 def stringify_string(value):
     return str(value)
 
+# json is imported where it's used, to keep `import winnow` quick.
 def stringify_collection(value):
+    import json
+    return json.dumps(value)
+
+def stringify_single_choice(value):
+    import json
     return json.dumps(value)
 
-stringify_single_choice = json.dumps
 stringify_bool = str
 
 def stringify_numeric(value):
@@ -48,6 +52,7 @@ def vivify_string(value):  # request for comment -- tighter check on this?
     return str(value)
 
 def vivify_collection(value):
+    import json
     try:
         if not isinstance(value, list):
             value = json.loads(value)
@@ -60,6 +65,7 @@ def vivify_collection(value):
         raise WinnowError(e)
 
 def vivify_single_choice(value):
+    import json
     try:
         if not isinstance(value, dict):
             value = json.loads(value)
@@ -91,10 +97,72 @@ def vivify_relative_date(value):
     raise WinnowError("Invalid relative date value: '{}'".format(value))
 stringify_relative_date = vivify_relative_date
 
-def vivify_absolute_date(value):
+# What stringify_absolute_date (datetime.isoformat) writes, and a little
+# more: a date on its own, a space instead of the T, no seconds, or a Z.
+_iso_datetime = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})'
+    r'(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6})\d*)?)?'
+    r'(Z|[+-]\d{2}:?\d{2})?)?\Z')
+
+
+def parse_iso_datetime(value):
+    """
+    Parse an ISO 8601 timestamp like the ones datetime.isoformat writes.
+    Returns None if `value` isn't one.
+    """
+    match = _iso_datetime.match(value)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    tzinfo = None
+    if offset is not None:
+        if offset == 'Z':
+            seconds = 0
+        else:
+            digits = offset[1:].replace(':', '')
+            seconds = int(digits[:2]) * 3600 + int(digits[2:]) * 60
+            if offset[0] == '-':
+                seconds = -seconds
+        # The same tzinfos dateutil's parser would give us
+        from dateutil.tz import tzoffset
+        from dateutil.tz import tzutc
+        tzinfo = tzutc() if seconds == 0 else tzoffset(None, seconds)
+    try:
+        return datetime(
+            int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0),
+            int((fraction or '0').ljust(6, '0')), tzinfo)
+    except ValueError:
+        return None
+
+
+def vivify_absolute_date(value, strict=False, memo=None):
+    """
+    Turn `value` into a datetime. ISO 8601 strings (and datetimes) are
+    handled directly; anything else is left to dateutil, unless `strict`,
+    in which case it's an error.
+
+    `memo`, an LRUCache, remembers the datetimes for strings seen before.
+    """
+    if isinstance(value, datetime):
+        return value
+    elif isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if memo is not None and isinstance(value, string_types):
+        parsed = memo.get(value)
+        if parsed is None:
+            parsed = vivify_absolute_date(value, strict)
+            memo.set(value, parsed)
+        return parsed
+
+    parsed = parse_iso_datetime(value) if isinstance(value, string_types) else None
+    if parsed is not None:
+        return parsed
+    if strict:
+        raise WinnowError("Expected an ISO 8601 date, not: '{}'".format(value))
+    from dateutil.parser import parse as parse_date
     try:
         return parse_date(value)
-    except TypeError:
+    except (TypeError, ValueError, OverflowError):
         raise WinnowError("invalid literal for date range: '{}'".format(value))
 
 def vivify_bool(value):